@@ -1,5 +1,12 @@
-from uvicorn.config import Config
-from uvicorn.main import Server, main, run
+import os
+
+if os.environ.get("UVICORN_PROFILE_STARTUP", "").lower() in ("1", "true", "yes"):
+    from uvicorn.profiler import get_startup_profiler
+
+    get_startup_profiler()
+
+from uvicorn.config import Config  # noqa: E402
+from uvicorn.main import Server, main, run  # noqa: E402
 
 __version__ = "0.22.0"
 __all__ = ["main", "run", "Config", "Server"]
@@ -6,6 +6,7 @@ import multiprocessing
 import os
 import sys
 from multiprocessing.context import SpawnProcess
+from multiprocessing.synchronize import Event
 from socket import socket
 from typing import Callable, List, Optional
 
@@ -19,6 +20,7 @@ def get_subprocess(
     config: Config,
     target: Callable[..., None],
     sockets: List[socket],
+    ready_event: Optional[Event] = None,
 ) -> SpawnProcess:
     """
     Called in the parent process, to instantiate a new child process instance.
@@ -29,6 +31,7 @@ def get_subprocess(
                be the `Server.run()` method.
     * sockets - A list of sockets to pass to the server. Sockets are bound once
                 by the parent process, and then passed to the child processes.
+    * ready_event - An optional event the child sets once it is serving.
     """
     # We pass across the stdin fileno, and reopen it in the child process.
     # This is required for some debugging environments.
@@ -38,11 +41,13 @@ def get_subprocess(
     except OSError:
         stdin_fileno = None
 
+    # `Config` pickles as a `ConfigSnapshot`, with its import targets resolved.
     kwargs = {
         "config": config,
         "target": target,
         "sockets": sockets,
         "stdin_fileno": stdin_fileno,
+        "ready_event": ready_event,
     }
 
     return spawn.Process(target=subprocess_started, kwargs=kwargs)
@@ -53,6 +58,7 @@ def subprocess_started(
     target: Callable[..., None],
     sockets: List[socket],
     stdin_fileno: Optional[int],
+    ready_event: Optional[Event] = None,
 ) -> None:
     """
     Called when the child process starts.
@@ -64,6 +70,7 @@ def subprocess_started(
                 by the parent process, and then passed to the child processes.
     * stdin_fileno - The file number of sys.stdin, so that it can be reattached
                      to the child process.
+    * ready_event - An optional event the child sets once it is serving.
     """
     # Re-open stdin.
     if stdin_fileno is not None:
@@ -73,4 +80,7 @@ def subprocess_started(
     config.configure_logging()
 
     # Now we can call into `Server.run(sockets=sockets)`
-    target(sockets=sockets)
+    if ready_event is None:
+        target(sockets=sockets)
+    else:
+        target(sockets=sockets, ready_event=ready_event)
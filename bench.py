@@ -0,0 +1,391 @@
+"""
+HTTP load generator.
+
+Drives a running server with many concurrent keep-alive connections, spread
+over a pool of client processes, and reports throughput, latency percentiles,
+time to first byte and errors as JSON:
+
+    python -m uvicorn.bench http://127.0.0.1:8000 --connections 64 \\
+        --mix chat=1,stream=1,static=10,health=2
+"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import ssl
+import sys
+import time
+import typing
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+import click
+
+# name: (method, path, body). Paths can be changed with --path.
+SCENARIOS: typing.Dict[str, typing.Tuple[str, str, bytes]] = {
+    "chat": (
+        "POST",
+        "/api/chat",
+        urlencode({"user_input": "Hello, how are you today?"}).encode(),
+    ),
+    "stream": (
+        "POST",
+        "/api/chat/stream",
+        urlencode({"user_input": "Tell me a short story."}).encode(),
+    ),
+    "static": ("GET", "/static/script.js", b""),
+    "health": ("GET", "/health", b""),
+}
+DEFAULT_MIX = "chat=1,stream=1,static=10,health=2"
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Sample(typing.NamedTuple):
+    scenario: str
+    started: float
+    latency: float
+    ttfb: float
+    status: int
+    error: typing.Optional[str]
+
+
+def parse_mix(mix: str) -> typing.List[typing.Tuple[str, int]]:
+    result = []
+    for item in mix.split(","):
+        name, sep, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise click.BadParameter(
+                "Unknown scenario %r, expected one of %s."
+                % (name, ", ".join(SCENARIOS))
+            )
+        try:
+            result.append((name, int(weight) if sep else 1))
+        except ValueError:
+            raise click.BadParameter("Weight for %r must be an integer." % name)
+    return result
+
+
+async def read_response(
+    reader: asyncio.StreamReader, started: float
+) -> typing.Tuple[int, float, bool]:
+    """
+    Read one response, returning the status, the time to the first body byte
+    and whether the connection can be reused.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    ttfb = time.perf_counter() - started
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        version, status, _ = (lines[0] + " ").split(" ", 2)
+        status_code = int(status)
+    except ValueError:
+        raise ProtocolError("bad status line")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    keep_alive = version == "HTTP/1.1" and headers.get("connection") != "close"
+
+    if "chunked" in headers.get("transfer-encoding", ""):
+        first = True
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            try:
+                size = int(size_line.split(b";", 1)[0], 16)
+            except ValueError:
+                raise ProtocolError("bad chunk size")
+            if first and size:
+                # For streams this is the first token, not the response head.
+                ttfb = time.perf_counter() - started
+                first = False
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        length = int(headers["content-length"])
+        if length:
+            await reader.readexactly(length)
+    elif status_code not in (204, 304):
+        await reader.read()
+        keep_alive = False
+    return status_code, ttfb, keep_alive
+
+
+async def client(
+    url: typing.Any,
+    requests: typing.List[typing.Tuple[str, bytes]],
+    deadline: float,
+    warmup_until: float,
+    timeout: float,
+    ssl_context: typing.Optional[ssl.SSLContext],
+    samples: typing.List[Sample],
+    seed: int,
+) -> None:
+    port = url.port or (443 if url.scheme == "https" else 80)
+    reader: typing.Optional[asyncio.StreamReader] = None
+    writer: typing.Optional[asyncio.StreamWriter] = None
+    index = seed
+    while time.perf_counter() < deadline:
+        scenario, request = requests[index % len(requests)]
+        index += 1
+        started = time.perf_counter()
+        status, ttfb, error = 0, 0.0, None
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(url.hostname, port, ssl=ssl_context),
+                    timeout,
+                )
+            writer.write(request)
+            status, ttfb, keep_alive = await asyncio.wait_for(
+                read_response(reader, started), timeout  # type: ignore[arg-type]
+            )
+            if status >= 500:
+                error = "status_5xx"
+            elif status >= 400:
+                error = "status_4xx"
+        except asyncio.TimeoutError:
+            error, keep_alive = "timeout", False
+        except (ConnectionRefusedError, ssl.SSLError) as exc:
+            error, keep_alive = type(exc).__name__, False
+            await asyncio.sleep(0.1)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            error, keep_alive = "connection_closed", False
+        except (ProtocolError, asyncio.LimitOverrunError, ValueError):
+            error, keep_alive = "protocol", False
+        except OSError as exc:
+            error, keep_alive = type(exc).__name__, False
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+        if started >= warmup_until:
+            latency = time.perf_counter() - started
+            samples.append(Sample(scenario, started, latency, ttfb, status, error))
+    if writer is not None:
+        writer.close()
+
+
+def build_requests(
+    url: typing.Any,
+    mix: typing.List[typing.Tuple[str, int]],
+    paths: typing.Dict[str, str],
+) -> typing.List[typing.Tuple[str, bytes]]:
+    host = url.netloc.encode("latin-1")
+    requests = []
+    for name, weight in mix:
+        method, path, body = SCENARIOS[name]
+        path = paths.get(name, path)
+        head = b"%s %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: uvicorn-bench\r\n" % (
+            method.encode(),
+            path.encode(),
+            host,
+        )
+        if body:
+            head += b"Content-Type: application/x-www-form-urlencoded\r\n"
+        if method == "POST":
+            head += b"Content-Length: %d\r\n" % len(body)
+        requests.extend([(name, head + b"\r\n" + body)] * weight)
+    return requests
+
+
+def run_worker(
+    options: typing.Dict[str, typing.Any]
+) -> typing.List[typing.Tuple[typing.Any, ...]]:
+    url = urlsplit(options["url"])
+    requests = build_requests(url, options["mix"], options["paths"])
+    ssl_context = None
+    if url.scheme == "https":
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    samples: typing.List[Sample] = []
+
+    async def main() -> None:
+        # Every process starts at the same wall clock time.
+        await asyncio.sleep(max(0.0, options["start_at"] - time.time()))
+        now = time.perf_counter()
+        warmup_until = now + options["warmup"]
+        deadline = warmup_until + options["duration"]
+        await asyncio.gather(
+            *(
+                client(
+                    url,
+                    requests,
+                    deadline,
+                    warmup_until,
+                    options["timeout"],
+                    ssl_context,
+                    samples,
+                    seed=options["offset"] + idx,
+                )
+                for idx in range(options["connections"])
+            )
+        )
+
+    asyncio.run(main())
+    return [tuple(sample) for sample in samples]
+
+
+def percentiles(values: typing.List[float]) -> typing.Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {}
+    for percentile in PERCENTILES:
+        rank = max(0, math.ceil(percentile / 100 * len(values)) - 1)
+        result["p%g" % percentile] = round(values[rank] * 1000, 3)
+    result["mean"] = round(sum(values) / len(values) * 1000, 3)
+    result["max"] = round(values[-1] * 1000, 3)
+    return result
+
+
+def summarize(
+    samples: typing.List[Sample], duration: float
+) -> typing.Dict[str, typing.Any]:
+    by_scenario: typing.Dict[str, typing.List[Sample]] = {}
+    for sample in samples:
+        by_scenario.setdefault(sample.scenario, []).append(sample)
+
+    def describe(group: typing.List[Sample]) -> typing.Dict[str, typing.Any]:
+        ok = [sample for sample in group if sample.error is None]
+        return {
+            "requests": len(group),
+            "errors": dict(Counter(s.error for s in group if s.error is not None)),
+            "throughput": round(len(ok) / duration, 2),
+            "latency_ms": percentiles([sample.latency for sample in ok]),
+            "ttfb_ms": percentiles([sample.ttfb for sample in ok]),
+            "status": dict(Counter(str(s.status) for s in group if s.status)),
+        }
+
+    report = describe(samples)
+    report["scenarios"] = {
+        name: describe(group) for name, group in sorted(by_scenario.items())
+    }
+    return report
+
+
+@click.command(context_settings={"auto_envvar_prefix": "UVICORN_BENCH"})
+@click.argument("url")
+@click.option(
+    "--connections",
+    type=int,
+    default=64,
+    help="Concurrent keep-alive connections, over all processes.",
+    show_default=True,
+)
+@click.option(
+    "--processes",
+    type=int,
+    default=min(4, os.cpu_count() or 1),
+    help="Client processes to spread the connections over.",
+    show_default=True,
+)
+@click.option(
+    "--duration",
+    type=float,
+    default=10.0,
+    help="Seconds to measure for.",
+    show_default=True,
+)
+@click.option(
+    "--warmup",
+    type=float,
+    default=2.0,
+    help="Seconds of load before measuring starts.",
+    show_default=True,
+)
+@click.option(
+    "--timeout",
+    type=float,
+    default=30.0,
+    help="Seconds to wait for each response.",
+    show_default=True,
+)
+@click.option(
+    "--mix",
+    type=str,
+    default=DEFAULT_MIX,
+    help="Weighted request mix, from the scenarios %s." % ", ".join(SCENARIOS),
+    show_default=True,
+)
+@click.option(
+    "--path",
+    "paths",
+    multiple=True,
+    help="Override the path of a scenario, in the format 'NAME=PATH'.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="File to write the JSON report to.",
+    show_default=True,
+)
+def main(
+    url: str,
+    connections: int,
+    processes: int,
+    duration: float,
+    warmup: float,
+    timeout: float,
+    mix: str,
+    paths: typing.List[str],
+    output: typing.TextIO,
+) -> None:
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise click.BadParameter("URL must start with http:// or https://")
+    path_overrides = {}
+    for item in paths:
+        name, sep, path = item.partition("=")
+        if not sep or name not in SCENARIOS:
+            raise click.BadParameter("Invalid path override %r." % item)
+        path_overrides[name] = path
+
+    scenario_mix = parse_mix(mix)
+    processes = max(1, min(processes, connections))
+    start_at = time.time() + 0.5 + 0.1 * processes
+    jobs = []
+    offset = 0
+    for idx in range(processes):
+        count = connections // processes + (idx < connections % processes)
+        jobs.append(
+            {
+                "url": url,
+                "mix": scenario_mix,
+                "paths": path_overrides,
+                "connections": count,
+                "offset": offset,
+                "duration": duration,
+                "warmup": warmup,
+                "timeout": timeout,
+                "start_at": start_at,
+            }
+        )
+        offset += count
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        results = pool.map(run_worker, jobs)
+    samples = [Sample(*sample) for result in results for sample in result]
+
+    report = {
+        "url": url,
+        "connections": connections,
+        "processes": processes,
+        "duration": duration,
+        "mix": mix,
+    }
+    report.update(summarize(samples, duration))
+    json.dump(report, output, indent=2)
+    output.write("\n")
+    if not samples:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -0,0 +1,157 @@
+"""
+Cooperative cancellation of requests whose client has gone away.
+
+Once a client disconnects nobody will read the response, but a handler
+blocked on slow work, such as generating a model reply, would otherwise run
+to completion. The middleware watches for `http.disconnect` while the
+application runs, and cancels the request's token, which the application
+checks between units of work to stop early.
+
+To notice a disconnect the middleware has to keep receiving, so it reads the
+request body ahead of the application, up to `MAX_READ_AHEAD` bytes. Past that
+it waits for the application to read some of the body, rather than buffer
+any amount of it, and the application then sees the disconnect itself.
+"""
+import asyncio
+import collections
+import threading
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Deque, Optional
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGIReceiveEvent,
+        ASGISendCallable,
+        ASGISendEvent,
+        Scope,
+    )
+
+    from uvicorn.metrics import SharedMetrics
+
+MAX_READ_AHEAD = 1024 * 1024
+
+_current_token: "ContextVar[Optional[CancellationToken]]" = ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def current_cancellation_token() -> Optional["CancellationToken"]:
+    """
+    The token of the request being handled, or None outside of a request or
+    if cancellation isn't enabled. Handlers run in a thread pool see the token
+    of their request, as the context is copied to the thread.
+    """
+    return _current_token.get()
+
+
+class CancellationToken:
+    """
+    Set once the client of a request disconnects. Safe to check from any
+    thread.
+    """
+
+    def __init__(self, metrics: Optional["SharedMetrics"] = None) -> None:
+        self.metrics = metrics
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        if not self._event.is_set():
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def generation_cancelled(self, reclaimed_seconds: float) -> None:
+        """
+        Report that work for this request was stopped early, with an estimate
+        of how much longer it would have taken.
+        """
+        if self.metrics is not None:
+            self.metrics.inc("cancelled_generations")
+            self.metrics.observe(
+                "cancelled_generation_reclaimed_seconds", reclaimed_seconds
+            )
+
+
+class CancellationMiddleware:
+    def __init__(
+        self, app: "ASGI3Application", metrics: Optional["SharedMetrics"] = None
+    ) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = CancellationToken(self.metrics)
+        response_complete = False
+        # Messages received but not yet passed to the application.
+        messages: "Deque[ASGIReceiveEvent]" = collections.deque()
+        read_ahead = 0
+        message_available = asyncio.Event()
+        drained = asyncio.Event()
+
+        def disconnected() -> None:
+            if not response_complete and not token.cancelled:
+                token.cancel()
+                if self.metrics is not None:
+                    self.metrics.inc("cancelled_requests")
+
+        async def watch_disconnect() -> None:
+            nonlocal read_ahead
+            while True:
+                while read_ahead > MAX_READ_AHEAD:
+                    drained.clear()
+                    await drained.wait()
+                message = await receive()
+                messages.append(message)
+                message_available.set()
+                if message["type"] == "http.disconnect":
+                    disconnected()
+                    return
+                read_ahead += len(message.get("body", b""))  # type: ignore
+
+        async def cancellable_receive() -> "ASGIReceiveEvent":
+            nonlocal read_ahead
+            while not messages:
+                message_available.clear()
+                await message_available.wait()
+            message = messages[0]
+            if message["type"] == "http.disconnect":
+                # Left in place, so every later call gets the disconnect too.
+                disconnected()
+                return message
+            messages.popleft()
+            read_ahead -= len(message.get("body", b""))  # type: ignore
+            if read_ahead <= MAX_READ_AHEAD:
+                drained.set()
+            return message
+
+        async def cancellable_send(message: "ASGISendEvent") -> None:
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch_disconnect())
+        reset_token = _current_token.set(token)
+        try:
+            await self.app(scope, cancellable_receive, cancellable_send)
+        finally:
+            _current_token.reset(reset_token)
+            watcher.cancel()
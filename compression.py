@@ -0,0 +1,222 @@
+"""
+Response compression.
+
+Bodies are compressed incrementally with zlib, and every chunk the application
+sends is flushed with `Z_SYNC_FLUSH`, so streamed responses such as server sent
+events still reach the client as they are produced.
+"""
+import time
+import zlib
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        ASGISendEvent,
+        HTTPResponseStartEvent,
+        Scope,
+    )
+
+    from uvicorn.metrics import SharedMetrics
+
+# Content types that are already compressed, or not worth compressing.
+INCOMPRESSIBLE_TYPES = (
+    b"image/",
+    b"video/",
+    b"audio/",
+    b"font/woff",
+    b"application/zip",
+    b"application/gzip",
+    b"application/x-gzip",
+    b"application/octet-stream",
+    b"application/pdf",
+)
+# Image formats that do compress.
+COMPRESSIBLE_EXCEPTIONS = (b"image/svg+xml",)
+
+# wbits for `zlib.compressobj`, by content coding.
+ENCODINGS = {b"gzip": 16 + zlib.MAX_WBITS, b"deflate": zlib.MAX_WBITS}
+
+
+def is_compressible(content_type: bytes) -> bool:
+    content_type = content_type.lower()
+    if content_type.startswith(COMPRESSIBLE_EXCEPTIONS):
+        return True
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+def select_encoding(accept_encoding: bytes) -> Optional[bytes]:
+    """
+    Pick gzip or deflate from an Accept-Encoding header, preferring gzip.
+    Codings with a quality of 0 are refused by the client, and never picked.
+    """
+    best: Optional[bytes] = None
+    best_quality = 0.0
+    for item in accept_encoding.lower().split(b","):
+        coding, *params = item.split(b";")
+        coding = coding.strip()
+        if coding not in ENCODINGS:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition(b"=")
+            if name.strip() == b"q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality <= 0.0:
+            continue
+        if quality > best_quality or (quality == best_quality and coding == b"gzip"):
+            best, best_quality = coding, quality
+    return best
+
+
+def compressed_headers(
+    headers: List[Tuple[bytes, bytes]], encoding: bytes
+) -> List[Tuple[bytes, bytes]]:
+    """
+    Adjust response headers for a body compressed with `encoding`.
+
+    The length is no longer known up front, a strong ETag no longer matches
+    the bytes sent so it is made weak, and caches must vary on
+    Accept-Encoding, added to any Vary header already present.
+    """
+    result = []
+    vary_found = False
+    for name, value in headers:
+        lowered = name.lower()
+        if lowered == b"content-length":
+            continue
+        if lowered == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        elif lowered == b"vary":
+            vary_found = True
+            fields = [field.strip().lower() for field in value.split(b",")]
+            if b"*" not in fields and b"accept-encoding" not in fields:
+                value = value + b", accept-encoding"
+        result.append((name, value))
+    result.append((b"content-encoding", encoding))
+    if not vary_found:
+        result.append((b"vary", b"accept-encoding"))
+    return result
+
+
+class CompressionStats:
+    """
+    Bytes in and out of the compressor, and the CPU time it took.
+    """
+
+    def __init__(self, metrics: Optional["SharedMetrics"] = None) -> None:
+        self.metrics = metrics
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_ns = 0
+
+    def record(self, bytes_in: int, bytes_out: int, cpu_ns: int) -> None:
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.cpu_ns += cpu_ns
+        if self.metrics is not None:
+            self.metrics.inc("compression_input_bytes", bytes_in)
+            self.metrics.inc("compression_output_bytes", bytes_out)
+            self.metrics.inc("compression_cpu_microseconds", cpu_ns // 1000)
+
+    @property
+    def cpu_ns_per_byte(self) -> float:
+        return self.cpu_ns / self.bytes_in if self.bytes_in else 0.0
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        minimum_size: int = 500,
+        level: int = 6,
+        metrics: Optional["SharedMetrics"] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.stats = CompressionStats(metrics)
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding: Optional[bytes] = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = select_encoding(value)
+                break
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start: Optional["HTTPResponseStartEvent"] = None
+        compressor: Optional["zlib._Compress"] = None
+        stats = self.stats
+
+        async def send_wrapper(message: "ASGISendEvent") -> None:
+            nonlocal start, compressor
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                # Held back until the first body chunk shows how much there is.
+                start = message  # type: ignore[assignment]
+                return
+            if message_type != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body: bytes = message.get("body", b"")  # type: ignore[assignment]
+            more_body: bool = message.get("more_body", False)  # type: ignore
+            if compressor is None:
+                headers: List[Tuple[bytes, bytes]] = list(start["headers"])
+                if self.should_compress(headers, body, more_body):
+                    compressor = zlib.compressobj(
+                        self.level, zlib.DEFLATED, ENCODINGS[encoding]  # type: ignore
+                    )
+                    stats.responses += 1
+                    headers = compressed_headers(headers, encoding)  # type: ignore
+                    start = {**start, "headers": headers}  # type: ignore
+                await send(start)  # type: ignore[arg-type]
+                if compressor is None:
+                    start = None
+                    await send(message)
+                    return
+
+            started = time.thread_time_ns()
+            data = compressor.compress(body)
+            data += compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+            stats.record(len(body), len(data), time.thread_time_ns() - started)
+            await send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    def should_compress(
+        self, headers: List[Tuple[bytes, bytes]], body: bytes, more_body: bool
+    ) -> bool:
+        content_type = b""
+        for name, value in headers:
+            name = name.lower()
+            if name == b"content-encoding":
+                # Already compressed, for example a precompressed static file.
+                return False
+            if name == b"content-type":
+                content_type = value
+            elif name == b"content-length":
+                try:
+                    if int(value) < self.minimum_size:
+                        return False
+                except ValueError:
+                    # Left for the protocol to reject.
+                    return False
+        if not is_compressible(content_type):
+            return False
+        return more_body or len(body) >= self.minimum_size
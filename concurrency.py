@@ -0,0 +1,169 @@
+"""
+Adaptive concurrency limiting.
+
+Each route class has its own limit, grown additively while requests meet the
+target latency and cut multiplicatively when they don't (AIMD). Requests over
+the limit are answered with 503 before the application sees them.
+"""
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from uvicorn.readiness import is_warmup
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        ASGISendEvent,
+        Scope,
+    )
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AIMDLimiter:
+    """
+    * target_latency - Seconds until the response starts that are considered
+                       healthy for this route class.
+    * min_limit, max_limit - Bounds for the concurrency limit.
+    * backoff - Factor applied to the limit when a request is too slow or fails.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_latency: float,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        backoff: float = 0.9,
+    ) -> None:
+        self.name = name
+        self.target_latency = target_latency
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        self.shed = 0
+        self.latency = target_latency
+        self._last_decrease = 0.0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, failed: bool) -> None:
+        self.in_flight -= 1
+        self.latency += (latency - self.latency) * 0.1
+
+        if failed or latency > self.target_latency:
+            # Decrease at most once per target latency, so a burst of slow
+            # responses to requests admitted together counts as one signal.
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target_latency:
+                self._last_decrease = now
+                limit = max(self.min_limit, self.limit * self.backoff)
+                if int(limit) != int(self.limit):
+                    logger.debug(
+                        "Concurrency limit for %s lowered to %d", self.name, limit
+                    )
+                self.limit = limit
+        elif self.in_flight * 2 >= self.limit:
+            # Only grow while the current limit is actually being used.
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    @property
+    def retry_after(self) -> int:
+        return min(60, max(1, math.ceil(self.latency)))
+
+
+def parse_route_classes(
+    routes: Sequence[str], default_target: float, max_limit: int
+) -> Tuple[List[Tuple[str, AIMDLimiter]], AIMDLimiter]:
+    """
+    Build limiters from "PREFIX=TARGET_LATENCY" strings, longest prefix first.
+    """
+    classes = []
+    for route in routes:
+        prefix, sep, target = route.partition("=")
+        if not sep:
+            raise ValueError(
+                'Route class "%s" must be in format "<prefix>=<seconds>".' % route
+            )
+        limiter = AIMDLimiter(prefix, float(target), max_limit=max_limit)
+        classes.append((prefix, limiter))
+    classes.sort(key=lambda item: len(item[0]), reverse=True)
+    return classes, AIMDLimiter("*", default_target, max_limit=max_limit)
+
+
+class AdaptiveConcurrencyMiddleware:
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        routes: Sequence[str] = (),
+        target_latency: float = 1.0,
+        max_limit: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.classes, self.default = parse_route_classes(
+            routes, target_latency, max_limit or 1000
+        )
+
+    def limiter_for(self, path: str) -> AIMDLimiter:
+        for prefix, limiter in self.classes:
+            if path.startswith(prefix):
+                return limiter
+        return self.default
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] != "http" or is_warmup(scope):
+            return await self.app(scope, receive, send)
+
+        limiter = self.limiter_for(scope["path"])
+        if not limiter.try_acquire():
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"text/plain; charset=utf-8"),
+                        (b"retry-after", str(limiter.retry_after).encode("latin-1")),
+                        (b"connection", b"close"),
+                    ],
+                }
+            )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b"Service Unavailable",
+                    "more_body": False,
+                }
+            )
+            return
+
+        start = time.perf_counter()
+        latency: Optional[float] = None
+        failed = True
+
+        async def send_wrapper(message: "ASGISendEvent") -> None:
+            nonlocal latency, failed
+            if message["type"] == "http.response.start":
+                latency = time.perf_counter() - start
+                failed = message["status"] in (503, 504)  # type: ignore[typeddict-item]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if latency is None:
+                latency = time.perf_counter() - start
+            limiter.release(latency, failed)
@@ -1,4 +1,5 @@
 import asyncio
+import importlib.util
 import inspect
 import json
 import logging
@@ -7,7 +8,9 @@ import os
 import socket
 import ssl
 import sys
+import tempfile
 from pathlib import Path
+from types import MappingProxyType
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -15,35 +18,38 @@ from typing import (
     Callable,
     Dict,
     List,
+    NamedTuple,
     Optional,
     Tuple,
     Type,
     Union,
 )
 
-from uvicorn.logging import TRACE_LOG_LEVEL
+import click
+
+from uvicorn.logging import TRACE_LOG_LEVEL, AccessLogSampler, install_queue_logging
 
 if sys.version_info < (3, 8):  # pragma: py-gte-38
     from typing_extensions import Literal
 else:  # pragma: py-lt-38
     from typing import Literal
 
-import click
-
+from uvicorn import profiler
 from uvicorn.importer import ImportFromStringError, import_from_string
-from uvicorn.middleware.asgi2 import ASGI2Middleware
-from uvicorn.middleware.message_logger import MessageLoggerMiddleware
-from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
-from uvicorn.middleware.wsgi import WSGIMiddleware
 
 if TYPE_CHECKING:
     from asgiref.typing import ASGIApplication
 
-HTTPProtocolType = Literal["auto", "h11", "httptools"]
+    from uvicorn.metrics import SharedMetrics
+    from uvicorn.readiness import WarmupRequest
+    from uvicorn.sharedcache import SharedCache
+
+HTTPProtocolType = Literal["auto", "h11", "httptools", "h2"]
 WSProtocolType = Literal["auto", "none", "websockets", "wsproto"]
 LifespanType = Literal["auto", "on", "off"]
 LoopSetupType = Literal["none", "auto", "asyncio", "uvloop"]
 InterfaceType = Literal["auto", "asgi3", "asgi2", "wsgi"]
+LogFormatType = Literal["text", "json"]
 
 LOG_LEVELS: Dict[str, int] = {
     "critical": logging.CRITICAL,
@@ -57,6 +63,7 @@ HTTP_PROTOCOLS: Dict[HTTPProtocolType, str] = {
     "auto": "uvicorn.protocols.http.auto:AutoHTTPProtocol",
     "h11": "uvicorn.protocols.http.h11_impl:H11Protocol",
     "httptools": "uvicorn.protocols.http.httptools_impl:HttpToolsProtocol",
+    "h2": "uvicorn.h2_impl:H2Protocol",
 }
 WS_PROTOCOLS: Dict[WSProtocolType, Optional[str]] = {
     "auto": "uvicorn.protocols.websockets.auto:AutoWebSocketsProtocol",
@@ -76,8 +83,13 @@ LOOP_SETUPS: Dict[LoopSetupType, Optional[str]] = {
     "uvloop": "uvicorn.loops.uvloop:uvloop_setup",
 }
 INTERFACES: List[InterfaceType] = ["auto", "asgi3", "asgi2", "wsgi"]
+LOG_FORMATS: List[LogFormatType] = ["text", "json"]
 
 SSL_PROTOCOL_VERSION: int = ssl.PROTOCOL_TLS_SERVER
+# Forward secret key exchange and AEAD ciphers only, for TLS 1.2. The TLS 1.3
+# cipher suites aren't affected by `set_ciphers()` and are all fine.
+SSL_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS"
+SSL_ALPN_PROTOCOLS = ["http/1.1"]
 
 LOGGING_CONFIG: Dict[str, Any] = {
     "version": 1,
@@ -112,6 +124,11 @@ LOGGING_CONFIG: Dict[str, Any] = {
     },
 }
 
+JSON_LOG_FORMATTERS: Dict[str, Any] = {
+    "default": {"()": "uvicorn.logging.JSONFormatter"},
+    "access": {"()": "uvicorn.logging.JSONAccessFormatter"},
+}
+
 logger = logging.getLogger("uvicorn.error")
 
 
@@ -123,6 +140,8 @@ def create_ssl_context(
     cert_reqs: int,
     ca_certs: Optional[Union[str, os.PathLike]],
     ciphers: Optional[str],
+    alpn_protocols: Optional[List[str]] = None,
+    ecdh_curve: Optional[str] = None,
 ) -> ssl.SSLContext:
     ctx = ssl.SSLContext(ssl_version)
     get_password = (lambda: password) if password else None
@@ -132,6 +151,11 @@ def create_ssl_context(
         ctx.load_verify_locations(ca_certs)
     if ciphers:
         ctx.set_ciphers(ciphers)
+    ctx.options |= ssl.OP_NO_COMPRESSION | ssl.OP_CIPHER_SERVER_PREFERENCE
+    if alpn_protocols:
+        ctx.set_alpn_protocols(alpn_protocols)
+    if ecdh_curve:
+        ctx.set_ecdh_curve(ecdh_curve)
     return ctx
 
 
@@ -192,6 +216,146 @@ def _normalize_dirs(dirs: Union[List[str], str, None]) -> List[str]:
     return list(set(dirs))
 
 
+# The first descriptor passed under the socket activation protocol.
+SD_LISTEN_FDS_START = 3
+# The kernel silently caps every listen backlog at this limit.
+SOMAXCONN_PATH = "/proc/sys/net/core/somaxconn"
+# Listening socket options: (level, name of the option in the socket module).
+# Options the platform doesn't have are skipped.
+SOCKET_OPTIONS: Dict[str, Tuple[int, str]] = {
+    "rcvbuf": (socket.SOL_SOCKET, "SO_RCVBUF"),
+    "sndbuf": (socket.SOL_SOCKET, "SO_SNDBUF"),
+    "defer_accept": (socket.IPPROTO_TCP, "TCP_DEFER_ACCEPT"),
+    "fastopen": (socket.IPPROTO_TCP, "TCP_FASTOPEN"),
+}
+TCP_FAMILIES = (socket.AF_INET, socket.AF_INET6)
+
+
+def resolve_backlog(backlog: Union[int, str]) -> int:
+    """
+    The listen backlog, where "auto" is the longest queue the kernel allows.
+    """
+    if backlog != "auto":
+        return int(backlog)
+    try:
+        with open(SOMAXCONN_PATH) as somaxconn:
+            return int(somaxconn.read())
+    except (OSError, ValueError):  # pragma: py-linux
+        return socket.SOMAXCONN
+
+
+def listen_fds() -> List[int]:
+    """
+    Descriptors passed by a service manager such as systemd, under the socket
+    activation protocol of `LISTEN_FDS` and `LISTEN_PID`.
+
+    The variables are removed from the environment, so child processes don't
+    claim the same descriptors.
+    """
+    try:
+        pid = int(os.environ.get("LISTEN_PID", ""))
+        count = int(os.environ.get("LISTEN_FDS", ""))
+    except ValueError:
+        return []
+    if pid != os.getpid():
+        return []
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    return list(range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count))
+
+
+class BindTarget(NamedTuple):
+    host: Optional[str] = None
+    port: int = 0
+    uds: Optional[str] = None
+    fd: Optional[int] = None
+
+
+def parse_bind(value: str) -> BindTarget:
+    """
+    Parse a bind target, one of HOST:PORT, [IPV6]:PORT, unix:PATH or fd://FD.
+    """
+    if value.startswith("unix:"):
+        return BindTarget(uds=value[len("unix:") :])
+    if value.startswith("fd://"):
+        return BindTarget(fd=int(value[len("fd://") :]))
+    host, sep, port = value.rpartition(":")
+    if not sep:
+        raise ValueError("Missing port")
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    return BindTarget(host=host, port=int(port))
+
+
+def socket_from_fd(fd: int) -> socket.socket:
+    """
+    A socket for a duplicate of an inherited descriptor, with its family and
+    type read from the descriptor rather than assumed.
+    """
+    return socket.socket(fileno=os.dup(fd))
+
+
+# Attributes set by `Config.load()`, which are never carried across processes.
+LOADED_ATTRIBUTES = (
+    "loaded_app",
+    "ssl",
+    "ssl_handshake_stats",
+    "http_protocol_class",
+    "ws_protocol_class",
+)
+# Attributes left out of `ConfigSnapshot.dump()`.
+SECRET_ATTRIBUTES = ("ssl_keyfile_password",)
+
+
+class ConfigSnapshot:
+    """
+    An immutable copy of a `Config` with its import targets already resolved.
+
+    This is what gets pickled when a `Config` is sent to a worker process, so
+    the worker can skip the argument handling of `Config.__init__` and the
+    protocol and lifespan lookups of `Config.load()`.
+    """
+
+    __slots__ = ("state",)
+
+    def __init__(self, state: Dict[str, Any]) -> None:
+        object.__setattr__(self, "state", MappingProxyType(state))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (ConfigSnapshot, (dict(self.state),))
+
+    def __repr__(self) -> str:
+        return "ConfigSnapshot(%r)" % self.dump()
+
+    def dump(self) -> Dict[str, Any]:
+        """
+        Return the snapshot as JSON serializable values, for debugging.
+        """
+        return {
+            key: "**********" if key in SECRET_ATTRIBUTES else _dump_value(value)
+            for key, value in sorted(self.state.items())
+        }
+
+
+def _dump_value(value: Any) -> Any:
+    if inspect.isclass(value) or inspect.isfunction(value):
+        return "%s:%s" % (value.__module__, value.__qualname__)
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    if isinstance(value, bytes):
+        return value.decode("latin1")
+    if isinstance(value, (list, tuple)):
+        return [_dump_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _dump_value(item) for key, item in value.items()}
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return repr(value)
+
+
 class Config:
     def __init__(
         self,
@@ -227,7 +391,7 @@ class Config:
         root_path: str = "",
         limit_concurrency: Optional[int] = None,
         limit_max_requests: Optional[int] = None,
-        backlog: int = 2048,
+        backlog: Union[int, Literal["auto"]] = 2048,
         timeout_keep_alive: int = 5,
         timeout_notify: int = 30,
         timeout_graceful_shutdown: Optional[int] = None,
@@ -238,10 +402,53 @@ class Config:
         ssl_version: int = SSL_PROTOCOL_VERSION,
         ssl_cert_reqs: int = ssl.CERT_NONE,
         ssl_ca_certs: Optional[str] = None,
-        ssl_ciphers: str = "TLSv1",
+        ssl_ciphers: str = SSL_CIPHERS,
         headers: Optional[List[Tuple[str, str]]] = None,
         factory: bool = False,
         h11_max_incomplete_event_size: Optional[int] = None,
+        rolling_reload: bool = False,
+        timeout_worker_ready: Optional[int] = 60,
+        metrics_host: str = "127.0.0.1",
+        metrics_port: Optional[int] = None,
+        metrics_routes: Optional[List[str]] = None,
+        adaptive_concurrency: bool = False,
+        adaptive_concurrency_target: float = 1.0,
+        adaptive_concurrency_routes: Optional[List[str]] = None,
+        log_async: bool = False,
+        log_queue_size: int = 10000,
+        log_format: LogFormatType = "text",
+        access_log_sample_rate: int = 1,
+        profile_startup: bool = False,
+        ssl_alpn_protocols: Optional[List[str]] = None,
+        ssl_ecdh_curve: Optional[str] = None,
+        static_mounts: Optional[List[str]] = None,
+        compression: bool = False,
+        compression_minimum_size: int = 500,
+        compression_level: int = 6,
+        profile_duration: Optional[float] = None,
+        profile_dir: Optional[str] = None,
+        loop_monitor_threshold: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        write_buffer_high: Optional[int] = None,
+        write_buffer_low: Optional[int] = None,
+        tcp_nodelay: bool = True,
+        tcp_defer_accept: Optional[int] = None,
+        tcp_fastopen: Optional[int] = None,
+        socket_rcvbuf: Optional[int] = None,
+        socket_sndbuf: Optional[int] = None,
+        bind: Optional[List[str]] = None,
+        h2_max_concurrent_streams: int = 100,
+        shared_cache_size: Optional[int] = None,
+        shared_cache_slab_size: int = 8192,
+        warmup_requests: Optional[List[str]] = None,
+        warmup_timeout: float = 30.0,
+        readiness_path: Optional[str] = None,
+        liveness_path: Optional[str] = None,
+        cancel_on_disconnect: bool = False,
+        request_timeout: Optional[float] = None,
+        request_timeout_routes: Optional[List[str]] = None,
+        timeout_request_headers: float = 10.0,
+        timeout_request_body: Optional[float] = None,
     ):
         self.app = app
         self.host = host
@@ -259,6 +466,15 @@ class Config:
         self.log_config = log_config
         self.log_level = log_level
         self.access_log = access_log
+        self.log_async = log_async
+        self.log_queue_size = log_queue_size
+        self.log_format = log_format
+        self.access_log_sample_rate = access_log_sample_rate
+        self.profile_startup = profile_startup
+        # SIGUSR2 starts a sampling profiler in a worker, when this is set.
+        self.profile_duration = profile_duration
+        self.profile_dir = profile_dir or tempfile.gettempdir()
+        self.loop_monitor_threshold = loop_monitor_threshold
         self.use_colors = use_colors
         self.interface = interface
         self.reload = reload
@@ -270,7 +486,16 @@ class Config:
         self.root_path = root_path
         self.limit_concurrency = limit_concurrency
         self.limit_max_requests = limit_max_requests
-        self.backlog = backlog
+        self.max_connections = max_connections
+        # Defaults to asyncio's own limits, 64 KiB high and a quarter of it low.
+        self.write_buffer_high = write_buffer_high
+        self.write_buffer_low = write_buffer_low
+        self.backlog = resolve_backlog(backlog)
+        self.tcp_nodelay = tcp_nodelay
+        self.tcp_defer_accept = tcp_defer_accept
+        self.tcp_fastopen = tcp_fastopen
+        self.socket_rcvbuf = socket_rcvbuf
+        self.socket_sndbuf = socket_sndbuf
         self.timeout_keep_alive = timeout_keep_alive
         self.timeout_notify = timeout_notify
         self.timeout_graceful_shutdown = timeout_graceful_shutdown
@@ -282,14 +507,93 @@ class Config:
         self.ssl_cert_reqs = ssl_cert_reqs
         self.ssl_ca_certs = ssl_ca_certs
         self.ssl_ciphers = ssl_ciphers
+        self.ssl_alpn_protocols = ssl_alpn_protocols or list(SSL_ALPN_PROTOCOLS)
+        if http == "h2" and ssl_alpn_protocols is None:
+            # Offer HTTP/2 first, with HTTP/1.1 for clients that don't speak it.
+            self.ssl_alpn_protocols.insert(0, "h2")
+        self.h2_max_concurrent_streams = h2_max_concurrent_streams
+        self.ssl_ecdh_curve = ssl_ecdh_curve
         self.headers: List[Tuple[str, str]] = headers or []
         self.encoded_headers: List[Tuple[bytes, bytes]] = []
         self.factory = factory
         self.h11_max_incomplete_event_size = h11_max_incomplete_event_size
+        self.rolling_reload = rolling_reload
+        self.timeout_worker_ready = timeout_worker_ready
+        self.metrics_host = metrics_host
+        self.metrics_port = metrics_port
+        self.metrics_routes: List[str] = metrics_routes or []
+        # Created by the parent process once `metrics_port` is set.
+        self.metrics: Optional["SharedMetrics"] = None
+        self.shared_cache_size = shared_cache_size
+        self.shared_cache_slab_size = shared_cache_slab_size
+        # Created by the parent process once `shared_cache_size` is set.
+        self.shared_cache: Optional["SharedCache"] = None
+        self.warmup_timeout = warmup_timeout
+        self.readiness_path = readiness_path
+        self.liveness_path = liveness_path
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.request_timeout = request_timeout
+        self.request_timeout_routes: List[str] = request_timeout_routes or []
+        self.timeout_request_headers = timeout_request_headers
+        self.timeout_request_body = timeout_request_body
+        self.adaptive_concurrency = adaptive_concurrency
+        self.adaptive_concurrency_target = adaptive_concurrency_target
+        self.adaptive_concurrency_routes: List[str] = adaptive_concurrency_routes or []
+        self.static_mounts: List[str] = static_mounts or []
+        self.compression = compression
+        self.compression_minimum_size = compression_minimum_size
+        self.compression_level = compression_level
 
         self.loaded = False
         self.configure_logging()
 
+        # Bind targets replace `host`, `port`, `uds` and `fd` when given.
+        self.bind: List[BindTarget] = []
+        for target in bind or []:
+            try:
+                self.bind.append(parse_bind(target))
+            except ValueError:
+                logger.error(
+                    "Invalid bind target %r, expected HOST:PORT, [IPV6]:PORT, "
+                    "unix:PATH or fd://FD.",
+                    target,
+                )
+                sys.exit(1)
+
+        self.warmup_requests: List["WarmupRequest"] = []
+        for request in warmup_requests or []:
+            from uvicorn.readiness import parse_warmup_request
+
+            try:
+                self.warmup_requests.append(parse_warmup_request(request))
+            except ValueError:
+                logger.error(
+                    "Invalid warm-up request %r, expected [METHOD] PATH [BODY].",
+                    request,
+                )
+                sys.exit(1)
+
+        high, low = write_buffer_high, write_buffer_low
+        if (
+            (high is not None and high < 0)
+            or (low is not None and low < 0)
+            or (high is not None and low is not None and low > high)
+        ):
+            # The transports would only reject these once connections arrive.
+            logger.error(
+                "Invalid write buffer limits high=%s, low=%s, expected "
+                "0 <= low <= high.",
+                high,
+                low,
+            )
+            sys.exit(1)
+
+        if http == "h2" and importlib.util.find_spec("h2") is None:
+            logger.error(
+                "HTTP/2 requires the h2 package. Install it with 'pip install h2'."
+            )
+            sys.exit(1)
+
         self.reload_dirs: List[Path] = []
         self.reload_dirs_excludes: List[Path] = []
         self.reload_includes: List[str] = []
@@ -367,6 +671,11 @@ class Config:
         if self.reload and self.workers > 1:
             logger.warning('"workers" flag is ignored when reloading is enabled.')
 
+        if self.rolling_reload and self.reload:
+            logger.warning(
+                '"rolling_reload" flag is ignored when reloading is enabled.'
+            )
+
     @property
     def asgi_version(self) -> Literal["2.0", "3.0"]:
         mapping: Dict[str, Literal["2.0", "3.0"]] = {
@@ -382,13 +691,24 @@ class Config:
 
     @property
     def use_subprocess(self) -> bool:
-        return bool(self.reload or self.workers > 1)
+        return bool(self.reload or self.workers > 1 or self.rolling_reload)
 
     def configure_logging(self) -> None:
         logging.addLevelName(TRACE_LOG_LEVEL, "TRACE")
 
         if self.log_config is not None:
             if isinstance(self.log_config, dict):
+                if self.log_format == "json":
+                    self.log_config = {
+                        **self.log_config,
+                        "formatters": {
+                            **self.log_config["formatters"],
+                            **{
+                                name: dict(formatter)
+                                for name, formatter in JSON_LOG_FORMATTERS.items()
+                            },
+                        },
+                    }
                 if self.use_colors in (True, False):
                     self.log_config["formatters"]["default"][
                         "use_colors"
@@ -427,6 +747,62 @@ class Config:
         if self.access_log is False:
             logging.getLogger("uvicorn.access").handlers = []
             logging.getLogger("uvicorn.access").propagate = False
+        access_logger = logging.getLogger("uvicorn.access")
+        for log_filter in list(access_logger.filters):
+            if isinstance(log_filter, AccessLogSampler):
+                access_logger.removeFilter(log_filter)
+        if self.access_log_sample_rate > 1:
+            access_logger.addFilter(AccessLogSampler(self.access_log_sample_rate))
+        if self.log_async:
+            install_queue_logging(
+                ["uvicorn", "uvicorn.error", "uvicorn.access", "uvicorn.asgi"],
+                maxsize=self.log_queue_size,
+            )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (Config.from_snapshot, (self.snapshot(),))
+
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        Validate the configuration and resolve everything that doesn't depend
+        on the application, so that it isn't repeated in each worker process.
+        """
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1, got %d" % self.workers)
+        state = {
+            key: value
+            for key, value in self.__dict__.items()
+            if key not in LOADED_ATTRIBUTES
+        }
+        state["loaded"] = False
+        state["encoded_headers"] = self._encode_headers()
+
+        try:
+            if isinstance(self.http, str):
+                state["http"] = import_from_string(HTTP_PROTOCOLS[self.http])
+            if isinstance(self.ws, str):
+                state["ws"] = import_from_string(WS_PROTOCOLS[self.ws])
+            state["lifespan_class"] = import_from_string(LIFESPAN[self.lifespan])
+        except KeyError as exc:
+            raise ValueError("Unknown protocol or lifespan %s" % exc) from None
+        return ConfigSnapshot(state)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: ConfigSnapshot) -> "Config":
+        config = cls.__new__(cls)
+        config.__dict__.update(snapshot.state)
+        return config
+
+    def _encode_headers(self) -> List[Tuple[bytes, bytes]]:
+        encoded_headers = [
+            (key.lower().encode("latin1"), value.encode("latin1"))
+            for key, value in self.headers
+        ]
+        return (
+            [(b"server", b"uvicorn")] + encoded_headers
+            if b"server" not in dict(encoded_headers) and self.server_header
+            else encoded_headers
+        )
 
     def load(self) -> None:
         assert not self.loaded
@@ -441,19 +817,20 @@ class Config:
                 cert_reqs=self.ssl_cert_reqs,
                 ca_certs=self.ssl_ca_certs,
                 ciphers=self.ssl_ciphers,
+                alpn_protocols=self.ssl_alpn_protocols,
+                ecdh_curve=self.ssl_ecdh_curve,
+            )
+            from uvicorn.tls import HandshakeStats
+
+            self.ssl_handshake_stats: Optional[HandshakeStats] = HandshakeStats(
+                self.metrics, sni_callback=self.ssl.sni_callback
             )
+            self.ssl.sni_callback = self.ssl_handshake_stats.client_hello
         else:
             self.ssl = None
+            self.ssl_handshake_stats = None
 
-        encoded_headers = [
-            (key.lower().encode("latin1"), value.encode("latin1"))
-            for key, value in self.headers
-        ]
-        self.encoded_headers = (
-            [(b"server", b"uvicorn")] + encoded_headers
-            if b"server" not in dict(encoded_headers) and self.server_header
-            else encoded_headers
-        )
+        self.encoded_headers = self._encode_headers()
 
         if isinstance(self.http, str):
             http_protocol_class = import_from_string(HTTP_PROTOCOLS[self.http])
@@ -467,13 +844,16 @@ class Config:
         else:
             self.ws_protocol_class = self.ws
 
-        self.lifespan_class = import_from_string(LIFESPAN[self.lifespan])
+        if getattr(self, "lifespan_class", None) is None:
+            # Already resolved when loading a config built from a snapshot.
+            self.lifespan_class = import_from_string(LIFESPAN[self.lifespan])
 
         try:
             self.loaded_app = import_from_string(self.app)
         except ImportFromStringError as exc:
             logger.error("Error loading ASGI app. %s" % exc)
             sys.exit(1)
+        profiler.mark("app imported")
 
         try:
             self.loaded_app = self.loaded_app()
@@ -498,18 +878,90 @@ class Config:
                 use_asgi_3 = asyncio.iscoroutinefunction(call)
             self.interface = "asgi3" if use_asgi_3 else "asgi2"
 
+        # Middlewares are imported only when they are used, to keep startup fast.
         if self.interface == "wsgi":
+            from uvicorn.middleware.wsgi import WSGIMiddleware
+
             self.loaded_app = WSGIMiddleware(self.loaded_app)
             self.ws_protocol_class = None
         elif self.interface == "asgi2":
+            from uvicorn.middleware.asgi2 import ASGI2Middleware
+
             self.loaded_app = ASGI2Middleware(self.loaded_app)
 
         if logger.level <= TRACE_LOG_LEVEL:
+            from uvicorn.middleware.message_logger import MessageLoggerMiddleware
+
             self.loaded_app = MessageLoggerMiddleware(self.loaded_app)
         if self.proxy_headers:
+            from uvicorn.proxyheaders import ProxyHeadersMiddleware
+
             self.loaded_app = ProxyHeadersMiddleware(
                 self.loaded_app, trusted_hosts=self.forwarded_allow_ips
             )
+        if self.cancel_on_disconnect:
+            from uvicorn.cancellation import CancellationMiddleware
+
+            self.loaded_app = CancellationMiddleware(
+                self.loaded_app, metrics=self.metrics
+            )
+        if self.request_timeout is not None or self.request_timeout_routes:
+            from uvicorn.deadline import DeadlineMiddleware
+
+            try:
+                self.loaded_app = DeadlineMiddleware(
+                    self.loaded_app,
+                    timeout=self.request_timeout,
+                    routes=self.request_timeout_routes,
+                    metrics=self.metrics,
+                )
+            except ValueError as exc:
+                logger.error("Error loading request timeout routes. %s" % exc)
+                sys.exit(1)
+        if self.compression:
+            from uvicorn.compression import CompressionMiddleware
+
+            self.loaded_app = CompressionMiddleware(
+                self.loaded_app,
+                minimum_size=self.compression_minimum_size,
+                level=self.compression_level,
+                metrics=self.metrics,
+            )
+        if self.adaptive_concurrency:
+            from uvicorn.concurrency import AdaptiveConcurrencyMiddleware
+
+            try:
+                self.loaded_app = AdaptiveConcurrencyMiddleware(
+                    self.loaded_app,
+                    routes=self.adaptive_concurrency_routes,
+                    target_latency=self.adaptive_concurrency_target,
+                    max_limit=self.limit_concurrency,
+                )
+            except ValueError as exc:
+                logger.error("Error loading adaptive concurrency routes. %s" % exc)
+                sys.exit(1)
+        if self.static_mounts:
+            # Outside the concurrency limiter, static files are cheap to serve.
+            from uvicorn.staticfiles import StaticFilesMiddleware
+
+            try:
+                self.loaded_app = StaticFilesMiddleware(
+                    self.loaded_app,
+                    mounts=self.static_mounts,
+                    precompress=self.compression,
+                )
+            except ValueError as exc:
+                logger.error("Error loading static files. %s" % exc)
+                sys.exit(1)
+        if self.metrics is not None:
+            from uvicorn.metrics import MetricsMiddleware
+
+            self.metrics.attach()
+            self.loaded_app = MetricsMiddleware(self.loaded_app, self.metrics)
+        if self.shared_cache is not None:
+            from uvicorn.sharedcache import install_shared_cache
+
+            install_shared_cache(self.shared_cache)
 
         self.loaded = True
 
@@ -518,15 +970,18 @@ class Config:
         if loop_setup is not None:
             loop_setup(use_subprocess=self.use_subprocess)
 
-    def bind_socket(self) -> socket.socket:
+    def bind_socket(self, target: Optional[BindTarget] = None) -> socket.socket:
+        if target is None:
+            target = BindTarget(self.host, self.port, self.uds, self.fd)
+
         logger_args: List[Union[str, int]]
-        if self.uds:  # pragma: py-win32
-            path = self.uds
+        if target.uds:  # pragma: py-win32
+            path = target.uds
             sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             try:
                 sock.bind(path)
                 uds_perms = 0o666
-                os.chmod(self.uds, uds_perms)
+                os.chmod(target.uds, uds_perms)
             except OSError as exc:
                 logger.error(exc)
                 sys.exit(1)
@@ -538,9 +993,9 @@ class Config:
                 + click.style(sock_name_format, bold=True)
                 + " (Press CTRL+C to quit)"
             )
-            logger_args = [self.uds]
-        elif self.fd:  # pragma: py-win32
-            sock = socket.fromfd(self.fd, socket.AF_UNIX, socket.SOCK_STREAM)
+            logger_args = [target.uds]
+        elif target.fd is not None:  # pragma: py-win32
+            sock = socket_from_fd(target.fd)
             message = "Uvicorn running on socket %s (Press CTRL+C to quit)"
             fd_name_format = "%s"
             color_message = (
@@ -553,15 +1008,18 @@ class Config:
             family = socket.AF_INET
             addr_format = "%s://%s:%d"
 
-            if self.host and ":" in self.host:  # pragma: py-win32
+            if target.host and ":" in target.host:  # pragma: py-win32
                 # It's an IPv6 address.
                 family = socket.AF_INET6
                 addr_format = "%s://[%s]:%d"
 
             sock = socket.socket(family=family)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if family == socket.AF_INET6 and self.bind:  # pragma: py-win32
+                # As asyncio does, so IPv4 and IPv6 targets can share a port.
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
             try:
-                sock.bind((self.host, self.port))
+                sock.bind((target.host, target.port))
             except OSError as exc:
                 logger.error(exc)
                 sys.exit(1)
@@ -573,11 +1031,81 @@ class Config:
                 + " (Press CTRL+C to quit)"
             )
             protocol_name = "https" if self.is_ssl else "http"
-            logger_args = [protocol_name, self.host, sock.getsockname()[1]]
+            logger_args = [protocol_name, target.host, sock.getsockname()[1]]
         logger.info(message, *logger_args, extra={"color_message": color_message})
+        self.configure_socket(sock)
         sock.set_inheritable(True)
         return sock
 
+    def activated_sockets(self) -> List[socket.socket]:
+        """
+        Listening sockets passed in by socket activation. The service manager
+        keeps them open while the server restarts, so connections wait in the
+        kernel's accept queue instead of being refused.
+        """
+        sockets = []
+        for fd in listen_fds():  # pragma: py-win32
+            sock = socket_from_fd(fd)
+            os.close(fd)
+            if sock.type != socket.SOCK_STREAM:
+                logger.warning("Ignoring activated socket %d, not a stream socket.", fd)
+                sock.close()
+                continue
+            sock.set_inheritable(True)
+            logger.info(
+                "Uvicorn running on activated socket %s (Press CTRL+C to quit)",
+                sock.getsockname(),
+                extra={
+                    "color_message": "Uvicorn running on activated socket "
+                    + click.style("%s", bold=True)
+                    + " (Press CTRL+C to quit)"
+                },
+            )
+            self.configure_socket(sock)
+            sockets.append(sock)
+        return sockets
+
+    def configure_socket(self, sock: socket.SocketType) -> None:
+        """
+        Set the socket options on a listening socket, which accepted connections
+        inherit, and log the values the kernel settled on.
+        """
+        values = {
+            "rcvbuf": self.socket_rcvbuf,
+            "sndbuf": self.socket_sndbuf,
+            "defer_accept": self.tcp_defer_accept,
+            "fastopen": self.tcp_fastopen,
+        }
+        is_tcp = sock.family in TCP_FAMILIES
+        effective = ["backlog=%d" % min(self.backlog, resolve_backlog("auto"))]
+        if is_tcp:
+            effective.append("nodelay=%s" % ("on" if self.tcp_nodelay else "off"))
+        for name, (level, option_name) in SOCKET_OPTIONS.items():
+            option = getattr(socket, option_name, None)
+            if option is None or (level == socket.IPPROTO_TCP and not is_tcp):
+                continue
+            value = values[name]
+            if value is not None:
+                try:
+                    sock.setsockopt(level, option, value)
+                except OSError as exc:
+                    logger.warning(
+                        "Unable to set %s to %d: %s", option_name, value, exc
+                    )
+            try:
+                effective.append("%s=%d" % (name, sock.getsockopt(level, option)))
+            except OSError:  # pragma: no cover
+                pass
+        logger.info("Socket options %s", ", ".join(effective))
+
+    def bind_sockets(self) -> List[socket.socket]:
+        activated = self.activated_sockets()
+        if activated:
+            return activated
+        if self.bind:
+            return [self.bind_socket(target) for target in self.bind]
+        return [self.bind_socket()]
+
     @property
     def should_reload(self) -> bool:
         return isinstance(self.app, str) and self.reload
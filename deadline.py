@@ -0,0 +1,208 @@
+"""
+Request deadlines.
+
+Each request gets a time budget, from the most specific route prefix or the
+default, which the client can shorten with an `X-Request-Timeout` header. The
+application checks what is left of it before each stage of its work, and
+bounds blocking calls by it, so a stuck backend fails requests quickly
+instead of holding workers until clients give up.
+
+`DeadlineMiddleware` answers 504 when `DeadlineExceeded` reaches it. Frameworks
+that turn unhandled exceptions into a 500 response first, like Starlette and
+FastAPI, should register `deadline_exceeded_handler` for it instead:
+
+    app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        ASGISendEvent,
+        Scope,
+    )
+
+    from uvicorn.metrics import SharedMetrics
+
+logger = logging.getLogger("uvicorn.error")
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+_current_deadline: "ContextVar[Optional[Deadline]]" = ContextVar(
+    "deadline", default=None
+)
+
+
+def current_deadline() -> Optional["Deadline"]:
+    """
+    The deadline of the request being handled, or None if it has none.
+    """
+    return _current_deadline.get()
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str) -> None:
+        super().__init__("Deadline exceeded during %s" % stage)
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(
+        self,
+        timeout: float,
+        path: str = "",
+        metrics: Optional["SharedMetrics"] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+        self.path = path
+        self.metrics = metrics
+        self.reported = False
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        self.require(0.0, stage)
+
+    def require(self, seconds: float, stage: str) -> None:
+        """
+        Fail now if less than `seconds` are left for `stage`.
+        """
+        if self.expires_at - time.monotonic() <= seconds:
+            raise DeadlineExceeded(stage)
+
+    def acquire(self, lock: threading.Lock, stage: str) -> None:
+        """
+        Acquire `lock`, waiting no longer than the time left.
+        """
+        if not lock.acquire(timeout=self.remaining()):
+            raise DeadlineExceeded(stage)
+
+    def report(self, exc: DeadlineExceeded) -> None:
+        """
+        Log and count the request as having run out of time, once.
+        """
+        if self.reported:
+            return
+        self.reported = True
+        logger.warning(
+            'Request "%s" exceeded its %.1fs deadline during %s',
+            self.path,
+            self.timeout,
+            exc.stage,
+        )
+        if self.metrics is not None:
+            self.metrics.inc("deadline_exceeded")
+
+
+async def deadline_exceeded_handler(request: Any, exc: DeadlineExceeded) -> Any:
+    """
+    Starlette and FastAPI exception handler answering `DeadlineExceeded` with
+    a 504, before the framework's own error handling answers 500.
+    """
+    from starlette.responses import PlainTextResponse
+
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.report(exc)
+    return PlainTextResponse(str(exc), status_code=504)
+
+
+def parse_route_timeouts(routes: Sequence[str]) -> List[Tuple[str, float]]:
+    """
+    Parse "PREFIX=SECONDS" strings, longest prefix first.
+    """
+    timeouts = []
+    for route in routes:
+        prefix, sep, timeout = route.partition("=")
+        if not sep:
+            raise ValueError(
+                'Route timeout "%s" must be in format "<prefix>=<seconds>".' % route
+            )
+        timeouts.append((prefix, float(timeout)))
+    timeouts.sort(key=lambda item: len(item[0]), reverse=True)
+    return timeouts
+
+
+class DeadlineMiddleware:
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        timeout: Optional[float] = None,
+        routes: Sequence[str] = (),
+        metrics: Optional["SharedMetrics"] = None,
+    ) -> None:
+        self.app = app
+        self.timeout = timeout
+        self.routes = parse_route_timeouts(routes)
+        self.metrics = metrics
+
+    def timeout_for(self, scope: "Scope") -> Optional[float]:
+        timeout = self.timeout
+        for prefix, route_timeout in self.routes:
+            if scope["path"].startswith(prefix):
+                timeout = route_timeout
+                break
+        for name, value in scope["headers"]:
+            if name == TIMEOUT_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                # Clients may ask for less time, but not for more.
+                if requested > 0 and (timeout is None or requested < timeout):
+                    timeout = requested
+                break
+        return timeout
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timeout = self.timeout_for(scope)
+        if timeout is None:
+            return await self.app(scope, receive, send)
+
+        response_started = False
+
+        async def send_wrapper(message: "ASGISendEvent") -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        deadline = Deadline(timeout, scope["path"], self.metrics)
+        reset_deadline = _current_deadline.set(deadline)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except DeadlineExceeded as exc:
+            deadline.report(exc)
+            if response_started:
+                raise
+            body = str(exc).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [
+                        (b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", str(len(body)).encode("latin-1")),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+        finally:
+            _current_deadline.reset(reset_deadline)
@@ -0,0 +1,610 @@
+"""
+HTTP/2, with the `h2` package.
+
+Negotiated with ALPN on TLS connections, and with prior knowledge on cleartext
+ones, where a client opens with the HTTP/2 connection preface. Connections that
+don't speak HTTP/2 are handed to the HTTP/1.1 protocol.
+
+Every stream runs as its own ASGI request. A stream's received data is only
+acknowledged to the client as the application reads it, so each stream's flow
+control window limits how much request body is buffered, and response bodies
+are sent as the client's windows allow.
+"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union, cast
+from urllib.parse import unquote
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+from h2.errors import ErrorCodes
+from h2.settings import SettingCodes
+
+from uvicorn.config import HTTP_PROTOCOLS, Config
+from uvicorn.importer import import_from_string
+from uvicorn.logging import TRACE_LOG_LEVEL
+from uvicorn.protocols.http.flow_control import FlowControl, service_unavailable
+from uvicorn.protocols.utils import (
+    get_client_addr,
+    get_local_addr,
+    get_path_with_query_string,
+    get_remote_addr,
+    is_ssl,
+)
+from uvicorn.server import ServerState
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveEvent,
+        ASGISendEvent,
+        HTTPDisconnectEvent,
+        HTTPRequestEvent,
+        HTTPResponseBodyEvent,
+        HTTPResponseStartEvent,
+        HTTPScope,
+    )
+
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+# Headers that are specific to an HTTP/1.1 connection, and not allowed in HTTP/2.
+CONNECTION_HEADERS = frozenset(
+    (
+        b"connection",
+        b"keep-alive",
+        b"proxy-connection",
+        b"transfer-encoding",
+        b"upgrade",
+    )
+)
+
+HTTP11Protocol = import_from_string(HTTP_PROTOCOLS["auto"])
+
+
+class H2Protocol(asyncio.Protocol):
+    def __init__(
+        self,
+        config: Config,
+        server_state: ServerState,
+        app_state: Dict[str, Any],
+        _loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        if not config.loaded:
+            config.load()
+
+        self.config = config
+        self.app = config.loaded_app
+        self.loop = _loop or asyncio.get_event_loop()
+        self.logger = logging.getLogger("uvicorn.error")
+        self.access_logger = logging.getLogger("uvicorn.access")
+        self.access_log = self.access_logger.hasHandlers()
+        self.root_path = config.root_path
+        self.limit_concurrency = config.limit_concurrency
+        self.app_state = app_state
+
+        # Timeouts
+        self.timeout_keep_alive_task: Optional[asyncio.TimerHandle] = None
+        self.timeout_keep_alive = config.timeout_keep_alive
+
+        # Shared server state
+        self.server_state = server_state
+        self.connections = server_state.connections
+        self.tasks = server_state.tasks
+
+        # Per-connection state
+        self.transport: asyncio.Transport = None  # type: ignore[assignment]
+        self.flow: FlowControl = None  # type: ignore[assignment]
+        self.server: Optional[Tuple[str, int]] = None
+        self.client: Optional[Tuple[str, int]] = None
+        self.scheme: Optional[str] = None
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding=None)
+        )
+        self.streams: Dict[int, RequestResponseCycle] = {}
+        self.closing = False
+        # Data received before it's known whether the client speaks HTTP/2.
+        self.preface = b""
+        # The HTTP/1.1 protocol this connection is handed to, if it isn't HTTP/2.
+        self.http1: Optional[asyncio.Protocol] = None
+
+    @property
+    def cycle(self) -> Any:
+        """
+        The HTTP/1.1 request, or any HTTP/2 stream in progress, so the server
+        sees the connection as busy.
+        """
+        if self.http1 is not None:
+            return self.http1.cycle  # type: ignore[attr-defined]
+        for stream in self.streams.values():
+            return stream
+        return None
+
+    # Protocol interface
+    def connection_made(  # type: ignore[override]
+        self, transport: asyncio.Transport
+    ) -> None:
+        self.transport = transport
+        self.server = get_local_addr(transport)
+        self.client = get_remote_addr(transport)
+        self.scheme = "https" if is_ssl(transport) else "http"
+
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.selected_alpn_protocol() != "h2":
+            self.fallback(b"")
+        elif ssl_object is not None:
+            self.start()
+
+    def start(self) -> None:
+        self.connections.add(self)
+        self.flow = FlowControl(self.transport)
+
+        if self.logger.level <= TRACE_LOG_LEVEL:
+            prefix = "%s:%d - " % self.client if self.client else ""
+            self.logger.log(TRACE_LOG_LEVEL, "%sHTTP/2 connection made", prefix)
+
+        self.conn.local_settings.update(
+            {SettingCodes.MAX_CONCURRENT_STREAMS: self.config.h2_max_concurrent_streams}
+        )
+        self.conn.initiate_connection()
+        self.flush()
+        self.schedule_keep_alive()
+
+    def fallback(self, data: bytes) -> None:
+        self.http1 = HTTP11Protocol(  # type: ignore[call-arg]
+            config=self.config,
+            server_state=self.server_state,
+            app_state=self.app_state,
+            _loop=self.loop,
+        )
+        self.http1.connection_made(self.transport)
+        if data:
+            self.http1.data_received(data)  # type: ignore[attr-defined]
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.http1 is not None:
+            self.http1.connection_lost(exc)
+            return
+        self.connections.discard(self)
+
+        if self.logger.level <= TRACE_LOG_LEVEL:
+            prefix = "%s:%d - " % self.client if self.client else ""
+            self.logger.log(TRACE_LOG_LEVEL, "%sHTTP/2 connection lost", prefix)
+
+        self.unset_keep_alive()
+        for stream in self.streams.values():
+            stream.disconnect()
+        self.streams.clear()
+        if self.flow is not None:
+            self.flow.resume_writing()
+        if exc is None:
+            self.transport.close()
+
+    def eof_received(self) -> None:
+        if self.http1 is not None:
+            self.http1.eof_received()
+
+    def data_received(self, data: bytes) -> None:
+        if self.http1 is not None:
+            self.http1.data_received(data)  # type: ignore[attr-defined]
+            return
+        if self.flow is None:
+            # Cleartext, so look for the preface of a client with prior knowledge.
+            self.preface += data
+            if not PREFACE.startswith(self.preface[: len(PREFACE)]):
+                data, self.preface = self.preface, b""
+                self.fallback(data)
+                return
+            if len(self.preface) < len(PREFACE):
+                return
+            data, self.preface = self.preface, b""
+            self.start()
+
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError as exc:
+            self.logger.warning("Invalid HTTP/2 data received: %s", exc)
+            self.flush()
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.handle_request(event)
+            elif isinstance(event, h2.events.DataReceived):
+                stream = self.streams.get(event.stream_id)
+                if stream is None:
+                    self.conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id
+                    )
+                else:
+                    stream.receive_data(event.data, event.flow_controlled_length)
+            elif isinstance(event, h2.events.StreamEnded):
+                stream = self.streams.get(event.stream_id)
+                if stream is not None:
+                    stream.more_body = False
+                    stream.message_event.set()
+            elif isinstance(event, h2.events.StreamReset):
+                stream = self.streams.pop(event.stream_id, None)
+                if stream is not None:
+                    stream.disconnect()
+                    stream.release()
+                    if not self.streams:
+                        self.schedule_keep_alive()
+            elif isinstance(event, h2.events.WindowUpdated):
+                if event.stream_id == 0:
+                    for stream in self.streams.values():
+                        stream.window_event.set()
+                elif event.stream_id in self.streams:
+                    self.streams[event.stream_id].window_event.set()
+            elif isinstance(event, h2.events.RemoteSettingsChanged):
+                if SettingCodes.INITIAL_WINDOW_SIZE in event.changed_settings:
+                    for stream in self.streams.values():
+                        stream.window_event.set()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.flush()
+
+    def handle_request(self, event: h2.events.RequestReceived) -> None:
+        stream_id = event.stream_id
+        if self.closing:
+            self.conn.reset_stream(stream_id, ErrorCodes.REFUSED_STREAM)
+            return
+
+        headers = []
+        pseudo_headers = {}
+        for name, value in event.headers:
+            if name.startswith(b":"):
+                pseudo_headers[name] = value
+            else:
+                headers.append((name, value))
+        authority = pseudo_headers.get(b":authority")
+        if authority is not None and not any(name == b"host" for name, _ in headers):
+            headers.insert(0, (b"host", authority))
+
+        raw_path, _, query_string = pseudo_headers.get(b":path", b"").partition(b"?")
+        try:
+            method = pseudo_headers.get(b":method", b"").decode("ascii")
+            path = unquote(raw_path.decode("ascii"))
+        except UnicodeDecodeError:
+            self.logger.warning("Invalid HTTP/2 request target received.")
+            self.conn.reset_stream(stream_id, ErrorCodes.PROTOCOL_ERROR)
+            return
+
+        scope: "HTTPScope" = {  # type: ignore[typeddict-item]
+            "type": "http",
+            "asgi": {
+                "version": self.config.asgi_version,
+                "spec_version": "2.3",
+            },
+            "http_version": "2",
+            "server": self.server,
+            "client": self.client,
+            "scheme": self.scheme,  # type: ignore[typeddict-item]
+            "method": method,
+            "root_path": self.root_path,
+            "path": path,
+            "raw_path": raw_path,
+            "query_string": query_string,
+            "headers": headers,
+            "state": self.app_state.copy(),
+        }
+
+        # Handle 503 responses when 'limit_concurrency' is exceeded.
+        if self.limit_concurrency is not None and (
+            len(self.connections) >= self.limit_concurrency
+            or len(self.tasks) >= self.limit_concurrency
+        ):
+            app = service_unavailable
+            message = "Exceeded concurrency limit."
+            self.logger.warning(message)
+        else:
+            app = self.app
+
+        stream = RequestResponseCycle(
+            stream_id=stream_id,
+            scope=scope,
+            protocol=self,
+            more_body=not event.stream_ended,
+        )
+        self.streams[stream_id] = stream
+        self.unset_keep_alive()
+        task = self.loop.create_task(stream.run_asgi(app))
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+    def flush(self) -> None:
+        data = self.conn.data_to_send()
+        if data and not self.transport.is_closing():
+            self.transport.write(data)
+
+    def on_response_complete(self, stream: "RequestResponseCycle") -> None:
+        self.server_state.total_requests += 1
+        if self.streams.get(stream.stream_id) is stream:
+            del self.streams[stream.stream_id]
+        stream.release()
+        if self.closing and not self.streams:
+            self.close()
+        elif not self.streams:
+            self.schedule_keep_alive()
+
+    def schedule_keep_alive(self) -> None:
+        """
+        Close the connection if no stream is opened on it in time.
+        """
+        self.unset_keep_alive()
+        if not self.transport.is_closing():
+            self.timeout_keep_alive_task = self.loop.call_later(
+                self.timeout_keep_alive, self.timeout_keep_alive_handler
+            )
+
+    def unset_keep_alive(self) -> None:
+        if self.timeout_keep_alive_task is not None:
+            self.timeout_keep_alive_task.cancel()
+            self.timeout_keep_alive_task = None
+
+    def timeout_keep_alive_handler(self) -> None:
+        """
+        Called on a keep-alive connection if no new stream is opened in time.
+        """
+        self.timeout_keep_alive_task = None
+        if not self.streams:
+            self.close()
+
+    def close(self) -> None:
+        if not self.transport.is_closing():
+            self.conn.close_connection()
+            self.flush()
+            self.transport.close()
+
+    def shutdown(self) -> None:
+        """
+        Called by the server to commence a graceful shutdown.
+        """
+        if self.http1 is not None:
+            self.http1.shutdown()  # type: ignore[attr-defined]
+        elif self.flow is None:
+            self.transport.close()
+        elif not self.streams:
+            self.close()
+        else:
+            # Let the streams in progress finish, refusing any new ones.
+            self.closing = True
+
+    def pause_writing(self) -> None:
+        """
+        Called by the transport when the write buffer exceeds the high water mark.
+        """
+        if self.http1 is not None:
+            self.http1.pause_writing()
+        elif self.flow is not None:
+            self.flow.pause_writing()
+
+    def resume_writing(self) -> None:
+        """
+        Called by the transport when the write buffer drops below the low water mark.
+        """
+        if self.http1 is not None:
+            self.http1.resume_writing()
+        elif self.flow is not None:
+            self.flow.resume_writing()
+
+
+class RequestResponseCycle:
+    def __init__(
+        self,
+        stream_id: int,
+        scope: "HTTPScope",
+        protocol: H2Protocol,
+        more_body: bool,
+    ) -> None:
+        self.stream_id = stream_id
+        self.scope = scope
+        self.protocol = protocol
+        self.conn = protocol.conn
+        self.flow = protocol.flow
+        self.logger = protocol.logger
+        self.access_logger = protocol.access_logger
+        self.access_log = protocol.access_log
+        self.default_headers = protocol.server_state.default_headers
+        self.message_event = asyncio.Event()
+        # Set when the client may have opened the flow control window.
+        self.window_event = asyncio.Event()
+
+        # Connection state
+        self.disconnected = False
+
+        # Request state
+        self.body = b""
+        self.more_body = more_body
+        self.request_complete = False
+        # Bytes received but not yet acknowledged, until the application reads them.
+        self.unacknowledged = 0
+
+        # Response state
+        self.response_started = False
+        self.response_complete = False
+
+    def receive_data(self, data: bytes, flow_controlled_length: int) -> None:
+        self.body += data
+        self.unacknowledged += flow_controlled_length
+        self.message_event.set()
+
+    def release(self) -> None:
+        """
+        Acknowledge everything received, opening the flow control window again.
+        """
+        if self.unacknowledged:
+            # Closed streams still count against the connection's window.
+            self.conn.acknowledge_received_data(self.unacknowledged, self.stream_id)
+            self.unacknowledged = 0
+            self.protocol.flush()
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+        self.message_event.set()
+        self.window_event.set()
+
+    def reset(self) -> None:
+        if not self.disconnected:
+            self.conn.reset_stream(self.stream_id, ErrorCodes.INTERNAL_ERROR)
+            self.protocol.flush()
+        self.response_complete = True
+        self.protocol.on_response_complete(self)
+
+    # ASGI exception wrapper
+    async def run_asgi(self, app: "ASGI3Application") -> None:
+        try:
+            result = await app(  # type: ignore[func-returns-value]
+                self.scope, self.receive, self.send
+            )
+        except BaseException as exc:
+            msg = "Exception in ASGI application\n"
+            self.logger.error(msg, exc_info=exc)
+            if not self.response_started:
+                await self.send_500_response()
+            else:
+                self.reset()
+        else:
+            if result is not None:
+                msg = "ASGI callable should return None, but returned '%s'."
+                self.logger.error(msg, result)
+                self.reset()
+            elif not self.response_started and not self.disconnected:
+                msg = "ASGI callable returned without starting response."
+                self.logger.error(msg)
+                await self.send_500_response()
+            elif not self.response_complete and not self.disconnected:
+                msg = "ASGI callable returned without completing response."
+                self.logger.error(msg)
+                self.reset()
+            elif self.disconnected and not self.response_complete:
+                self.response_complete = True
+                self.protocol.on_response_complete(self)
+
+    async def send_500_response(self) -> None:
+        response_start_event: "HTTPResponseStartEvent" = {
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+        }
+        await self.send(response_start_event)
+        response_body_event: "HTTPResponseBodyEvent" = {
+            "type": "http.response.body",
+            "body": b"Internal Server Error",
+            "more_body": False,
+        }
+        await self.send(response_body_event)
+
+    # ASGI interface
+    async def send(self, message: "ASGISendEvent") -> None:
+        message_type = message["type"]
+
+        if self.flow.write_paused and not self.disconnected:
+            await self.flow.drain()
+
+        if self.disconnected:
+            return
+
+        if not self.response_started:
+            # Sending response status and headers
+            if message_type != "http.response.start":
+                msg = "Expected ASGI message 'http.response.start', but got '%s'."
+                raise RuntimeError(msg % message_type)
+            message = cast("HTTPResponseStartEvent", message)
+
+            self.response_started = True
+
+            status_code = message["status"]
+            headers: List[Tuple[bytes, bytes]] = [(b":status", b"%d" % status_code)]
+            for name, value in self.default_headers + list(message.get("headers", [])):
+                name = name.lower()
+                if name not in CONNECTION_HEADERS:
+                    headers.append((name, value))
+
+            if self.access_log:
+                self.access_logger.info(
+                    '%s - "%s %s HTTP/%s" %d',
+                    get_client_addr(self.scope),
+                    self.scope["method"],
+                    get_path_with_query_string(self.scope),
+                    self.scope["http_version"],
+                    status_code,
+                )
+
+            self.conn.send_headers(self.stream_id, headers)
+            self.protocol.flush()
+
+        elif not self.response_complete:
+            # Sending response body
+            if message_type != "http.response.body":
+                msg = "Expected ASGI message 'http.response.body', but got '%s'."
+                raise RuntimeError(msg % message_type)
+            message = cast("HTTPResponseBodyEvent", message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if self.scope["method"] == "HEAD":
+                body = b""
+            await self.send_data(body)
+
+            # Handle response completion
+            if not more_body and not self.disconnected:
+                self.response_complete = True
+                self.message_event.set()
+                self.conn.end_stream(self.stream_id)
+                self.protocol.flush()
+                self.protocol.on_response_complete(self)
+
+        else:
+            # Response already sent
+            msg = "Unexpected ASGI message '%s' sent, after response already completed."
+            raise RuntimeError(msg % message_type)
+
+    async def send_data(self, data: bytes) -> None:
+        """
+        Send as much of `data` as the flow control windows allow, waiting for
+        the client to open them for the rest.
+        """
+        while data:
+            try:
+                window = min(
+                    self.conn.local_flow_control_window(self.stream_id),
+                    self.conn.max_outbound_frame_size,
+                )
+            except h2.exceptions.StreamClosedError:
+                self.disconnect()
+                return
+            if window <= 0:
+                self.window_event.clear()
+                await self.window_event.wait()
+                if self.disconnected:
+                    return
+                continue
+            self.conn.send_data(self.stream_id, data[:window])
+            self.protocol.flush()
+            data = data[window:]
+
+    async def receive(self) -> "ASGIReceiveEvent":
+        while not self.disconnected and not self.response_complete:
+            if self.body or not (self.more_body or self.request_complete):
+                break
+            # Wait for more of the body, or after all of it for a disconnect.
+            self.message_event.clear()
+            await self.message_event.wait()
+
+        message: "Union[HTTPDisconnectEvent, HTTPRequestEvent]"
+        if self.disconnected or self.response_complete:
+            message = {"type": "http.disconnect"}
+        else:
+            message = {
+                "type": "http.request",
+                "body": self.body,
+                "more_body": self.more_body,
+            }
+            self.body = b""
+            self.request_complete = not self.more_body
+            self.release()
+
+        return message
@@ -1,8 +1,13 @@
+import atexit
 import http
+import json
 import logging
+import queue
 import sys
+import threading
+import time
 from copy import copy
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import click
 
@@ -45,8 +50,22 @@ class ColourizedFormatter(logging.Formatter):
             self.use_colors = use_colors
         else:
             self.use_colors = sys.stdout.isatty()
+        self._level_prefixes: Dict[Tuple[int, str], str] = {}
         super().__init__(fmt=fmt, datefmt=datefmt, style=style)
 
+    def level_prefix(self, level_name: str, level_no: int) -> str:
+        try:
+            return self._level_prefixes[(level_no, level_name)]
+        except KeyError:
+            pass
+        seperator = " " * (8 - len(level_name))
+        if self.use_colors:
+            prefix = self.color_level_name(level_name, level_no) + ":" + seperator
+        else:
+            prefix = level_name + ":" + seperator
+        self._level_prefixes[(level_no, level_name)] = prefix
+        return prefix
+
     def color_level_name(self, level_name: str, level_no: int) -> str:
         def default(level_name: str) -> str:
             return str(level_name)  # pragma: no cover
@@ -59,14 +78,12 @@ class ColourizedFormatter(logging.Formatter):
 
     def formatMessage(self, record: logging.LogRecord) -> str:
         recordcopy = copy(record)
-        levelname = recordcopy.levelname
-        seperator = " " * (8 - len(recordcopy.levelname))
-        if self.use_colors:
-            levelname = self.color_level_name(levelname, recordcopy.levelno)
-            if "color_message" in recordcopy.__dict__:
-                recordcopy.msg = recordcopy.__dict__["color_message"]
-                recordcopy.__dict__["message"] = recordcopy.getMessage()
-        recordcopy.__dict__["levelprefix"] = levelname + ":" + seperator
+        if self.use_colors and "color_message" in recordcopy.__dict__:
+            recordcopy.msg = recordcopy.__dict__["color_message"]
+            recordcopy.__dict__["message"] = recordcopy.getMessage()
+        recordcopy.__dict__["levelprefix"] = self.level_prefix(
+            recordcopy.levelname, recordcopy.levelno
+        )
         return super().formatMessage(recordcopy)
 
 
@@ -84,7 +101,19 @@ class AccessFormatter(ColourizedFormatter):
         5: lambda code: click.style(str(code), fg="bright_red"),
     }
 
-    def get_status_code(self, status_code: int) -> str:
+    def __init__(
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        style: Literal["%", "{", "$"] = "%",
+        use_colors: Optional[bool] = None,
+    ):
+        super().__init__(fmt=fmt, datefmt=datefmt, style=style, use_colors=use_colors)
+        self._status_codes: Dict[int, str] = {}
+        for status in http.HTTPStatus:
+            self._status_codes[status.value] = self._render_status_code(status.value)
+
+    def _render_status_code(self, status_code: int) -> str:
         try:
             status_phrase = http.HTTPStatus(status_code).phrase
         except ValueError:
@@ -99,6 +128,12 @@ class AccessFormatter(ColourizedFormatter):
             return func(status_and_phrase)
         return status_and_phrase
 
+    def get_status_code(self, status_code: int) -> str:
+        try:
+            return self._status_codes[status_code]
+        except KeyError:
+            return self._render_status_code(status_code)
+
     def formatMessage(self, record: logging.LogRecord) -> str:
         recordcopy = copy(record)
         (
@@ -120,3 +155,234 @@ class AccessFormatter(ColourizedFormatter):
             }
         )
         return super().formatMessage(recordcopy)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as a single line JSON object.
+
+    Fields are read straight from the record, which is never copied.
+    """
+
+    def __init__(
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        style: Literal["%", "{", "$"] = "%",
+        use_colors: Optional[bool] = None,
+    ):
+        # `use_colors` is accepted so this can replace the default formatters.
+        super().__init__(fmt=fmt, datefmt=datefmt, style=style)
+
+    def fields(self, record: logging.LogRecord) -> Dict[str, object]:
+        return {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = self.fields(record)
+        if record.exc_info:
+            fields["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(fields, separators=(",", ":"), default=str)
+
+
+class JSONAccessFormatter(JSONFormatter):
+    def fields(self, record: logging.LogRecord) -> Dict[str, object]:
+        (
+            client_addr,
+            method,
+            full_path,
+            http_version,
+            status_code,
+        ) = record.args  # type: ignore[misc]
+        return {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "client_addr": client_addr,
+            "method": method,
+            "path": full_path,
+            "http_version": http_version,
+            "status": status_code,
+        }
+
+
+class AccessLogSampler(logging.Filter):
+    """
+    Keeps one in every `rate` successful access log records, and every record
+    for a response with a 4xx or 5xx status.
+    """
+
+    def __init__(self, rate: int = 1) -> None:
+        super().__init__()
+        self.rate = rate
+        self.count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if isinstance(args, tuple) and len(args) == 5 and int(args[4]) >= 400:
+            return True
+        self.count += 1
+        return (self.count - 1) % self.rate == 0
+
+
+class LogQueueListener:
+    """
+    Formats and writes log records on a background thread.
+
+    Records are put on a bounded queue by `QueueLogHandler` instances, so the
+    event loop never waits on a slow log sink. When the queue is full records
+    are dropped and counted instead, and the count is reported on stderr at
+    most every `report_interval` seconds. The listener writes the records it
+    finds waiting on the queue in a single batch, with one write and one flush
+    per plain `StreamHandler`. Other handlers, such as rotating file handlers,
+    handle each record themselves.
+    """
+
+    def __init__(
+        self, maxsize: int = 10000, batch_size: int = 256, report_interval: float = 60.0
+    ) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.dropped = 0
+        self._reported = 0
+        self._last_report = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._monitor, name="uvicorn-log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Write out every queued record and stop the background thread.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.report_dropped()
+
+    def report_dropped(self) -> None:
+        dropped = self.dropped - self._reported
+        self._reported += dropped
+        self._last_report = time.monotonic()
+        if dropped:
+            sys.stderr.write(
+                "Dropped %d log records, the log queue was full.\n" % dropped
+            )
+
+    def _monitor(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            self.handle_batch(batch)  # type: ignore[arg-type]
+            if stop:
+                return
+            if time.monotonic() - self._last_report >= self.report_interval:
+                self.report_dropped()
+
+    def handle_batch(
+        self, batch: List[Tuple[Sequence[logging.Handler], logging.LogRecord]]
+    ) -> None:
+        streams: Dict[logging.StreamHandler, List[str]] = {}
+        for handlers, record in batch:
+            for handler in handlers:
+                if record.levelno < handler.level:
+                    continue
+                if type(handler) is not logging.StreamHandler:
+                    handler.handle(record)
+                    continue
+                if not handler.filter(record):
+                    continue
+                try:
+                    message = handler.format(record)
+                except Exception:
+                    handler.handleError(record)
+                    continue
+                streams.setdefault(handler, []).append(message + handler.terminator)
+
+        for handler, messages in streams.items():
+            handler.acquire()
+            try:
+                handler.stream.write("".join(messages))
+                handler.flush()
+            except Exception:  # pragma: no cover
+                handler.handleError(batch[0][1])
+            finally:
+                handler.release()
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Hands records over to a `LogQueueListener`, to be written by `handlers`.
+    """
+
+    def __init__(
+        self, listener: LogQueueListener, handlers: Sequence[logging.Handler]
+    ) -> None:
+        super().__init__()
+        self.listener = listener
+        self.handlers = tuple(handlers)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # No lock is needed, `put_nowait` is thread safe.
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.listener.queue.put_nowait((self.handlers, record))
+        except queue.Full:
+            self.listener.dropped += 1
+
+
+_listener: Optional[LogQueueListener] = None
+
+
+def install_queue_logging(logger_names: Sequence[str], maxsize: int) -> None:
+    """
+    Move the handlers of the given loggers behind a shared `LogQueueListener`.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+    listener = LogQueueListener(maxsize=maxsize)
+    for name in logger_names:
+        target = logging.getLogger(name)
+        handlers: List[logging.Handler] = []
+        for handler in target.handlers:
+            if isinstance(handler, QueueLogHandler):
+                handlers.extend(handler.handlers)
+            else:
+                handlers.append(handler)
+        if handlers:
+            target.handlers = [QueueLogHandler(listener, handlers)]
+    listener.start()
+    if _listener is None:
+        atexit.register(_stop_queue_logging)
+    _listener = listener
+
+
+def _stop_queue_logging() -> None:
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,111 @@
+"""
+Event loop lag and blocked loop detection.
+
+The server's tick sleeps for a fixed interval, so how late it wakes up is the
+time the loop spent running something else. Each wakeup also refreshes a
+heartbeat, and a watchdog thread that sees the heartbeat go stale captures
+the stack of the main thread, which is the frame that is blocking the loop.
+"""
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from uvicorn.metrics import SharedMetrics
+
+logger = logging.getLogger("uvicorn.error")
+
+# Innermost frames of the blocked stack to log.
+STACK_LIMIT = 20
+
+
+class LoopMonitor:
+    """
+    * threshold - Seconds without a tick after which the loop counts as blocked,
+                  or None to only measure lag.
+    * warn_interval - Minimum seconds between warnings in the log.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float],
+        metrics: Optional["SharedMetrics"] = None,
+        warn_interval: float = 10.0,
+    ) -> None:
+        # The heartbeat is only refreshed by the server's 0.1 second tick.
+        self.threshold = None if threshold is None else max(threshold, 0.2)
+        self.metrics = metrics
+        self.warn_interval = warn_interval
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self.heartbeat = time.monotonic()
+        self._last_warning = 0.0
+        self._suppressed = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread = threading.get_ident()
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        if self.threshold is None:
+            return
+        self._thread = threading.Thread(
+            target=self._watch, name="uvicorn-loop-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def tick(self, lag: float) -> None:
+        """
+        Called from the event loop with how late its last timer fired.
+        """
+        self.heartbeat = time.monotonic()
+        lag = max(0.0, lag)
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if self.metrics is not None:
+            self.metrics.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self) -> None:
+        assert self.threshold is not None
+        threshold = self.threshold
+        reported = 0.0
+        while not self._stop.wait(threshold / 2):
+            heartbeat = self.heartbeat
+            if time.monotonic() - heartbeat < threshold or heartbeat == reported:
+                continue
+            # Report each stall once, however long it lasts.
+            reported = heartbeat
+            self.slow_callbacks += 1
+            if self.metrics is not None:
+                self.metrics.inc("event_loop_blocked")
+            self._warn(time.monotonic() - heartbeat)
+
+    def _warn(self, blocked_for: float) -> None:
+        now = time.monotonic()
+        if now - self._last_warning < self.warn_interval:
+            self._suppressed += 1
+            return
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        suppressed = ""
+        if self._suppressed:
+            suppressed = " (%d similar warnings suppressed)" % self._suppressed
+        self._last_warning = now
+        self._suppressed = 0
+        logger.warning(
+            "Event loop blocked for more than %.3fs%s, in:\n%s",
+            blocked_for,
+            suppressed,
+            stack.rstrip(),
+        )
@@ -13,18 +13,27 @@ from uvicorn.config import (
     HTTP_PROTOCOLS,
     INTERFACES,
     LIFESPAN,
+    LOG_FORMATS,
     LOG_LEVELS,
     LOGGING_CONFIG,
     LOOP_SETUPS,
+    SSL_ALPN_PROTOCOLS,
+    SSL_CIPHERS,
     SSL_PROTOCOL_VERSION,
     WS_PROTOCOLS,
     Config,
     HTTPProtocolType,
     InterfaceType,
     LifespanType,
+    LogFormatType,
     LoopSetupType,
     WSProtocolType,
 )
+from uvicorn.profiler import (
+    PROFILE_STARTUP_ENV,
+    forward_sampling_signal,
+    get_startup_profiler,
+)
 from uvicorn.server import Server, ServerState  # noqa: F401  # Used to be defined here.
 from uvicorn.supervisors import ChangeReload, Multiprocess
 
@@ -37,12 +46,24 @@ WS_CHOICES = click.Choice(list(WS_PROTOCOLS.keys()))
 LIFESPAN_CHOICES = click.Choice(list(LIFESPAN.keys()))
 LOOP_CHOICES = click.Choice([key for key in LOOP_SETUPS.keys() if key != "none"])
 INTERFACE_CHOICES = click.Choice(INTERFACES)
+LOG_FORMAT_CHOICES = click.Choice(LOG_FORMATS)
 
 STARTUP_FAILURE = 3
 
 logger = logging.getLogger("uvicorn.error")
 
 
+def parse_backlog(
+    ctx: click.Context, param: click.Parameter, value: str
+) -> typing.Union[int, str]:
+    if value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise click.BadParameter("Must be an integer or 'auto'.")
+
+
 def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> None:
     if not value or ctx.resilient_parsing:
         return
@@ -78,6 +99,13 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
 @click.option(
     "--fd", type=int, default=None, help="Bind to socket from this file descriptor."
 )
+@click.option(
+    "--bind",
+    "bind",
+    multiple=True,
+    help="Listen on this target, in place of --host, --port, --uds and --fd. One "
+    "of HOST:PORT, [IPV6]:PORT, unix:PATH or fd://FD. Can be used multiple times.",
+)
 @click.option("--reload", is_flag=True, default=False, help="Enable auto-reload.")
 @click.option(
     "--reload-dir",
@@ -119,6 +147,21 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     help="Number of worker processes. Defaults to the $WEB_CONCURRENCY environment"
     " variable if available, or 1. Not valid with --reload.",
 )
+@click.option(
+    "--rolling-reload",
+    is_flag=True,
+    default=False,
+    help="Replace workers without dropping connections when the parent process"
+    " receives SIGHUP. Not valid with --reload.",
+)
+@click.option(
+    "--timeout-worker-ready",
+    type=int,
+    default=60,
+    help="Maximum number of seconds to wait for a new worker to start serving"
+    " during a rolling reload.",
+    show_default=True,
+)
 @click.option(
     "--loop",
     type=LOOP_CHOICES,
@@ -203,6 +246,35 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     help="Log level. [default: info]",
     show_default=True,
 )
+@click.option(
+    "--log-async",
+    is_flag=True,
+    default=False,
+    help="Format and write log records on a background thread.",
+)
+@click.option(
+    "--log-queue-size",
+    type=int,
+    default=10000,
+    help="Maximum number of log records waiting to be written with --log-async,"
+    " before further records are dropped.",
+    show_default=True,
+)
+@click.option(
+    "--log-format",
+    type=LOG_FORMAT_CHOICES,
+    default="text",
+    help="Format of the default logging configuration's output.",
+    show_default=True,
+)
+@click.option(
+    "--access-log-sample-rate",
+    type=int,
+    default=1,
+    help="Log only one in every N successful requests. Requests answered with a"
+    " 4xx or 5xx status are always logged.",
+    show_default=True,
+)
 @click.option(
     "--access-log/--no-access-log",
     is_flag=True,
@@ -238,8 +310,9 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     "--forwarded-allow-ips",
     type=str,
     default=None,
-    help="Comma separated list of IPs to trust with proxy headers. Defaults to"
-    " the $FORWARDED_ALLOW_IPS environment variable if available, or '127.0.0.1'.",
+    help="Comma separated list of IPs or CIDR networks to trust with proxy headers,"
+    " or '*' for all. Defaults to the $FORWARDED_ALLOW_IPS environment variable if"
+    " available, or '127.0.0.1'.",
 )
 @click.option(
     "--root-path",
@@ -254,11 +327,36 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     help="Maximum number of concurrent connections or tasks to allow, before issuing"
     " HTTP 503 responses.",
 )
+@click.option(
+    "--adaptive-concurrency",
+    is_flag=True,
+    default=False,
+    help="Adjust the number of concurrent requests to the observed latency, and"
+    " shed requests above it with HTTP 503 responses.",
+)
+@click.option(
+    "--adaptive-concurrency-target",
+    type=float,
+    default=1.0,
+    help="Target seconds until the response starts, for routes without a"
+    " route class.",
+    show_default=True,
+)
+@click.option(
+    "--adaptive-concurrency-route",
+    "adaptive_concurrency_routes",
+    multiple=True,
+    help="Limit requests under a path prefix separately, as a PREFIX=SECONDS pair"
+    " giving the target latency.",
+)
 @click.option(
     "--backlog",
-    type=int,
-    default=2048,
-    help="Maximum number of connections to hold in backlog",
+    type=str,
+    default="2048",
+    callback=parse_backlog,
+    help="Maximum number of connections to hold in backlog, or 'auto' for the "
+    "kernel's limit in /proc/sys/net/core/somaxconn.",
+    show_default=True,
 )
 @click.option(
     "--limit-max-requests",
@@ -279,6 +377,25 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     default=None,
     help="Maximum number of seconds to wait for graceful shutdown.",
 )
+@click.option(
+    "--metrics-host",
+    type=str,
+    default="127.0.0.1",
+    help="Bind the metrics endpoint to this host.",
+    show_default=True,
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve Prometheus metrics for all workers on this port.",
+)
+@click.option(
+    "--metrics-route",
+    "metrics_routes",
+    multiple=True,
+    help="Report requests under this path prefix separately in the metrics.",
+)
 @click.option(
     "--ssl-keyfile", type=str, default=None, help="SSL key file", show_default=True
 )
@@ -320,10 +437,210 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
 @click.option(
     "--ssl-ciphers",
     type=str,
-    default="TLSv1",
+    default=SSL_CIPHERS,
     help="Ciphers to use (see stdlib ssl module's)",
     show_default=True,
 )
+@click.option(
+    "--ssl-alpn-protocol",
+    "ssl_alpn_protocols",
+    multiple=True,
+    help="ALPN protocol to offer, in order of preference. May be used multiple "
+    "times. [default: %s]" % ", ".join(SSL_ALPN_PROTOCOLS),
+)
+@click.option(
+    "--ssl-ecdh-curve",
+    type=str,
+    default=None,
+    help="Elliptic curve to use for ECDH key exchange. [default: OpenSSL's]",
+)
+@click.option(
+    "--static",
+    "static_mounts",
+    multiple=True,
+    help="Serve the files in a directory under a path prefix, in the format "
+    "'/PREFIX=DIRECTORY'. May be used multiple times.",
+)
+@click.option(
+    "--compression",
+    is_flag=True,
+    default=False,
+    help="Compress responses with gzip or deflate, as the client accepts.",
+)
+@click.option(
+    "--compression-minimum-size",
+    type=int,
+    default=500,
+    help="Smallest response body, in bytes, to compress.",
+    show_default=True,
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(1, 9),
+    default=6,
+    help="zlib compression level.",
+    show_default=True,
+)
+@click.option(
+    "--profile-duration",
+    type=float,
+    default=None,
+    help="Enable on-demand profiling: SIGUSR2 samples a worker's stacks for "
+    "this many seconds, and stops it early if sent again. Supervisors pass it "
+    "on to all of their workers.",
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory to write collapsed stack profiles to. [default: temporary "
+    "directory]",
+)
+@click.option(
+    "--loop-monitor-threshold",
+    type=float,
+    default=None,
+    help="Log the stack of whatever blocks the event loop for longer than this "
+    "many seconds, at most every 10 seconds.",
+)
+@click.option(
+    "--max-connections",
+    type=int,
+    default=None,
+    help="Maximum number of open connections per worker. Once exceeded, the "
+    "least recently active idle connections are closed first.",
+)
+@click.option(
+    "--write-buffer-high",
+    type=int,
+    default=None,
+    help="Bytes buffered for a slow client before the application's sends are "
+    "paused. [default: 65536]",
+)
+@click.option(
+    "--write-buffer-low",
+    type=int,
+    default=None,
+    help="Bytes buffered below which paused sends resume. [default: a quarter "
+    "of --write-buffer-high]",
+)
+@click.option(
+    "--tcp-nodelay/--no-tcp-nodelay",
+    is_flag=True,
+    default=True,
+    help="Send small writes, such as streamed tokens, without delay.",
+    show_default=True,
+)
+@click.option(
+    "--tcp-defer-accept",
+    type=int,
+    default=None,
+    help="Seconds the kernel holds a connection until its first data arrives, "
+    "before handing it to the server. Linux only.",
+)
+@click.option(
+    "--tcp-fastopen",
+    type=int,
+    default=None,
+    help="Queue length for TCP Fast Open, which allows data in the SYN packet.",
+)
+@click.option(
+    "--socket-rcvbuf",
+    type=int,
+    default=None,
+    help="Kernel receive buffer size of each connection, in bytes.",
+)
+@click.option(
+    "--socket-sndbuf",
+    type=int,
+    default=None,
+    help="Kernel send buffer size of each connection, in bytes.",
+)
+@click.option(
+    "--h2-max-concurrent-streams",
+    type=int,
+    default=100,
+    help="Streams each HTTP/2 connection may have open at once, with '--http h2'.",
+    show_default=True,
+)
+@click.option(
+    "--shared-cache-size",
+    type=int,
+    default=None,
+    help="Bytes of shared memory for a cache shared by all workers, which the "
+    "application gets from uvicorn.sharedcache.get_shared_cache().",
+)
+@click.option(
+    "--shared-cache-slab-size",
+    type=int,
+    default=8192,
+    help="Largest entry the shared cache holds, key included, in bytes.",
+    show_default=True,
+)
+@click.option(
+    "--warmup",
+    "warmup_requests",
+    multiple=True,
+    help="Request to send to the application before a worker starts serving, as"
+    " '[METHOD] PATH [BODY]'. May be used multiple times. Warm-up counts towards"
+    " --timeout-worker-ready.",
+)
+@click.option(
+    "--warmup-timeout",
+    type=float,
+    default=30.0,
+    help="Maximum number of seconds to wait for each warm-up request.",
+    show_default=True,
+)
+@click.option(
+    "--readiness-path",
+    type=str,
+    default=None,
+    help="Path that answers 200 once the worker is serving, and 503 while it"
+    " starts or shuts down.",
+)
+@click.option(
+    "--liveness-path",
+    type=str,
+    default=None,
+    help="Path that answers 200 whenever the worker can serve a request.",
+)
+@click.option(
+    "--cancel-on-disconnect",
+    is_flag=True,
+    default=False,
+    help="Cancel the token of a request when its client disconnects, so the"
+    " application can stop work whose response nobody will read.",
+)
+@click.option(
+    "--request-timeout",
+    type=float,
+    default=None,
+    help="Seconds each request has to finish its work. Clients can ask for less"
+    " with an X-Request-Timeout header.",
+)
+@click.option(
+    "--request-timeout-route",
+    "request_timeout_routes",
+    multiple=True,
+    help="Request timeout for paths starting with a prefix, as 'PREFIX=SECONDS'."
+    " May be used multiple times.",
+)
+@click.option(
+    "--timeout-request-headers",
+    type=float,
+    default=10.0,
+    help="Close connections whose request headers aren't received within this"
+    " many seconds of their first byte.",
+    show_default=True,
+)
+@click.option(
+    "--timeout-request-body",
+    type=float,
+    default=None,
+    help="Close connections whose whole request isn't received within this"
+    " many seconds of its first byte.",
+)
 @click.option(
     "--header",
     "headers",
@@ -352,6 +669,14 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     default=None,
     help="For h11, the maximum number of bytes to buffer of an incomplete event.",
 )
+@click.option(
+    "--profile-startup",
+    is_flag=True,
+    default=False,
+    help="Log how long each module import and startup phase took, from process"
+    " start until the server is ready. Set $UVICORN_PROFILE_STARTUP to include"
+    " the imports of uvicorn itself.",
+)
 @click.option(
     "--factory",
     is_flag=True,
@@ -380,9 +705,15 @@ def main(
     reload_excludes: typing.List[str],
     reload_delay: float,
     workers: int,
+    rolling_reload: bool,
+    timeout_worker_ready: typing.Optional[int],
     env_file: str,
     log_config: str,
     log_level: str,
+    log_async: bool,
+    log_queue_size: int,
+    log_format: LogFormatType,
+    access_log_sample_rate: int,
     access_log: bool,
     proxy_headers: bool,
     server_header: bool,
@@ -390,10 +721,16 @@ def main(
     forwarded_allow_ips: str,
     root_path: str,
     limit_concurrency: int,
-    backlog: int,
+    adaptive_concurrency: bool,
+    adaptive_concurrency_target: float,
+    adaptive_concurrency_routes: typing.List[str],
+    backlog: typing.Union[int, str],
     limit_max_requests: int,
     timeout_keep_alive: int,
     timeout_graceful_shutdown: typing.Optional[int],
+    metrics_host: str,
+    metrics_port: typing.Optional[int],
+    metrics_routes: typing.List[str],
     ssl_keyfile: str,
     ssl_certfile: str,
     ssl_keyfile_password: str,
@@ -401,11 +738,42 @@ def main(
     ssl_cert_reqs: int,
     ssl_ca_certs: str,
     ssl_ciphers: str,
+    ssl_alpn_protocols: typing.List[str],
+    ssl_ecdh_curve: typing.Optional[str],
+    static_mounts: typing.List[str],
+    compression: bool,
+    compression_minimum_size: int,
+    compression_level: int,
+    profile_duration: typing.Optional[float],
+    profile_dir: typing.Optional[str],
+    loop_monitor_threshold: typing.Optional[float],
+    max_connections: typing.Optional[int],
+    write_buffer_high: typing.Optional[int],
+    write_buffer_low: typing.Optional[int],
+    tcp_nodelay: bool,
+    tcp_defer_accept: typing.Optional[int],
+    tcp_fastopen: typing.Optional[int],
+    socket_rcvbuf: typing.Optional[int],
+    socket_sndbuf: typing.Optional[int],
+    bind: typing.List[str],
+    h2_max_concurrent_streams: int,
+    shared_cache_size: typing.Optional[int],
+    shared_cache_slab_size: int,
+    warmup_requests: typing.List[str],
+    warmup_timeout: float,
+    readiness_path: str,
+    liveness_path: str,
+    cancel_on_disconnect: bool,
+    request_timeout: float,
+    request_timeout_routes: typing.List[str],
+    timeout_request_headers: float,
+    timeout_request_body: typing.Optional[float],
     headers: typing.List[str],
     use_colors: bool,
     app_dir: str,
     h11_max_incomplete_event_size: typing.Optional[int],
     factory: bool,
+    profile_startup: bool,
 ) -> None:
     run(
         app,
@@ -424,6 +792,11 @@ def main(
         env_file=env_file,
         log_config=LOGGING_CONFIG if log_config is None else log_config,
         log_level=log_level,
+        log_async=log_async,
+        log_queue_size=log_queue_size,
+        log_format=log_format,
+        access_log_sample_rate=access_log_sample_rate,
+        profile_startup=profile_startup,
         access_log=access_log,
         interface=interface,
         reload=reload,
@@ -432,12 +805,20 @@ def main(
         reload_excludes=reload_excludes or None,
         reload_delay=reload_delay,
         workers=workers,
+        rolling_reload=rolling_reload,
+        timeout_worker_ready=timeout_worker_ready,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        metrics_routes=list(metrics_routes) or None,
         proxy_headers=proxy_headers,
         server_header=server_header,
         date_header=date_header,
         forwarded_allow_ips=forwarded_allow_ips,
         root_path=root_path,
         limit_concurrency=limit_concurrency,
+        adaptive_concurrency=adaptive_concurrency,
+        adaptive_concurrency_target=adaptive_concurrency_target,
+        adaptive_concurrency_routes=list(adaptive_concurrency_routes) or None,
         backlog=backlog,
         limit_max_requests=limit_max_requests,
         timeout_keep_alive=timeout_keep_alive,
@@ -449,6 +830,36 @@ def main(
         ssl_cert_reqs=ssl_cert_reqs,
         ssl_ca_certs=ssl_ca_certs,
         ssl_ciphers=ssl_ciphers,
+        ssl_alpn_protocols=list(ssl_alpn_protocols) or None,
+        ssl_ecdh_curve=ssl_ecdh_curve,
+        static_mounts=list(static_mounts) or None,
+        compression=compression,
+        compression_minimum_size=compression_minimum_size,
+        compression_level=compression_level,
+        profile_duration=profile_duration,
+        profile_dir=profile_dir,
+        loop_monitor_threshold=loop_monitor_threshold,
+        max_connections=max_connections,
+        write_buffer_high=write_buffer_high,
+        write_buffer_low=write_buffer_low,
+        tcp_nodelay=tcp_nodelay,
+        tcp_defer_accept=tcp_defer_accept,
+        tcp_fastopen=tcp_fastopen,
+        socket_rcvbuf=socket_rcvbuf,
+        socket_sndbuf=socket_sndbuf,
+        bind=list(bind),
+        h2_max_concurrent_streams=h2_max_concurrent_streams,
+        shared_cache_size=shared_cache_size,
+        shared_cache_slab_size=shared_cache_slab_size,
+        warmup_requests=list(warmup_requests),
+        warmup_timeout=warmup_timeout,
+        readiness_path=readiness_path,
+        liveness_path=liveness_path,
+        cancel_on_disconnect=cancel_on_disconnect,
+        request_timeout=request_timeout,
+        request_timeout_routes=list(request_timeout_routes) or None,
+        timeout_request_headers=timeout_request_headers,
+        timeout_request_body=timeout_request_body,
         headers=[header.split(":", 1) for header in headers],  # type: ignore[misc]
         use_colors=use_colors,
         factory=factory,
@@ -491,7 +902,7 @@ def run(
     forwarded_allow_ips: typing.Optional[typing.Union[typing.List[str], str]] = None,
     root_path: str = "",
     limit_concurrency: typing.Optional[int] = None,
-    backlog: int = 2048,
+    backlog: typing.Union[int, str] = 2048,
     limit_max_requests: typing.Optional[int] = None,
     timeout_keep_alive: int = 5,
     timeout_graceful_shutdown: typing.Optional[int] = None,
@@ -501,13 +912,61 @@ def run(
     ssl_version: int = SSL_PROTOCOL_VERSION,
     ssl_cert_reqs: int = ssl.CERT_NONE,
     ssl_ca_certs: typing.Optional[str] = None,
-    ssl_ciphers: str = "TLSv1",
+    ssl_ciphers: str = SSL_CIPHERS,
     headers: typing.Optional[typing.List[typing.Tuple[str, str]]] = None,
     use_colors: typing.Optional[bool] = None,
     app_dir: typing.Optional[str] = None,
     factory: bool = False,
     h11_max_incomplete_event_size: typing.Optional[int] = None,
+    rolling_reload: bool = False,
+    timeout_worker_ready: typing.Optional[int] = 60,
+    metrics_host: str = "127.0.0.1",
+    metrics_port: typing.Optional[int] = None,
+    metrics_routes: typing.Optional[typing.List[str]] = None,
+    adaptive_concurrency: bool = False,
+    adaptive_concurrency_target: float = 1.0,
+    adaptive_concurrency_routes: typing.Optional[typing.List[str]] = None,
+    log_async: bool = False,
+    log_queue_size: int = 10000,
+    log_format: LogFormatType = "text",
+    access_log_sample_rate: int = 1,
+    profile_startup: bool = False,
+    ssl_alpn_protocols: typing.Optional[typing.List[str]] = None,
+    ssl_ecdh_curve: typing.Optional[str] = None,
+    static_mounts: typing.Optional[typing.List[str]] = None,
+    compression: bool = False,
+    compression_minimum_size: int = 500,
+    compression_level: int = 6,
+    profile_duration: typing.Optional[float] = None,
+    profile_dir: typing.Optional[str] = None,
+    loop_monitor_threshold: typing.Optional[float] = None,
+    max_connections: typing.Optional[int] = None,
+    write_buffer_high: typing.Optional[int] = None,
+    write_buffer_low: typing.Optional[int] = None,
+    tcp_nodelay: bool = True,
+    tcp_defer_accept: typing.Optional[int] = None,
+    tcp_fastopen: typing.Optional[int] = None,
+    socket_rcvbuf: typing.Optional[int] = None,
+    socket_sndbuf: typing.Optional[int] = None,
+    bind: typing.Optional[typing.List[str]] = None,
+    h2_max_concurrent_streams: int = 100,
+    shared_cache_size: typing.Optional[int] = None,
+    shared_cache_slab_size: int = 8192,
+    warmup_requests: typing.Optional[typing.List[str]] = None,
+    warmup_timeout: float = 30.0,
+    readiness_path: typing.Optional[str] = None,
+    liveness_path: typing.Optional[str] = None,
+    cancel_on_disconnect: bool = False,
+    request_timeout: typing.Optional[float] = None,
+    request_timeout_routes: typing.Optional[typing.List[str]] = None,
+    timeout_request_headers: float = 10.0,
+    timeout_request_body: typing.Optional[float] = None,
 ) -> None:
+    if profile_startup:
+        get_startup_profiler()
+        # Worker processes start profiling as soon as they import uvicorn.
+        os.environ[PROFILE_STARTUP_ENV] = "1"
+
     if app_dir is not None:
         sys.path.insert(0, app_dir)
 
@@ -557,29 +1016,111 @@ def run(
         use_colors=use_colors,
         factory=factory,
         h11_max_incomplete_event_size=h11_max_incomplete_event_size,
+        rolling_reload=rolling_reload,
+        timeout_worker_ready=timeout_worker_ready,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        metrics_routes=metrics_routes,
+        adaptive_concurrency=adaptive_concurrency,
+        adaptive_concurrency_target=adaptive_concurrency_target,
+        adaptive_concurrency_routes=adaptive_concurrency_routes,
+        log_async=log_async,
+        log_queue_size=log_queue_size,
+        log_format=log_format,
+        access_log_sample_rate=access_log_sample_rate,
+        profile_startup=profile_startup,
+        ssl_alpn_protocols=ssl_alpn_protocols,
+        ssl_ecdh_curve=ssl_ecdh_curve,
+        static_mounts=static_mounts,
+        compression=compression,
+        compression_minimum_size=compression_minimum_size,
+        compression_level=compression_level,
+        profile_duration=profile_duration,
+        profile_dir=profile_dir,
+        loop_monitor_threshold=loop_monitor_threshold,
+        max_connections=max_connections,
+        write_buffer_high=write_buffer_high,
+        write_buffer_low=write_buffer_low,
+        tcp_nodelay=tcp_nodelay,
+        tcp_defer_accept=tcp_defer_accept,
+        tcp_fastopen=tcp_fastopen,
+        socket_rcvbuf=socket_rcvbuf,
+        socket_sndbuf=socket_sndbuf,
+        bind=bind,
+        h2_max_concurrent_streams=h2_max_concurrent_streams,
+        shared_cache_size=shared_cache_size,
+        shared_cache_slab_size=shared_cache_slab_size,
+        warmup_requests=warmup_requests,
+        warmup_timeout=warmup_timeout,
+        readiness_path=readiness_path,
+        liveness_path=liveness_path,
+        cancel_on_disconnect=cancel_on_disconnect,
+        request_timeout=request_timeout,
+        request_timeout_routes=request_timeout_routes,
+        timeout_request_headers=timeout_request_headers,
+        timeout_request_body=timeout_request_body,
     )
     server = Server(config=config)
 
-    if (config.reload or config.workers > 1) and not isinstance(app, str):
+    if config.use_subprocess and not isinstance(app, str):
         logger = logging.getLogger("uvicorn.error")
         logger.warning(
-            "You must pass the application as an import string to enable 'reload' or "
-            "'workers'."
+            "You must pass the application as an import string to enable 'reload', "
+            "'workers' or 'rolling_reload'."
         )
         sys.exit(1)
 
-    if config.should_reload:
-        sock = config.bind_socket()
-        ChangeReload(config, target=server.run, sockets=[sock]).run()
-    elif config.workers > 1:
-        sock = config.bind_socket()
-        Multiprocess(config, target=server.run, sockets=[sock]).run()
-    else:
-        server.run()
-    if config.uds and os.path.exists(config.uds):
-        os.remove(config.uds)  # pragma: py-win32
+    exporter = None
+    if config.metrics_port is not None:
+        from uvicorn.metrics import MetricsExporter, SharedMetrics
+
+        # Room for two generations of workers during a rolling reload.
+        config.metrics = SharedMetrics(config.metrics_routes, slots=2 * config.workers)
+        exporter = MetricsExporter(
+            config.metrics, config.metrics_host, config.metrics_port
+        )
+        exporter.start()
+
+    if config.shared_cache_size:
+        from uvicorn.sharedcache import SharedCache
+
+        config.shared_cache = SharedCache(
+            config.shared_cache_size,
+            config.shared_cache_slab_size,
+            metrics=config.metrics,
+        )
+
+    try:
+        if config.should_reload:
+            sockets = config.bind_sockets()
+            supervisor = ChangeReload(config, target=server.run, sockets=sockets)
+            if config.profile_duration is not None:
+                forward_sampling_signal(supervisor)
+            supervisor.run()
+        elif config.rolling_reload:
+            sockets = config.bind_sockets()
+            from uvicorn.rollingreload import RollingReload
+
+            RollingReload(config, target=server.run, sockets=sockets).run()
+        elif config.workers > 1:
+            sockets = config.bind_sockets()
+            supervisor = Multiprocess(config, target=server.run, sockets=sockets)
+            if config.profile_duration is not None:
+                forward_sampling_signal(supervisor)
+            supervisor.run()
+        else:
+            server.run(sockets=config.activated_sockets() or None)
+    finally:
+        if exporter is not None:
+            exporter.stop()
+            config.metrics.unlink()  # type: ignore[union-attr]
+        if config.shared_cache is not None:
+            config.shared_cache.unlink()
+    for uds in [config.uds] + [target.uds for target in config.bind]:
+        if uds and os.path.exists(uds):
+            os.remove(uds)  # pragma: py-win32
 
-    if not server.started and not config.should_reload and config.workers == 1:
+    if not server.started and not config.use_subprocess:
         sys.exit(STARTUP_FAILURE)
 
 
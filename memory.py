@@ -6,8 +6,26 @@ MEMORY_FILE = "sxudo_memory.json"
 MAX_HISTORY = 5  # Reduced for better performance
 memory_lock = Lock()
 
-def load_memory(username="default"):
-    with memory_lock:
+def _cache_key(username):
+    return "memory:%s" % username
+
+# `cache` may be any cache shared between processes, with get(), set() and
+# delete(), such as uvicorn's shared cache. `deadline` is the request's
+# deadline, if it has one.
+
+def load_memory(username="default", cache=None, deadline=None):
+    # Another worker may already have read or saved this user's memory.
+    if cache is not None:
+        cached = cache.get(_cache_key(username))
+        if cached is not None:
+            return json.loads(cached)
+
+    # Don't wait for a slow save past the request's deadline.
+    if deadline is not None:
+        deadline.acquire(memory_lock, "memory load")
+    else:
+        memory_lock.acquire()
+    try:
         if not os.path.exists(MEMORY_FILE):
             # Create initial memory structure
             return {
@@ -19,6 +37,8 @@ def load_memory(username="default"):
         try:
             with open(MEMORY_FILE, "r", encoding="utf-8") as f:
                 all_memory = json.load(f)
+            if cache is not None and username in all_memory:
+                cache.set(_cache_key(username), json.dumps(all_memory[username]).encode())
             return all_memory.get(username, {
                 "username": username,
                 "history": [],
@@ -30,8 +50,10 @@ def load_memory(username="default"):
                 "history": [],
                 "first_interaction": True
             }
+    finally:
+        memory_lock.release()
 
-def save_memory(username, memory):
+def save_memory(username, memory, cache=None):
     with memory_lock:
         all_memory = {}
         if os.path.exists(MEMORY_FILE):
@@ -51,4 +73,10 @@ def save_memory(username, memory):
         
         all_memory[username] = memory
         with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(all_memory, f, indent=4)
\ No newline at end of file
+            json.dump(all_memory, f, indent=4)
+
+    if cache is not None:
+        key = _cache_key(username)
+        # Too large for the cache, so don't leave a stale copy behind.
+        if not cache.set(key, json.dumps(memory).encode()):
+            cache.delete(key)
\ No newline at end of file
@@ -0,0 +1,466 @@
+"""
+Request metrics shared between worker processes.
+
+Counters live in a `multiprocessing.shared_memory` segment created by the
+parent process. Every worker claims its own row of 64-bit counters, so writes
+never contend, and the parent sums the rows when `/metrics` is scraped.
+"""
+import bisect
+import http.server
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from uvicorn.readiness import is_warmup
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        ASGISendEvent,
+        Scope,
+    )
+
+logger = logging.getLogger("uvicorn.error")
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+OTHER_ROUTE = "*"
+
+# Offsets of the counters kept for each route, within a worker's row.
+REQUESTS = 0
+IN_FLIGHT = 1
+STATUS = 2  # Five counters, one per status class.
+LATENCY_SUM = STATUS + 5
+LATENCY = LATENCY_SUM + 1  # One counter per bucket, plus "+Inf".
+TTFB_SUM = LATENCY + len(LATENCY_BUCKETS) + 1
+TTFB = TTFB_SUM + 1
+ROUTE_SIZE = TTFB + len(LATENCY_BUCKETS) + 1
+
+# Process wide metrics, kept after the route counters in each worker's row.
+# Histograms take a counter for the sum (in microseconds) and one per bucket.
+PROCESS_METRICS: Dict[str, Tuple[str, str]] = {
+    "tls_handshakes_full": (
+        "counter",
+        "TLS handshakes that negotiated a new session.",
+    ),
+    "tls_handshakes_resumed": (
+        "counter",
+        "TLS handshakes that resumed an earlier session.",
+    ),
+    "tls_handshake_seconds": (
+        "histogram",
+        "Time from the TLS ClientHello until the connection was established.",
+    ),
+    "compression_input_bytes": (
+        "counter",
+        "Response body bytes passed to the compressor.",
+    ),
+    "compression_output_bytes": (
+        "counter",
+        "Compressed response body bytes sent.",
+    ),
+    "compression_cpu_microseconds": (
+        "counter",
+        "CPU time spent compressing response bodies.",
+    ),
+    "event_loop_lag_seconds": (
+        "histogram",
+        "How late the server's periodic event loop timer fired.",
+    ),
+    "event_loop_blocked": (
+        "counter",
+        "Times the event loop was blocked for longer than the monitor threshold.",
+    ),
+    "connections": ("gauge", "Open connections."),
+    "write_buffer_bytes": (
+        "gauge",
+        "Bytes waiting in transport write buffers for clients to read them.",
+    ),
+    "write_paused_connections": (
+        "gauge",
+        "Connections whose write buffer is over the high water mark.",
+    ),
+    "write_paused_seconds": (
+        "histogram",
+        "How long connections stayed over the write buffer high water mark.",
+    ),
+    "shared_cache_hits": ("counter", "Shared cache lookups that found an entry."),
+    "shared_cache_misses": ("counter", "Shared cache lookups that found nothing."),
+    "shared_cache_evictions": (
+        "counter",
+        "Shared cache entries evicted to make room for new ones.",
+    ),
+    "cancelled_requests": (
+        "counter",
+        "Requests whose client disconnected before the response completed.",
+    ),
+    "cancelled_generations": (
+        "counter",
+        "Generations stopped early because their client disconnected.",
+    ),
+    "cancelled_generation_reclaimed_seconds": (
+        "histogram",
+        "Estimated generation time saved by stopping generations early.",
+    ),
+    "deadline_exceeded": (
+        "counter",
+        "Requests that ran out of time before finishing their work.",
+    ),
+}
+PROCESS_OFFSETS: Dict[str, int] = {}
+PROCESS_SIZE = 0
+for _name, (_kind, _) in PROCESS_METRICS.items():
+    PROCESS_OFFSETS[_name] = PROCESS_SIZE
+    PROCESS_SIZE += len(LATENCY_BUCKETS) + 2 if _kind == "histogram" else 1
+# Gauges, and requests in flight, only count for workers that are still alive.
+GAUGE_OFFSETS = [
+    PROCESS_OFFSETS[_name]
+    for _name, (_kind, _) in PROCESS_METRICS.items()
+    if _kind == "gauge"
+]
+
+ITEM_SIZE = 8  # Unsigned 64 bit counters.
+
+
+class SharedMetrics:
+    """
+    Fixed layout counters for a set of route prefixes, one row per worker.
+
+    * routes - Path prefixes to report separately. Requests that match none of
+               them are counted under the "*" route.
+    * slots - Maximum number of worker processes alive at the same time.
+    """
+
+    def __init__(self, routes: Sequence[str], slots: int) -> None:
+        self.routes = sorted(set(routes), key=len, reverse=True) + [OTHER_ROUTE]
+        self.slots = slots
+        self.row_size = 1 + ROUTE_SIZE * len(self.routes) + PROCESS_SIZE
+        self.shm = SharedMemory(create=True, size=self.row_size * slots * ITEM_SIZE)
+        self.shm.buf[:] = bytes(self.shm.size)
+        self.lock = multiprocessing.get_context("spawn").Lock()
+        self.slot: Optional[int] = None
+        self._counters: Optional[memoryview] = None
+        self._route_cache: Dict[str, int] = {}
+        self._process_base = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["slot"] = None
+        state["_counters"] = None
+        state["_route_cache"] = {}
+        return state
+
+    @property
+    def counters(self) -> memoryview:
+        if self._counters is None:
+            self._counters = self.shm.buf.cast("Q")
+        return self._counters
+
+    def attach(self) -> None:
+        """
+        Called in each worker process to claim a row of counters.
+
+        Rows left behind by workers that have exited are reused, so counters
+        keep accumulating across worker restarts.
+        """
+        counters = self.counters
+        pid = os.getpid()
+        with self.lock:
+            for slot in range(self.slots):
+                owner = counters[slot * self.row_size]
+                if owner == 0 or owner == pid or not _is_alive(owner):
+                    counters[slot * self.row_size] = pid
+                    break
+            else:
+                logger.warning(
+                    "No free metrics slot for worker [%d], sharing slot 0", pid
+                )
+                self.slot = 0
+                self._process_base = self._process_row_base(0)
+                return
+        self.slot = slot
+        self._process_base = self._process_row_base(slot)
+        # Requests in flight in a dead worker will never finish.
+        for base in self._route_bases():
+            counters[base + IN_FLIGHT] = 0
+        for offset in GAUGE_OFFSETS:
+            counters[self._process_base + offset] = 0
+
+    def _process_row_base(self, slot: int) -> int:
+        return slot * self.row_size + 1 + ROUTE_SIZE * len(self.routes)
+
+    def _route_bases(self, slot: Optional[int] = None) -> List[int]:
+        row = (self.slot if slot is None else slot) * self.row_size + 1
+        return [row + idx * ROUTE_SIZE for idx in range(len(self.routes))]
+
+    def route_base(self, path: str) -> int:
+        """
+        Return the offset of the counters for the route that `path` belongs to.
+        """
+        try:
+            return self._route_cache[path]
+        except KeyError:
+            pass
+        assert self.slot is not None, "SharedMetrics.attach() was not called"
+        for idx, route in enumerate(self.routes):
+            if route == OTHER_ROUTE or path.startswith(route):
+                break
+        base = self.slot * self.row_size + 1 + idx * ROUTE_SIZE
+        if len(self._route_cache) < 4096:
+            self._route_cache[path] = base
+        return base
+
+    def request_started(self, path: str) -> int:
+        base = self.route_base(path)
+        self._counters[base + IN_FLIGHT] += 1  # type: ignore[index]
+        return base
+
+    def request_finished(
+        self, base: int, status: int, duration: float, ttfb: Optional[float]
+    ) -> None:
+        counters: memoryview = self._counters  # type: ignore[assignment]
+        counters[base + REQUESTS] += 1
+        # Workers sharing a row can race, so never go below zero.
+        if counters[base + IN_FLIGHT]:
+            counters[base + IN_FLIGHT] -= 1
+        if 100 <= status < 600:
+            counters[base + STATUS + status // 100 - 1] += 1
+        counters[base + LATENCY_SUM] += int(duration * 1_000_000)
+        counters[base + LATENCY + bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        if ttfb is not None:
+            counters[base + TTFB_SUM] += int(ttfb * 1_000_000)
+            counters[base + TTFB + bisect.bisect_left(LATENCY_BUCKETS, ttfb)] += 1
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """
+        Add to one of the process wide counters in `PROCESS_METRICS`.
+        """
+        counters: memoryview = self._counters  # type: ignore[assignment]
+        counters[self._process_base + PROCESS_OFFSETS[name]] += value
+
+    def set(self, name: str, value: int) -> None:
+        """
+        Set one of the process wide gauges in `PROCESS_METRICS`.
+
+        Gauges are summed over workers, like counters.
+        """
+        counters: memoryview = self._counters  # type: ignore[assignment]
+        counters[self._process_base + PROCESS_OFFSETS[name]] = max(0, value)
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record a value in one of the process wide histograms in `PROCESS_METRICS`.
+        """
+        counters: memoryview = self._counters  # type: ignore[assignment]
+        base = self._process_base + PROCESS_OFFSETS[name]
+        counters[base] += int(seconds * 1_000_000)
+        counters[base + 1 + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def collect(self) -> Tuple[List[List[int]], List[int]]:
+        """
+        Sum the rows of every worker, returning one list of counters per route
+        and the process wide counters.
+
+        Rows of workers that have exited keep their counters, but their gauges
+        and requests in flight are left out, as they no longer change.
+        """
+        counters = self.counters
+        totals = [[0] * ROUTE_SIZE for _ in self.routes]
+        process_totals = [0] * PROCESS_SIZE
+        for slot in range(self.slots):
+            owner = counters[slot * self.row_size]
+            if owner == 0:
+                continue
+            alive = _is_alive(owner)
+            for route_totals, base in zip(totals, self._route_bases(slot)):
+                for offset in range(ROUTE_SIZE):
+                    if offset != IN_FLIGHT or alive:
+                        route_totals[offset] += counters[base + offset]
+            base = self._process_row_base(slot)
+            for offset in range(PROCESS_SIZE):
+                if alive or offset not in GAUGE_OFFSETS:
+                    process_totals[offset] += counters[base + offset]
+        return totals, process_totals
+
+    def render(self) -> str:
+        """
+        Render the current counters in the Prometheus text exposition format.
+        """
+        totals, process_totals = self.collect()
+        lines: List[str] = []
+
+        def header(name: str, kind: str, text: str) -> None:
+            lines.append("# HELP %s %s" % (name, text))
+            lines.append("# TYPE %s %s" % (name, kind))
+
+        def histogram(name: str, labels: str, values: List[int], offset: int) -> None:
+            cumulative = 0
+            for idx, bound in enumerate(LATENCY_BUCKETS + (float("inf"),)):
+                cumulative += values[offset + 1 + idx]
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('%s_bucket{%sle="%s"} %d' % (name, labels, le, cumulative))
+            labels = "{%s}" % labels.rstrip(",") if labels else ""
+            lines.append("%s_sum%s %.6f" % (name, labels, values[offset] / 1_000_000))
+            lines.append("%s_count%s %d" % (name, labels, cumulative))
+
+        header("uvicorn_requests_total", "counter", "Completed HTTP requests.")
+        for route, values in zip(self.routes, totals):
+            lines.append(
+                'uvicorn_requests_total{route="%s"} %d' % (route, values[REQUESTS])
+            )
+
+        header("uvicorn_requests_in_flight", "gauge", "HTTP requests in progress.")
+        for route, values in zip(self.routes, totals):
+            lines.append(
+                'uvicorn_requests_in_flight{route="%s"} %d' % (route, values[IN_FLIGHT])
+            )
+
+        header("uvicorn_responses_total", "counter", "Responses by status class.")
+        for route, values in zip(self.routes, totals):
+            for idx in range(5):
+                lines.append(
+                    'uvicorn_responses_total{route="%s",status="%dxx"} %d'
+                    % (route, idx + 1, values[STATUS + idx])
+                )
+
+        for name, text, sum_offset in (
+            (
+                "uvicorn_request_duration_seconds",
+                "Time from request start until the response completed.",
+                LATENCY_SUM,
+            ),
+            (
+                "uvicorn_time_to_first_byte_seconds",
+                "Time from request start until the first response body chunk.",
+                TTFB_SUM,
+            ),
+        ):
+            header(name, "histogram", text)
+            for route, values in zip(self.routes, totals):
+                histogram(name, 'route="%s",' % route, values, sum_offset)
+
+        for name, (kind, text) in PROCESS_METRICS.items():
+            offset = PROCESS_OFFSETS[name]
+            if kind == "histogram":
+                header("uvicorn_" + name, kind, text)
+                histogram("uvicorn_" + name, "", process_totals, offset)
+            else:
+                metric = "uvicorn_" + name + ("_total" if kind == "counter" else "")
+                header(metric, kind, text)
+                lines.append("%s %d" % (metric, process_totals[offset]))
+
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self._counters is not None:
+            self._counters.release()
+            self._counters = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """
+        Called in the parent process once every worker has exited.
+        """
+        self.close()
+        self.shm.unlink()
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # pragma: no cover
+        return True
+    return True
+
+
+class MetricsMiddleware:
+    def __init__(self, app: "ASGI3Application", metrics: SharedMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] != "http" or is_warmup(scope):
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        base = self.metrics.request_started(scope["path"])
+        status = 500
+        ttfb: Optional[float] = None
+
+        async def send_wrapper(message: "ASGISendEvent") -> None:
+            nonlocal status, ttfb
+            if message["type"] == "http.response.start":
+                status = message["status"]  # type: ignore[typeddict-item]
+            elif ttfb is None and message["type"] == "http.response.body":
+                ttfb = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.request_finished(
+                base, status, time.perf_counter() - start, ttfb
+            )
+
+
+class MetricsExporter:
+    """
+    Serves `/metrics` from a background thread of the parent process.
+    """
+
+    def __init__(self, metrics: SharedMetrics, host: str, port: int) -> None:
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="uvicorn-metrics", daemon=True
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+        host, port = self.httpd.server_address[:2]
+        logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
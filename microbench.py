@@ -0,0 +1,422 @@
+"""
+Microbenchmarks for server hot paths.
+
+Each benchmark is calibrated so one repeat takes at least `min_time`, warmed
+up, then timed over several repeats. Results can be saved as a baseline and
+later runs compared against it with Welch's t-test, so only slowdowns that are
+both large enough and statistically significant are flagged:
+
+    python -m uvicorn.microbench run --output baseline.json
+    python -m uvicorn.microbench compare baseline.json
+"""
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+import click
+
+Setup = typing.Callable[[], typing.Callable[[], None]]
+
+BENCHMARKS: typing.Dict[str, Setup] = {}
+
+# Two sided 95% critical values of Student's t distribution, by degrees of
+# freedom. Larger samples use the normal approximation.
+T_CRITICAL = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    12: 2.179,
+    15: 2.131,
+    20: 2.086,
+    25: 2.060,
+    30: 2.042,
+}
+
+
+class BenchmarkUnavailable(Exception):
+    pass
+
+
+def t_critical(degrees_of_freedom: float) -> float:
+    for dof in sorted(T_CRITICAL, reverse=True):
+        if degrees_of_freedom >= dof:
+            return T_CRITICAL[dof] if degrees_of_freedom <= 30 else 1.96
+    return T_CRITICAL[1]
+
+
+def benchmark(name: str) -> typing.Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _run_coroutine(coroutine: typing.Coroutine) -> typing.Any:
+    # Coroutines that never suspend can be driven without an event loop.
+    try:
+        coroutine.send(None)
+    except StopIteration as exc:
+        return exc.value
+    coroutine.close()
+    raise RuntimeError("Benchmarked coroutine suspended")
+
+
+async def _asgi_app(scope: typing.Any, receive: typing.Any, send: typing.Any) -> None:
+    pass  # pragma: no cover
+
+
+@benchmark("server.on_tick")
+def bench_on_tick() -> typing.Callable[[], None]:
+    from uvicorn.config import Config
+    from uvicorn.server import Server
+
+    config = Config(_asgi_app, log_config=None, lifespan="off")
+    config.load()
+    server = Server(config)
+    counter = 0
+
+    def run() -> None:
+        nonlocal counter
+        # Nine fast ticks for every tick that rebuilds the default headers.
+        counter = (counter + 1) % 10
+        _run_coroutine(server.on_tick(counter))
+
+    return run
+
+
+@benchmark("logging.AccessFormatter.formatMessage")
+def bench_access_format() -> typing.Callable[[], None]:
+    from uvicorn.logging import AccessFormatter
+
+    formatter = AccessFormatter(
+        '%(client_addr)s - "%(request_line)s" %(status_code)s', use_colors=False
+    )
+    record = logging.LogRecord(
+        "uvicorn.access",
+        logging.INFO,
+        __file__,
+        0,
+        '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:50000", "GET", "/api/chat", "1.1", 200),
+        None,
+    )
+
+    def run() -> None:
+        formatter.formatMessage(record)
+
+    return run
+
+
+@benchmark("config.Config.load")
+def bench_config_load() -> typing.Callable[[], None]:
+    from uvicorn.config import Config
+
+    def run() -> None:
+        Config(_asgi_app, log_config=None, lifespan="off").load()
+
+    return run
+
+
+@benchmark("importer.import_from_string")
+def bench_import_from_string() -> typing.Callable[[], None]:
+    from uvicorn.importer import import_from_string
+
+    def run() -> None:
+        import_from_string("uvicorn.config:Config")
+
+    return run
+
+
+@benchmark("config.resolve_reload_patterns")
+def bench_resolve_reload_patterns() -> typing.Callable[[], None]:
+    from uvicorn.config import resolve_reload_patterns
+
+    directory = tempfile.mkdtemp(prefix="uvicorn-microbench-")
+    for idx in range(20):
+        subdirectory = os.path.join(directory, "package%d" % idx)
+        os.mkdir(subdirectory)
+        for name in ("__init__.py", "models.py", "views.py", "style.css"):
+            Path(subdirectory, name).touch()
+
+    def run() -> None:
+        resolve_reload_patterns(["*.py", "package1*"], [directory])
+
+    return run
+
+
+def _memory_module() -> typing.Any:
+    try:
+        return importlib.import_module("app.memory")
+    except ImportError:
+        raise BenchmarkUnavailable("app.memory is not importable")
+
+
+@benchmark("memory.load_memory")
+def bench_load_memory() -> typing.Callable[[], None]:
+    memory = _memory_module()
+    memory.MEMORY_FILE = os.path.join(tempfile.mkdtemp(), "memory.json")
+    history = [{"user": "Hello " * 20, "ai": "Hi there " * 50}] * memory.MAX_HISTORY
+    for idx in range(50):
+        memory.save_memory("user%d" % idx, {"history": list(history)})
+
+    def run() -> None:
+        memory.load_memory("user25")
+
+    return run
+
+
+@benchmark("memory.save_memory")
+def bench_save_memory() -> typing.Callable[[], None]:
+    memory = _memory_module()
+    memory.MEMORY_FILE = os.path.join(tempfile.mkdtemp(), "memory.json")
+    history = [{"user": "Hello " * 20, "ai": "Hi there " * 50}] * memory.MAX_HISTORY
+    for idx in range(50):
+        memory.save_memory("user%d" % idx, {"history": list(history)})
+
+    def run() -> None:
+        memory.save_memory("user25", {"history": list(history)})
+
+    return run
+
+
+def measure(
+    func: typing.Callable[[], None],
+    repeats: int,
+    warmup: int,
+    min_time: float,
+) -> typing.Dict[str, typing.Any]:
+    """
+    Time `func`, returning seconds per call for each repeat with their summary.
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        loops *= 2
+
+    samples = []
+    for idx in range(warmup + repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if idx >= warmup:
+            samples.append((time.perf_counter() - started) / loops)
+
+    mean = statistics.fmean(samples)
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    margin = t_critical(len(samples) - 1) * stdev / math.sqrt(len(samples))
+    return {
+        "mean": mean,
+        "stdev": stdev,
+        "ci95": [mean - margin, mean + margin],
+        "loops": loops,
+        "samples": samples,
+    }
+
+
+def compare_results(
+    baseline: typing.Dict[str, typing.Any],
+    current: typing.Dict[str, typing.Any],
+    threshold: float,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Compare each benchmark with Welch's t-test, marking it as a regression
+    when it is more than `threshold` slower and the difference is significant.
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name], current[name]
+        n1, n2 = len(before["samples"]), len(after["samples"])
+        var1 = before["stdev"] ** 2 / n1
+        var2 = after["stdev"] ** 2 / n2
+        change = after["mean"] / before["mean"] - 1
+        if var1 + var2 == 0:
+            significant = change != 0
+        else:
+            t = (after["mean"] - before["mean"]) / math.sqrt(var1 + var2)
+            dof = (var1 + var2) ** 2 / (
+                var1**2 / max(1, n1 - 1) + var2**2 / max(1, n2 - 1)
+            )
+            significant = abs(t) > t_critical(dof)
+        if not significant:
+            verdict = "same"
+        elif change > threshold:
+            verdict = "slower"
+        elif change < -threshold:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append(
+            {
+                "name": name,
+                "baseline": before["mean"],
+                "current": after["mean"],
+                "change": change,
+                "significant": significant,
+                "verdict": verdict,
+            }
+        )
+    return rows
+
+
+def run_benchmarks(
+    names: typing.Sequence[str], repeats: int, warmup: int, min_time: float
+) -> typing.Dict[str, typing.Any]:
+    results = {}
+    for name in names:
+        try:
+            func = BENCHMARKS[name]()
+        except BenchmarkUnavailable as exc:
+            click.echo("%-40s skipped, %s" % (name, exc), err=True)
+            continue
+        result = measure(func, repeats, warmup, min_time)
+        results[name] = result
+        low, high = result["ci95"]
+        click.echo(
+            "%-40s %10.3f us  (95%% CI %.3f - %.3f)"
+            % (name, result["mean"] * 1e6, low * 1e6, high * 1e6),
+            err=True,
+        )
+    return results
+
+
+def _select(patterns: typing.Sequence[str]) -> typing.List[str]:
+    if not patterns:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(p in name for p in patterns)]
+
+
+@click.group()
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    # Benchmarks that need an event loop get a fresh one.
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+_options = [
+    click.option(
+        "-k",
+        "--filter",
+        "patterns",
+        multiple=True,
+        help="Only run benchmarks whose name contains this string.",
+    ),
+    click.option(
+        "--repeats", type=int, default=20, help="Timed repeats.", show_default=True
+    ),
+    click.option(
+        "--warmup",
+        type=int,
+        default=3,
+        help="Untimed repeats before measuring.",
+        show_default=True,
+    ),
+    click.option(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="Minimum seconds per repeat.",
+        show_default=True,
+    ),
+]
+
+
+def _add_options(func: typing.Callable) -> typing.Callable:
+    for option in reversed(_options):
+        func = option(func)
+    return func
+
+
+@main.command()
+@_add_options
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="File to write the results to, as JSON.",
+    show_default=True,
+)
+def run(
+    patterns: typing.List[str],
+    repeats: int,
+    warmup: int,
+    min_time: float,
+    output: typing.TextIO,
+) -> None:
+    """Run the benchmarks."""
+    results = run_benchmarks(_select(patterns), repeats, warmup, min_time)
+    json.dump(
+        {"python": sys.version.split()[0], "benchmarks": results}, output, indent=2
+    )
+    output.write("\n")
+
+
+@main.command()
+@click.argument("baseline", type=click.File("r"))
+@click.argument("current", type=click.File("r"), required=False)
+@_add_options
+@click.option(
+    "--threshold",
+    type=float,
+    default=5.0,
+    help="Percentage slowdown to report as a regression.",
+    show_default=True,
+)
+def compare(
+    baseline: typing.TextIO,
+    current: typing.Optional[typing.TextIO],
+    patterns: typing.List[str],
+    repeats: int,
+    warmup: int,
+    min_time: float,
+    threshold: float,
+) -> None:
+    """
+    Compare against a baseline, running the benchmarks unless CURRENT is given.
+    Exits with status 1 if anything got significantly slower.
+    """
+    before = json.load(baseline)["benchmarks"]
+    if current is not None:
+        after = json.load(current)["benchmarks"]
+    else:
+        names = [name for name in _select(patterns) if name in before]
+        after = run_benchmarks(names, repeats, warmup, min_time)
+
+    rows = compare_results(before, after, threshold / 100)
+    for row in rows:
+        click.echo(
+            "%-40s %10.3f us -> %10.3f us  %+7.1f%%  %s"
+            % (
+                row["name"],
+                row["baseline"] * 1e6,
+                row["current"] * 1e6,
+                row["change"] * 100,
+                row["verdict"],
+            )
+        )
+    if any(row["verdict"] == "slower" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
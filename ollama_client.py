@@ -1,13 +1,61 @@
-import requests
+import json
 import os
 
+import requests
+
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 MODEL_NAME = os.getenv("MODEL_NAME", "sxudo")
+# Seconds to wait for Ollama when the request has no deadline.
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
 
-def query_ollama(message: str) -> str:
+def query_ollama(message: str, deadline=None) -> str:
+    timeout = OLLAMA_TIMEOUT
+    if deadline is not None:
+        deadline.check("model call")
+        timeout = min(timeout, deadline.remaining())
     response = requests.post(
         f"{OLLAMA_BASE_URL}/api/generate",
-        json={"model": MODEL_NAME, "prompt": message}
+        json={"model": MODEL_NAME, "prompt": message},
+        timeout=timeout
     )
     response.raise_for_status()
     return response.json().get("response", "")
+
+def chat_stream(messages, options=None, timeout=OLLAMA_TIMEOUT, deadline=None):
+    """
+    Stream a chat reply from Ollama, one chunk per generated piece.
+
+    `timeout` bounds connecting and each wait for the next chunk. With a
+    `deadline`, each wait is also bounded by the time left, recomputed for
+    every chunk, so a stalled stream fails once the deadline has passed.
+    Closing the generator drops the connection, which stops generation.
+    """
+    def time_left():
+        if deadline is None:
+            return timeout
+        return min(timeout, deadline.remaining())
+
+    response = requests.post(
+        f"{OLLAMA_BASE_URL}/api/chat",
+        json={
+            "model": MODEL_NAME,
+            "messages": messages,
+            "stream": True,
+            "options": options or None,
+        },
+        stream=True,
+        timeout=time_left()
+    )
+    connection = response.raw.connection
+    try:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+            sock = getattr(connection, "sock", None)
+            if deadline is not None and sock is not None:
+                if deadline.expired:
+                    return
+                sock.settimeout(time_left())
+    finally:
+        response.close()
@@ -0,0 +1,289 @@
+"""
+Startup and on-demand profiling.
+
+The startup profiler records how long each module takes to import, and when
+each startup phase of the server completes, measured from the start of the
+process.
+
+The sampling profiler is started in a running worker, usually by SIGUSR2. A
+background thread samples the stacks of the other threads and writes them in
+the collapsed format read by flame graph tools. Nothing runs until it starts.
+Supervisors pass SIGUSR2 on to their workers, so it can be sent to any
+process of the server.
+"""
+import collections
+import importlib.abc
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from importlib.machinery import ModuleSpec
+from types import FrameType, ModuleType
+from typing import Any, Counter, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+PROFILE_STARTUP_ENV = "UVICORN_PROFILE_STARTUP"
+
+
+def process_start_time() -> Optional[float]:
+    """
+    Return the wall clock time the current process started at, if known.
+    """
+    try:
+        with open("/proc/self/stat") as file:
+            stat = file.read()
+        with open("/proc/stat") as file:
+            boot_time = next(
+                int(line.split()[1]) for line in file if line.startswith("btime")
+            )
+    except (OSError, StopIteration, ValueError):
+        return None
+    # The command name may contain spaces, so count fields after the last ")".
+    start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+    return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader: importlib.abc.Loader, profiler: "StartupProfiler"):
+        self.loader = loader
+        self.profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loader, name)
+
+    def create_module(self, spec: ModuleSpec) -> Optional[ModuleType]:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        # Hand the real loader back to the module, for anything that inspects it.
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.profiler.import_started()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.import_finished(module.__name__)
+
+
+class StartupProfiler(importlib.abc.MetaPathFinder):
+    """
+    A meta path finder that times the execution of every module imported after
+    `install()`, plus named phases recorded with `mark()`.
+    """
+
+    def __init__(self) -> None:
+        self.installed_at = time.perf_counter()
+        start = process_start_time()
+        # Seconds between the process starting and this profiler existing.
+        self.offset = 0.0 if start is None else max(0.0, time.time() - start)
+        self.imports: List[Tuple[str, float, float, float]] = []
+        self.phases: List[Tuple[str, float]] = [("profiler installed", self.offset)]
+        self._stack: List[Tuple[float, float]] = []
+
+    def now(self) -> float:
+        return self.offset + time.perf_counter() - self.installed_at
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Optional[Sequence[str]],
+        target: Optional[ModuleType] = None,
+    ) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)  # type: ignore
+                return spec
+        return None
+
+    def import_started(self) -> None:
+        self._stack.append((self.now(), 0.0))
+
+    def import_finished(self, name: str) -> None:
+        start, children = self._stack.pop()
+        elapsed = self.now() - start
+        if self._stack:
+            parent_start, parent_children = self._stack[-1]
+            self._stack[-1] = (parent_start, parent_children + elapsed)
+        self.imports.append((name, start, elapsed, elapsed - children))
+
+    def mark(self, phase: str) -> None:
+        self.phases.append((phase, self.now()))
+
+    def report(self, limit: int = 20) -> None:
+        self.mark("ready")
+        lines = ["Startup profile for process [%d]:" % os.getpid()]
+        previous = 0.0
+        for phase, at in self.phases:
+            lines.append("  %8.3fs  %+8.3fs  %s" % (at, at - previous, phase))
+            previous = at
+        imports = sorted(self.imports, key=lambda item: item[3], reverse=True)
+        lines.append(
+            "  Slowest of %d imports (start, cumulative, self):" % len(self.imports)
+        )
+        for name, start, elapsed, own in imports[:limit]:
+            lines.append("  %8.3fs  %8.3fs  %8.3fs  %s" % (start, elapsed, own, name))
+        logger.info("\n".join(lines))
+
+
+_startup_profiler: Optional[StartupProfiler] = None
+
+
+def get_startup_profiler() -> StartupProfiler:
+    global _startup_profiler
+
+    if _startup_profiler is None:
+        _startup_profiler = StartupProfiler()
+        _startup_profiler.install()
+    return _startup_profiler
+
+
+def mark(phase: str) -> None:
+    """
+    Record the end of a startup phase, if startup profiling is enabled.
+    """
+    if _startup_profiler is not None:
+        _startup_profiler.mark(phase)
+
+
+def report() -> None:
+    global _startup_profiler
+
+    if _startup_profiler is not None:
+        _startup_profiler.report()
+        _startup_profiler.uninstall()
+        _startup_profiler = None
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every other thread each `interval` seconds, for
+    `duration` seconds, then writes the counts to `directory`.
+    """
+
+    def __init__(
+        self, duration: float, directory: str, interval: float = 0.005
+    ) -> None:
+        self.duration = duration
+        self.directory = directory
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="uvicorn-sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        logger.info(
+            "Sampling profiler started for %.1fs in process [%d]",
+            self.duration,
+            os.getpid(),
+        )
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + self.duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self.stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+        self.write()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            frames.append("%s (%s:%d)" % (code.co_name, filename, code.co_firstlineno))
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def write(self) -> Optional[str]:
+        name = "uvicorn-profile-%d-%s.folded" % (
+            os.getpid(),
+            time.strftime("%Y%m%d-%H%M%S"),
+        )
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as file:
+                for stack, count in self.stacks.most_common():
+                    file.write("%s %d\n" % (stack, count))
+        except OSError as exc:
+            logger.error("Unable to write profile to %s: %s", path, exc)
+            return None
+        logger.info("Sampling profiler wrote %d samples to %s", self.samples, path)
+        return path
+
+
+_sampling_profiler: Optional[SamplingProfiler] = None
+
+
+def toggle_sampling_profiler(duration: float, directory: str) -> None:
+    """
+    Start a sampling profiler for `duration` seconds, or stop the one running.
+    """
+    global _sampling_profiler
+
+    if _sampling_profiler is not None and _sampling_profiler.running:
+        _sampling_profiler.stop()
+        return
+    _sampling_profiler = SamplingProfiler(duration, directory)
+    _sampling_profiler.start()
+
+
+def _worker_processes(supervisor: Any) -> Iterable[Any]:
+    # Multiprocess and RollingReload keep a list, the reloaders a single one.
+    processes = getattr(supervisor, "processes", None)
+    if processes is not None:
+        return list(processes)
+    process = getattr(supervisor, "process", None)
+    return [] if process is None else [process]
+
+
+def forward_sampling_signal(supervisor: Any) -> None:
+    """
+    Pass SIGUSR2 on to the current workers of `supervisor`, instead of letting
+    it terminate the supervisor. Each worker runs its own profiler.
+    """
+    if not hasattr(signal, "SIGUSR2"):  # pragma: py-not-win32
+        return
+
+    def forward(sig: int, frame: Optional[FrameType]) -> None:
+        for process in _worker_processes(supervisor):
+            if process.pid is not None and process.is_alive():
+                os.kill(process.pid, sig)
+
+    signal.signal(signal.SIGUSR2, forward)
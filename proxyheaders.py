@@ -0,0 +1,149 @@
+"""
+This middleware can be used when a known proxy is fronting the application,
+and is trusted to be properly setting the `X-Forwarded-Proto` and
+`X-Forwarded-For` headers with the connecting client information.
+
+Modifies the `client` and `scheme` information so that they reference
+the connecting client, rather that the connecting proxy.
+
+Trusted proxies can be given as addresses or CIDR networks, for IPv4 and
+IPv6. The networks are merged and sorted once, so checking an address is a
+binary search, and the result for recently seen addresses is cached.
+
+https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers#Proxies
+"""
+import bisect
+import ipaddress
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union, cast
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        HTTPScope,
+        Scope,
+        WebSocketScope,
+    )
+
+# Distinct client addresses to remember the trust decision for.
+CACHE_SIZE = 4096
+
+
+class TrustedHosts:
+    """
+    A set of trusted proxies, for `host in trusted_hosts` checks.
+
+    Entries are IP addresses, CIDR networks, `*` for everything, or any other
+    literal string such as the path of a UNIX socket, which is matched as is.
+    """
+
+    def __init__(self, trusted_hosts: Union[List[str], str]) -> None:
+        if isinstance(trusted_hosts, str):
+            trusted_hosts = trusted_hosts.split(",")
+        self.always_trust = False
+        self.literals: Set[str] = set()
+        networks: Dict[int, list] = {4: [], 6: []}
+        for item in trusted_hosts:
+            item = item.strip()
+            if not item:
+                continue
+            if item == "*":
+                self.always_trust = True
+                continue
+            try:
+                network = ipaddress.ip_network(item, strict=False)
+            except ValueError:
+                self.literals.add(item)
+                continue
+            # Clients are matched by their IPv4 address when IPv4-mapped.
+            mapped = getattr(network.network_address, "ipv4_mapped", None)
+            if mapped is not None and network.prefixlen >= 96:
+                network = ipaddress.IPv4Network((mapped, network.prefixlen - 96))
+            networks[network.version].append(network)
+
+        # Non overlapping ranges of integer addresses, sorted by their start.
+        self.ranges: Dict[int, Tuple[List[int], List[int]]] = {}
+        for version, items in networks.items():
+            starts, ends = [], []
+            for network in ipaddress.collapse_addresses(items):
+                starts.append(int(network.network_address))
+                ends.append(int(network.broadcast_address))
+            self.ranges[version] = (starts, ends)
+        self._lookup = lru_cache(maxsize=CACHE_SIZE)(self._match)
+
+    def __contains__(self, host: Optional[str]) -> bool:
+        if self.always_trust:
+            return True
+        if host is None:
+            return False
+        return self._lookup(host)
+
+    def _match(self, host: str) -> bool:
+        if host in self.literals:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        starts, ends = self.ranges[address.version]
+        value = int(address)
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= ends[index]
+
+
+class ProxyHeadersMiddleware:
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        trusted_hosts: Union[List[str], str] = "127.0.0.1",
+    ) -> None:
+        self.app = app
+        self.trusted_hosts = TrustedHosts(trusted_hosts)
+        self.always_trust = self.trusted_hosts.always_trust
+
+    def get_trusted_client_host(
+        self, x_forwarded_for_hosts: List[str]
+    ) -> Optional[str]:
+        if self.always_trust:
+            return x_forwarded_for_hosts[0]
+
+        for host in reversed(x_forwarded_for_hosts):
+            if host not in self.trusted_hosts:
+                return host
+
+        return None
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] in ("http", "websocket"):
+            scope = cast(Union["HTTPScope", "WebSocketScope"], scope)
+            client_addr: Optional[Tuple[str, int]] = scope.get("client")
+            client_host = client_addr[0] if client_addr else None
+
+            if client_host in self.trusted_hosts:
+                headers = dict(scope["headers"])
+
+                if b"x-forwarded-proto" in headers:
+                    # Determine if the incoming request was http or https based on
+                    # the X-Forwarded-Proto header.
+                    x_forwarded_proto = headers[b"x-forwarded-proto"].decode("latin1")
+                    scope["scheme"] = x_forwarded_proto.strip()  # type: ignore[index]
+
+                if b"x-forwarded-for" in headers:
+                    # Determine the client address from the last trusted IP in the
+                    # X-Forwarded-For header. We've lost the connecting client's port
+                    # information by now, so only include the host.
+                    x_forwarded_for = headers[b"x-forwarded-for"].decode("latin1")
+                    x_forwarded_for_hosts = [
+                        item.strip() for item in x_forwarded_for.split(",")
+                    ]
+                    host = self.get_trusted_client_host(x_forwarded_for_hosts)
+                    port = 0
+                    scope["client"] = (host, port)  # type: ignore[arg-type]
+
+        return await self.app(scope, receive, send)
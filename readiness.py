@@ -0,0 +1,219 @@
+"""
+Worker warm-up and health endpoints.
+
+Warm-up requests are synthetic ASGI requests sent to the application in
+process after lifespan startup, so lazy imports, template compilation, first
+connections to backends and cold caches are paid for before real traffic
+arrives. They are sent before the worker starts accepting connections, unless
+a readiness path is set: then the worker listens first, and answers readiness
+probes with 503 until warm-up is done, while liveness probes succeed.
+
+Warm-up requests carry the `uvicorn.warmup` scope extension, so middlewares
+that count or limit real traffic can skip them.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGIReceiveEvent,
+        ASGISendCallable,
+        ASGISendEvent,
+        HTTPScope,
+        Scope,
+    )
+
+    from uvicorn.config import Config
+    from uvicorn.server import ServerState
+
+logger = logging.getLogger("uvicorn.error")
+
+WARMUP_EXTENSION = "uvicorn.warmup"
+
+
+def is_warmup(scope: "Scope") -> bool:
+    return WARMUP_EXTENSION in scope.get("extensions", {})  # type: ignore[operator]
+
+
+class WarmupRequest(NamedTuple):
+    method: str
+    path: str
+    body: bytes
+
+
+def parse_warmup_request(value: str) -> WarmupRequest:
+    """
+    Parse a warm-up request, as "[METHOD] PATH [BODY]". A body that looks
+    like JSON is sent as JSON, and any other body as a form.
+    """
+    parts = value.strip().split(None, 2)
+    if parts and parts[0].startswith("/"):
+        parts.insert(0, "GET")
+    if len(parts) < 2 or not parts[1].startswith("/"):
+        raise ValueError("Missing path")
+    body = parts[2].encode() if len(parts) > 2 else b""
+    return WarmupRequest(parts[0].upper(), parts[1], body)
+
+
+async def send_warmup_request(
+    app: "ASGI3Application",
+    request: WarmupRequest,
+    config: "Config",
+    app_state: Dict[str, Any],
+) -> int:
+    """
+    Send one request to the application, returning the response status.
+    """
+    path, _, query_string = request.path.partition("?")
+    headers = [(b"host", b"localhost"), (b"user-agent", b"uvicorn-warmup")]
+    if request.body:
+        content_type = b"application/x-www-form-urlencoded"
+        if request.body[:1] in (b"{", b"["):
+            content_type = b"application/json"
+        headers.append((b"content-type", content_type))
+        headers.append((b"content-length", b"%d" % len(request.body)))
+    scope: "HTTPScope" = {  # type: ignore[typeddict-item]
+        "type": "http",
+        "asgi": {"version": config.asgi_version, "spec_version": "2.3"},
+        "http_version": "1.1",
+        "server": None,
+        "client": None,
+        "scheme": "http",
+        "method": request.method,
+        "root_path": config.root_path,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": headers,
+        "state": app_state.copy(),
+        "extensions": {WARMUP_EXTENSION: {}},
+    }
+    status = 0
+    request_sent = False
+    response_complete = asyncio.Event()
+
+    async def receive() -> "ASGIReceiveEvent":
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": request.body, "more_body": False}
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: "ASGISendEvent") -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get(
+            "more_body", False
+        ):
+            response_complete.set()
+
+    try:
+        await app(scope, receive, send)  # type: ignore[arg-type]
+    finally:
+        response_complete.set()
+    return status
+
+
+async def run_warmup(
+    app: "ASGI3Application",
+    config: "Config",
+    app_state: Dict[str, Any],
+) -> None:
+    """
+    Send each warm-up request in turn. Failures are logged, and don't stop the
+    worker from starting.
+    """
+    started = time.perf_counter()
+    for request in config.warmup_requests:
+        request_started = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(
+                send_warmup_request(app, request, config, app_state),
+                config.warmup_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Warm-up request %s %s timed out after %.1fs",
+                request.method,
+                request.path,
+                config.warmup_timeout,
+            )
+        except Exception as exc:
+            logger.warning(
+                "Warm-up request %s %s failed: %s", request.method, request.path, exc
+            )
+        else:
+            logger.debug(
+                "Warm-up request %s %s returned %d in %.3fs",
+                request.method,
+                request.path,
+                status,
+                time.perf_counter() - request_started,
+            )
+    logger.info(
+        "Warm-up of %d requests finished in %.3fs",
+        len(config.warmup_requests),
+        time.perf_counter() - started,
+    )
+
+
+class HealthMiddleware:
+    """
+    Answer liveness and readiness probes before they reach the application.
+
+    Liveness succeeds whenever the worker's event loop can serve a request.
+    Readiness succeeds once the worker has warmed up and is serving, and fails
+    again as soon as it starts shutting down, so load balancers stop sending
+    it new requests.
+    """
+
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        server_state: "ServerState",
+        readiness_path: Optional[str] = None,
+        liveness_path: Optional[str] = None,
+    ) -> None:
+        self.app = app
+        self.server_state = server_state
+        self.readiness_path = readiness_path
+        self.liveness_path = liveness_path
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path == self.liveness_path:
+                await self.respond(send, 200, "alive")
+                return
+            if path == self.readiness_path:
+                if self.server_state.ready:
+                    await self.respond(send, 200, "ready")
+                else:
+                    await self.respond(send, 503, "not ready")
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def respond(send: "ASGISendCallable", status: int, message: str) -> None:
+        body = json.dumps({"status": message}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", b"%d" % len(body)),
+                    (b"cache-control", b"no-store"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body, "more_body": False})
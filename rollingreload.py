@@ -0,0 +1,182 @@
+import logging
+import os
+import signal
+import threading
+from multiprocessing.context import SpawnProcess
+from multiprocessing.synchronize import Event
+from socket import socket
+from types import FrameType
+from typing import Callable, List, Optional
+
+import click
+
+from uvicorn import profiler
+from uvicorn._subprocess import get_subprocess, spawn
+from uvicorn.config import Config
+
+HANDLED_SIGNALS = (
+    signal.SIGINT,  # Unix signal 2. Sent by Ctrl+C.
+    signal.SIGTERM,  # Unix signal 15. Sent by `kill <pid>`.
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class RollingReload:
+    """
+    A supervisor that replaces its workers without closing the listening sockets.
+
+    On SIGHUP a new generation of workers is spawned against the same sockets.
+    Once every new worker has reported ready, the previous generation is sent
+    SIGTERM and given `timeout_graceful_shutdown` seconds to drain in-flight
+    requests. If the new generation fails to come up, it is discarded and the
+    previous generation keeps serving.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        target: Callable[..., None],
+        sockets: List[socket],
+    ) -> None:
+        self.config = config
+        self.target = target
+        self.sockets = sockets
+        self.processes: List[SpawnProcess] = []
+        self.generation = 0
+        self.should_exit = threading.Event()
+        self.should_reload = threading.Event()
+        self.wakeup = threading.Event()
+        self.pid = os.getpid()
+
+    def signal_handler(self, sig: int, frame: Optional[FrameType]) -> None:
+        """
+        A signal handler that is registered with the parent process.
+        """
+        self.should_exit.set()
+        self.wakeup.set()
+
+    def reload_handler(self, sig: int, frame: Optional[FrameType]) -> None:
+        self.should_reload.set()
+        self.wakeup.set()
+
+    def run(self) -> None:
+        self.startup()
+        while not self.should_exit.is_set():
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.should_reload.is_set() and not self.should_exit.is_set():
+                self.should_reload.clear()
+                self.reload()
+        self.shutdown()
+
+    def startup(self) -> None:
+        message = "Started parent process [{}]".format(str(self.pid))
+        color_message = "Started parent process [{}]".format(
+            click.style(str(self.pid), fg="cyan", bold=True)
+        )
+        logger.info(message, extra={"color_message": color_message})
+
+        for sig in HANDLED_SIGNALS:
+            signal.signal(sig, self.signal_handler)
+        signal.signal(signal.SIGHUP, self.reload_handler)
+        if self.config.profile_duration is not None:
+            profiler.forward_sampling_signal(self)
+
+        processes = self.spawn_generation()
+        if processes is None and not self.should_exit.is_set():
+            logger.error("Workers failed to start, see the messages above.")
+            self.should_exit.set()
+        self.processes = processes or []
+
+    def spawn_generation(self) -> Optional[List[SpawnProcess]]:
+        """
+        Start a full set of workers and wait until each of them is serving.
+
+        Returns `None`, after stopping whatever was started, if any worker
+        exits or fails to become ready within `timeout_worker_ready` seconds,
+        or if the server is asked to exit in the meantime.
+        """
+        self.generation += 1
+        processes = []
+        events = []
+        for _ in range(self.config.workers):
+            ready_event = spawn.Event()
+            process = get_subprocess(
+                config=self.config,
+                target=self.target,
+                sockets=self.sockets,
+                ready_event=ready_event,
+            )
+            process.start()
+            processes.append(process)
+            events.append(ready_event)
+
+        for process, ready_event in zip(processes, events):
+            if not self._wait_ready(process, ready_event):
+                self._stop(processes)
+                return None
+
+        logger.info(
+            "Generation %d ready with workers %s",
+            self.generation,
+            [process.pid for process in processes],
+        )
+        return processes
+
+    def _wait_ready(self, process: SpawnProcess, ready_event: Event) -> bool:
+        timeout = self.config.timeout_worker_ready
+        waited = 0.0
+        while not ready_event.wait(0.1):
+            waited += 0.1
+            if self.should_exit.is_set():
+                return False
+            if not process.is_alive():
+                logger.error("Worker [%s] exited before becoming ready", process.pid)
+                return False
+            if timeout is not None and waited >= timeout:
+                logger.error(
+                    "Worker [%s] not ready after %s seconds", process.pid, timeout
+                )
+                return False
+        return True
+
+    def reload(self) -> None:
+        logger.info("Received SIGHUP, starting generation %d", self.generation + 1)
+        processes = self.spawn_generation()
+        if processes is None:
+            if self.should_exit.is_set():
+                return
+            logger.error(
+                "New generation failed to start, keeping workers %s",
+                [process.pid for process in self.processes],
+            )
+            return
+
+        previous, self.processes = self.processes, processes
+        self._stop(previous)
+
+    def _stop(self, processes: List[SpawnProcess]) -> None:
+        """
+        Ask workers to shut down gracefully, killing any that are still running
+        after `timeout_graceful_shutdown` (plus a second for lifespan shutdown).
+        """
+        for process in processes:
+            process.terminate()
+
+        timeout = self.config.timeout_graceful_shutdown
+        for process in processes:
+            process.join(None if timeout is None else timeout + 1)
+            if process.is_alive():  # pragma: no cover
+                logger.warning("Killing worker [%s] after drain timeout", process.pid)
+                process.kill()
+                process.join()
+
+    def shutdown(self) -> None:
+        self._stop(self.processes)
+
+        message = "Stopping parent process [{}]".format(str(self.pid))
+        color_message = "Stopping parent process [{}]".format(
+            click.style(str(self.pid), fg="cyan", bold=True)
+        )
+        logger.info(message, extra={"color_message": color_message})
@@ -7,15 +7,31 @@ import socket
 import sys
 import threading
 import time
+from collections import OrderedDict
 from email.utils import formatdate
+from multiprocessing.synchronize import Event
 from types import FrameType
-from typing import TYPE_CHECKING, List, Optional, Sequence, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import click
 
-from uvicorn.config import Config
+from uvicorn import profiler
+from uvicorn.config import Config, socket_from_fd
+from uvicorn.loopmonitor import LoopMonitor
+from uvicorn.timerwheel import Timer, TimerWheel, WheelLoop
 
 if TYPE_CHECKING:
+    from uvicorn.metrics import SharedMetrics
     from uvicorn.protocols.http.h11_impl import H11Protocol
     from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol
     from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
@@ -44,6 +60,134 @@ class ServerState:
         self.connections: Set["Protocols"] = set()
         self.tasks: Set[asyncio.Task] = set()
         self.default_headers: List[Tuple[bytes, bytes]] = []
+        self.timer_wheel = TimerWheel()
+        # Open connections, least recently active first.
+        self.activity: "OrderedDict[Protocols, None]" = OrderedDict()
+        # When each connection that is over its write buffer limit paused.
+        self.paused_writing: Dict["Protocols", float] = {}
+        # Whether this worker should receive new requests, for readiness probes.
+        self.ready = False
+
+
+class ConnectionTracking:
+    """
+    Mixed into the HTTP protocol class by `Server.startup()`, so connections
+    are tracked without any wrapper or closures per connection.
+
+    Each connection keeps its place in the least recently active order, and a
+    deadline for reading the request in progress. The headers must arrive
+    within `timeout_request_headers` of the request's first byte, or of the
+    connection being made, and the whole body within `timeout_request_body`.
+    Receiving more bytes doesn't move the deadline, so a client trickling a
+    request can't hold on to the connection.
+
+    Write buffer limits are applied to each transport too. Over the high
+    water mark the transport pauses the protocol, which holds back the
+    application's next `send()` until the client has caught up.
+    """
+
+    # The protocols already use `server` for the local address.
+    tracking_server: "Server"
+    config: Config
+    server_state: ServerState
+    transport: asyncio.Transport
+    # When the request being read started, while any of it is still to come.
+    read_started: Optional[float] = None
+    read_deadline: Optional[Timer] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        config = self.config
+        if not config.tcp_nodelay:
+            Server._disable_nodelay(transport)
+        if config.write_buffer_high or config.write_buffer_low:
+            transport.set_write_buffer_limits(  # type: ignore[attr-defined]
+                high=config.write_buffer_high, low=config.write_buffer_low
+            )
+        if config.ssl_handshake_stats is not None:
+            config.ssl_handshake_stats.connection_made(transport)
+        super().connection_made(transport)  # type: ignore[misc]
+        self.server_state.activity[self] = None  # type: ignore[index]
+        self.read_started = time.monotonic()
+        self.schedule_read_deadline(config.timeout_request_headers)
+        self.tracking_server.limit_connections(self)
+
+    def data_received(self, data: bytes) -> None:
+        activity = self.server_state.activity
+        if self in activity:
+            activity.move_to_end(self)  # type: ignore[arg-type]
+        if self.read_started is None and Server._is_idle(self):
+            # No request is in progress, so this starts the next one.
+            self.read_started = time.monotonic()
+        super().data_received(data)  # type: ignore[misc]
+        if self.read_started is None:
+            return
+        part, timeout = self.read_timeout()
+        if timeout is None:
+            # The whole request is in, usually within a single call.
+            self.read_started = None
+            if self.read_deadline is not None:
+                self.read_deadline.cancel()
+        elif self.read_deadline is None or self.read_deadline.slot is None:
+            self.schedule_read_deadline(
+                timeout - (time.monotonic() - self.read_started)
+            )
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        state = self.server_state
+        state.activity.pop(self, None)  # type: ignore[call-overload]
+        state.paused_writing.pop(self, None)  # type: ignore[call-overload]
+        if self.read_deadline is not None:
+            self.read_deadline.cancel()
+        super().connection_lost(exc)  # type: ignore[misc]
+
+    def pause_writing(self) -> None:
+        self.server_state.paused_writing[self] = time.monotonic()  # type: ignore
+        super().pause_writing()  # type: ignore[misc]
+
+    def resume_writing(self) -> None:
+        paused_at = self.server_state.paused_writing.pop(self, None)  # type: ignore
+        metrics = self.config.metrics
+        if paused_at is not None and metrics is not None:
+            metrics.observe("write_paused_seconds", time.monotonic() - paused_at)
+        super().resume_writing()  # type: ignore[misc]
+
+    def read_timeout(self) -> Tuple[str, Optional[float]]:
+        """
+        The part of the request being read, and how long it may take from the
+        request's start. No timeout once the request has been read.
+        """
+        if Server._is_idle(self):
+            return "headers", self.config.timeout_request_headers
+        if getattr(getattr(self, "cycle", None), "more_body", False):
+            return "body", self.config.timeout_request_body
+        return "", None
+
+    def schedule_read_deadline(self, delay: float) -> None:
+        if self.read_deadline is None:
+            self.read_deadline = self.server_state.timer_wheel.schedule(
+                delay, self.on_read_deadline
+            )
+        else:
+            self.server_state.timer_wheel.reschedule(self.read_deadline, delay)
+
+    def on_read_deadline(self) -> None:
+        if self.transport.get_protocol() is not self:
+            # Upgraded to a websocket, which keeps its own timeouts.
+            self.server_state.activity.pop(self, None)  # type: ignore[call-overload]
+            return
+        started = self.read_started
+        if started is None or self.transport.is_closing():
+            return
+        part, timeout = self.read_timeout()
+        if timeout is None:
+            self.read_started = None
+            return
+        remaining = timeout - (time.monotonic() - started)
+        if remaining > 0:
+            self.schedule_read_deadline(remaining)
+            return
+        logger.debug("Request %s not received within %.1fs, closing.", part, timeout)
+        self.transport.close()
 
 
 class Server:
@@ -55,9 +199,16 @@ class Server:
         self.should_exit = False
         self.force_exit = False
         self.last_notified = 0.0
-
-    def run(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        self.ready_event: Optional[Event] = None
+        self.loop_monitor: Optional[LoopMonitor] = None
+
+    def run(
+        self,
+        sockets: Optional[List[socket.socket]] = None,
+        ready_event: Optional[Event] = None,
+    ) -> None:
         self.config.setup_event_loop()
+        self.ready_event = ready_event
         return asyncio.run(self.serve(sockets=sockets))
 
     async def serve(self, sockets: Optional[List[socket.socket]] = None) -> None:
@@ -66,6 +217,7 @@ class Server:
         config = self.config
         if not config.loaded:
             config.load()
+        profiler.mark("config loaded")
 
         self.lifespan = config.lifespan_class(config)
 
@@ -90,21 +242,41 @@ class Server:
         if self.lifespan.should_exit:
             self.should_exit = True
             return
+        profiler.mark("lifespan startup complete")
 
         config = self.config
 
+        # With a readiness path, probes can tell that the worker is warming up,
+        # so it listens first. Otherwise it warms up before listening, so the
+        # first real requests don't pay for it.
+        warm_up_first = config.readiness_path is None
+        if config.warmup_requests and warm_up_first:
+            await self.warm_up()
+        if config.readiness_path or config.liveness_path:
+            from uvicorn.readiness import HealthMiddleware
+
+            config.loaded_app = HealthMiddleware(
+                config.loaded_app,
+                self.server_state,
+                readiness_path=config.readiness_path,
+                liveness_path=config.liveness_path,
+            )
+
+        protocol_class = self.tracked_protocol_class(config.http_protocol_class)
+        loop = asyncio.get_running_loop()
+        # The protocols' keep-alive timers go on the wheel.
+        wheel_loop = WheelLoop(loop, self.server_state.timer_wheel)
+
         def create_protocol(
             _loop: Optional[asyncio.AbstractEventLoop] = None,
         ) -> asyncio.Protocol:
-            return config.http_protocol_class(  # type: ignore[call-arg]
+            return protocol_class(  # type: ignore[call-arg]
                 config=config,
                 server_state=self.server_state,
                 app_state=self.lifespan.state,
-                _loop=_loop,
+                _loop=_loop or wheel_loop,
             )
 
-        loop = asyncio.get_running_loop()
-
         listeners: Sequence[socket.SocketType]
         if sockets is not None:
             # Explicitly passed a list of open sockets.
@@ -132,15 +304,29 @@ class Server:
                 self.servers.append(server)
             listeners = sockets
 
+        elif config.bind:
+            # Every bind target, listening in this one event loop.
+            listeners = [config.bind_socket(target) for target in config.bind]
+            self.servers = []
+            for sock in listeners:
+                server = await loop.create_server(
+                    create_protocol, sock=sock, ssl=config.ssl, backlog=config.backlog
+                )
+                self.servers.append(server)
+
         elif config.fd is not None:  # pragma: py-win32
             # Use an existing socket, from a file descriptor.
-            sock = socket.fromfd(config.fd, socket.AF_UNIX, socket.SOCK_STREAM)
+            sock = socket_from_fd(config.fd)
             server = await loop.create_server(
                 create_protocol, sock=sock, ssl=config.ssl, backlog=config.backlog
             )
             assert server.sockets is not None  # mypy
             listeners = server.sockets
             self.servers = [server]
+            # Already listening, so only options accepted connections inherit
+            # take effect.
+            config.configure_socket(sock)
+            self._log_started_message(listeners)
 
         elif config.uds is not None:  # pragma: py-win32
             # Create a socket using UNIX domain socket.
@@ -154,34 +340,97 @@ class Server:
             assert server.sockets is not None  # mypy
             listeners = server.sockets
             self.servers = [server]
+            for listener in listeners:
+                config.configure_socket(listener)
+            self._log_started_message(listeners)
 
         else:
-            # Standard case. Create a socket from a host/port pair.
+            # Standard case. Bind a socket to a host/port pair, as the workers
+            # do, so its options are set before create_server() listens on it.
+            # TCP_FASTOPEN and TCP_DEFER_ACCEPT only apply if set before then.
             try:
-                server = await loop.create_server(
-                    create_protocol,
-                    host=config.host,
-                    port=config.port,
-                    ssl=config.ssl,
-                    backlog=config.backlog,
-                )
-            except OSError as exc:
-                logger.error(exc)
+                sock = config.bind_socket()
+            except SystemExit:
                 await self.lifespan.shutdown()
-                sys.exit(1)
-
-            assert server.sockets is not None
+                raise
+            server = await loop.create_server(
+                create_protocol, sock=sock, ssl=config.ssl, backlog=config.backlog
+            )
+            assert server.sockets is not None  # mypy
             listeners = server.sockets
             self.servers = [server]
 
-        if sockets is None:
-            self._log_started_message(listeners)
-        else:
-            # We're most likely running multiple workers, so a message has already been
-            # logged by `config.bind_socket()`.
-            pass
+        if config.warmup_requests and not warm_up_first:
+            await self.warm_up()
 
         self.started = True
+        self.server_state.ready = True
+        profiler.report()
+        if self.ready_event is not None:
+            # Tell the supervisor this worker is serving.
+            self.ready_event.set()
+
+    async def warm_up(self) -> None:
+        from uvicorn.readiness import run_warmup
+
+        await run_warmup(self.config.loaded_app, self.config, self.lifespan.state)
+        profiler.mark("warm-up complete")
+
+    def tracked_protocol_class(self, protocol_class: type) -> type:
+        return type(
+            protocol_class.__name__,
+            (ConnectionTracking, protocol_class),
+            {"tracking_server": self},
+        )
+
+    def update_connection_metrics(self, metrics: "SharedMetrics") -> None:
+        state = self.server_state
+        buffered = 0
+        for protocol in state.activity:
+            transport = getattr(protocol, "transport", None)
+            if transport is not None and not transport.is_closing():
+                buffered += transport.get_write_buffer_size()
+        metrics.set("connections", len(state.activity))
+        metrics.set("write_buffer_bytes", buffered)
+        metrics.set("write_paused_connections", len(state.paused_writing))
+
+    @staticmethod
+    def _disable_nodelay(transport: asyncio.BaseTransport) -> None:
+        # The event loops enable TCP_NODELAY on every accepted connection.
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+
+    @staticmethod
+    def _is_idle(protocol: Any) -> bool:
+        cycle = getattr(protocol, "cycle", None)
+        return cycle is None or cycle.response_complete
+
+    def _close_idle(self, protocol: Any) -> None:
+        self.server_state.activity.pop(protocol, None)
+        transport = getattr(protocol, "transport", None)
+        if transport is not None and transport.get_protocol() is not protocol:
+            # Upgraded to a websocket, which keeps its own timeouts.
+            return
+        protocol.shutdown()
+
+    def limit_connections(self, new_protocol: Any) -> None:
+        """
+        Enforce `max_connections` by closing the least recently active idle
+        connections, or the new connection if every other one is busy.
+        """
+        max_connections = self.config.max_connections
+        activity = self.server_state.activity
+        if max_connections is None or len(activity) <= max_connections:
+            return
+        for protocol in list(activity):
+            if len(activity) <= max_connections:
+                return
+            if protocol is not new_protocol and self._is_idle(protocol):
+                self._close_idle(protocol)
+        if len(activity) > max_connections:
+            logger.debug("Connection limit of %d reached.", max_connections)
+            self._close_idle(new_protocol)
 
     def _log_started_message(self, listeners: Sequence[socket.SocketType]) -> None:
         config = self.config
@@ -198,42 +447,28 @@ class Server:
                 "Uvicorn running on unix socket %s (Press CTRL+C to quit)", config.uds
             )
 
-        else:
-            addr_format = "%s://%s:%d"
-            host = "0.0.0.0" if config.host is None else config.host
-            if ":" in host:
-                # It's an IPv6 address.
-                addr_format = "%s://[%s]:%d"
-
-            port = config.port
-            if port == 0:
-                port = listeners[0].getsockname()[1]
-
-            protocol_name = "https" if config.ssl else "http"
-            message = f"Uvicorn running on {addr_format} (Press CTRL+C to quit)"
-            color_message = (
-                "Uvicorn running on "
-                + click.style(addr_format, bold=True)
-                + " (Press CTRL+C to quit)"
-            )
-            logger.info(
-                message,
-                protocol_name,
-                host,
-                port,
-                extra={"color_message": color_message},
-            )
-
     async def main_loop(self) -> None:
-        counter = 0
-        should_exit = await self.on_tick(counter)
-        while not should_exit:
-            counter += 1
-            counter = counter % 864000
-            await asyncio.sleep(0.1)
+        self.loop_monitor = LoopMonitor(
+            self.config.loop_monitor_threshold, metrics=self.config.metrics
+        )
+        self.loop_monitor.start()
+        try:
+            counter = 0
             should_exit = await self.on_tick(counter)
+            while not should_exit:
+                counter += 1
+                counter = counter % 864000
+                slept_at = time.monotonic()
+                await asyncio.sleep(0.1)
+                # Anything past the interval was spent running other callbacks.
+                self.loop_monitor.tick(time.monotonic() - slept_at - 0.1)
+                should_exit = await self.on_tick(counter)
+        finally:
+            self.loop_monitor.stop()
 
     async def on_tick(self, counter: int) -> bool:
+        self.server_state.timer_wheel.advance()
+
         # Update the default headers, once per second.
         if counter % 10 == 0:
             current_time = time.time()
@@ -254,6 +489,9 @@ class Server:
                     self.last_notified = current_time
                     await self.config.callback_notify()
 
+            if self.config.metrics is not None:
+                self.update_connection_metrics(self.config.metrics)
+
         # Determine if we should exit.
         if self.should_exit:
             return True
@@ -263,6 +501,7 @@ class Server:
 
     async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
         logger.info("Shutting down")
+        self.server_state.ready = False
 
         # Stop accepting new connections.
         for server in self.servers:
@@ -327,6 +566,15 @@ class Server:
             # Windows
             for sig in HANDLED_SIGNALS:
                 signal.signal(sig, self.handle_exit)
+            return
+
+        if self.config.profile_duration is not None:  # pragma: py-win32
+            loop.add_signal_handler(
+                signal.SIGUSR2,
+                profiler.toggle_sampling_profiler,
+                self.config.profile_duration,
+                self.config.profile_dir,
+            )
 
     def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
         if self.should_exit and sig == signal.SIGINT:
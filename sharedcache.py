@@ -0,0 +1,271 @@
+"""
+A cache shared by every worker process.
+
+Entries live in one `multiprocessing.shared_memory` arena, created by the
+parent process and attached by each worker, so a value cached by one worker is
+a hit in all of them, and is held in memory once.
+
+The arena is split into stripes, each an independent cache with its own lock,
+so writers to different stripes don't wait for each other. A stripe has fixed
+size slabs that each hold one entry, a linear probing hash index of the slabs,
+and a CLOCK hand that picks which slab to reuse once the stripe is full.
+"""
+import hashlib
+import multiprocessing
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from uvicorn.metrics import SharedMetrics
+
+ITEM_SIZE = 8  # Unsigned 64 bit words.
+
+# Fields of the metadata of each slab.
+HASH, KEY_LEN, VALUE_LEN, EXPIRES, STATE, INDEX_POS = range(6)
+META_SIZE = 6
+
+# Slab states. Referenced slabs are passed over once by the CLOCK hand.
+FREE, USED, REFERENCED = 0, 1, 2
+
+# An empty position in the index. Others hold the number of a slab, plus one.
+EMPTY = 0
+
+_shared_cache: Optional["SharedCache"] = None
+
+
+def get_shared_cache() -> Optional["SharedCache"]:
+    """
+    The cache shared with the other workers, or None if it isn't enabled.
+    """
+    return _shared_cache
+
+
+def install_shared_cache(cache: Optional["SharedCache"]) -> None:
+    global _shared_cache
+    _shared_cache = cache
+
+
+def _hash(key: bytes) -> int:
+    # The same in every process, unlike `hash()`.
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class SharedCache:
+    """
+    * size - Bytes of memory for entries.
+    * slab_size - Bytes in each slab, which is the largest key and value that
+                  can be cached together.
+    * stripes - Number of independently locked partitions.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        slab_size: int = 8192,
+        stripes: int = 16,
+        metrics: Optional["SharedMetrics"] = None,
+    ) -> None:
+        slabs = max(1, size // slab_size)
+        self.stripes = max(1, min(stripes, slabs))
+        self.stripe_slabs = slabs // self.stripes
+        self.slab_size = slab_size
+        # At most half full, so probe sequences stay short.
+        self.index_size = 1
+        while self.index_size < 2 * self.stripe_slabs:
+            self.index_size *= 2
+        # Each stripe has its CLOCK hand, its index, then its slab metadata.
+        self.stripe_words = 1 + self.index_size + META_SIZE * self.stripe_slabs
+        self.data_offset = self.stripes * self.stripe_words * ITEM_SIZE
+        data_size = self.stripes * self.stripe_slabs * slab_size
+        self.shm = SharedMemory(create=True, size=self.data_offset + data_size)
+        self.shm.buf[: self.data_offset] = bytes(self.data_offset)
+        context = multiprocessing.get_context("spawn")
+        self.locks = [context.Lock() for _ in range(self.stripes)]
+        self.metrics = metrics
+        self._words: Optional[memoryview] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_words"] = None
+        return state
+
+    @property
+    def words(self) -> memoryview:
+        if self._words is None:
+            self._words = self.shm.buf[: self.data_offset].cast("Q")
+        return self._words
+
+    def _home(self, key_hash: int) -> int:
+        # The low bits chose the stripe, so the index uses the ones above them.
+        return (key_hash // self.stripes) & (self.index_size - 1)
+
+    def _slab_offset(self, stripe: int, slab: int) -> int:
+        return self.data_offset + (stripe * self.stripe_slabs + slab) * self.slab_size
+
+    def _find(self, stripe: int, key_hash: int, key: bytes) -> Tuple[int, int]:
+        """
+        Return the index position and slab of `key`, or the empty position
+        where it would go and -1.
+        """
+        words = self.words
+        index = stripe * self.stripe_words + 1
+        meta = index + self.index_size
+        mask = self.index_size - 1
+        position = self._home(key_hash)
+        while True:
+            entry = words[index + position]
+            if entry == EMPTY:
+                return position, -1
+            slab = entry - 1
+            fields = meta + slab * META_SIZE
+            if words[fields + HASH] == key_hash:
+                offset = self._slab_offset(stripe, slab)
+                if self.shm.buf[offset : offset + words[fields + KEY_LEN]] == key:
+                    return position, slab
+            position = (position + 1) & mask
+
+    def _remove(self, stripe: int, slab: int) -> None:
+        """
+        Free a slab, shifting later entries of its probe sequence back into
+        the gap so lookups never need tombstones.
+        """
+        words = self.words
+        index = stripe * self.stripe_words + 1
+        meta = index + self.index_size
+        mask = self.index_size - 1
+        words[meta + slab * META_SIZE + STATE] = FREE
+        gap = probe = words[meta + slab * META_SIZE + INDEX_POS]
+        while True:
+            words[index + gap] = EMPTY
+            while True:
+                probe = (probe + 1) & mask
+                entry = words[index + probe]
+                if entry == EMPTY:
+                    return
+                fields = meta + (entry - 1) * META_SIZE
+                home = self._home(words[fields + HASH])
+                # Entries whose home is cyclically in (gap, probe] stay put.
+                if gap <= probe:
+                    if gap < home <= probe:
+                        continue
+                elif home > gap or home <= probe:
+                    continue
+                words[index + gap] = entry
+                words[fields + INDEX_POS] = gap
+                gap = probe
+                break
+
+    def _allocate(self, stripe: int) -> int:
+        """
+        Return a free slab, evicting the first unreferenced entry the CLOCK
+        hand reaches if there is none.
+        """
+        words = self.words
+        hand = stripe * self.stripe_words
+        meta = hand + 1 + self.index_size
+        while True:
+            slab = words[hand]
+            words[hand] = (slab + 1) % self.stripe_slabs
+            fields = meta + slab * META_SIZE
+            state = words[fields + STATE]
+            if state == FREE:
+                return slab
+            if state == REFERENCED:
+                words[fields + STATE] = USED
+                continue
+            self._remove(stripe, slab)
+            if self.metrics is not None:
+                self.metrics.inc("shared_cache_evictions")
+            return slab
+
+    def get(self, key: str) -> Optional[bytes]:
+        raw_key = key.encode()
+        key_hash = _hash(raw_key)
+        stripe = key_hash % self.stripes
+        value = None
+        with self.locks[stripe]:
+            _, slab = self._find(stripe, key_hash, raw_key)
+            if slab >= 0:
+                words = self.words
+                meta = stripe * self.stripe_words + 1 + self.index_size
+                fields = meta + slab * META_SIZE
+                expires = words[fields + EXPIRES]
+                if expires and expires <= time.time() * 1000:
+                    self._remove(stripe, slab)
+                else:
+                    words[fields + STATE] = REFERENCED
+                    offset = self._slab_offset(stripe, slab) + len(raw_key)
+                    value = bytes(
+                        self.shm.buf[offset : offset + words[fields + VALUE_LEN]]
+                    )
+        if self.metrics is not None:
+            self.metrics.inc(
+                "shared_cache_misses" if value is None else "shared_cache_hits"
+            )
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """
+        Cache `value` for `ttl` seconds, or until it is evicted. Returns False
+        if the key and value don't fit in a slab.
+        """
+        raw_key = key.encode()
+        if len(raw_key) + len(value) > self.slab_size:
+            return False
+        key_hash = _hash(raw_key)
+        stripe = key_hash % self.stripes
+        words = self.words
+        meta = stripe * self.stripe_words + 1 + self.index_size
+        with self.locks[stripe]:
+            _, slab = self._find(stripe, key_hash, raw_key)
+            if slab < 0:
+                slab = self._allocate(stripe)
+                # Allocating may have evicted an entry and moved others.
+                position, _ = self._find(stripe, key_hash, raw_key)
+                fields = meta + slab * META_SIZE
+                words[stripe * self.stripe_words + 1 + position] = slab + 1
+                words[fields + HASH] = key_hash
+                words[fields + KEY_LEN] = len(raw_key)
+                words[fields + INDEX_POS] = position
+                words[fields + STATE] = USED
+            fields = meta + slab * META_SIZE
+            offset = self._slab_offset(stripe, slab)
+            self.shm.buf[offset : offset + len(raw_key)] = raw_key
+            offset += len(raw_key)
+            self.shm.buf[offset : offset + len(value)] = value
+            words[fields + VALUE_LEN] = len(value)
+            words[fields + EXPIRES] = int((time.time() + ttl) * 1000) if ttl else 0
+        return True
+
+    def delete(self, key: str) -> bool:
+        raw_key = key.encode()
+        key_hash = _hash(raw_key)
+        stripe = key_hash % self.stripes
+        with self.locks[stripe]:
+            _, slab = self._find(stripe, key_hash, raw_key)
+            if slab >= 0:
+                self._remove(stripe, slab)
+        return slab >= 0
+
+    def __len__(self) -> int:
+        words = self.words
+        count = 0
+        for stripe in range(self.stripes):
+            meta = stripe * self.stripe_words + 1 + self.index_size
+            for slab in range(self.stripe_slabs):
+                count += words[meta + slab * META_SIZE + STATE] != FREE
+        return count
+
+    def close(self) -> None:
+        if self._words is not None:
+            self._words.release()
+            self._words = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """
+        Called in the parent process once every worker has exited.
+        """
+        self.close()
+        self.shm.unlink()
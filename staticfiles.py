@@ -0,0 +1,481 @@
+"""
+Static file serving at the server layer.
+
+Each mounted directory has an in-memory index of its files, with the size,
+modification time, a strong ETag and any precompressed ".gz" variant, so
+conditional requests are answered without touching the file system.
+
+Keeping the index current costs little: every `refresh_interval` the
+directories are stat'ed in a thread, and the index is only rebuilt once one of
+them changed, which is when files are added, removed or renamed. A file
+changed in place is noticed when it is served, as its entry is checked again
+in a thread once it is older than `refresh_interval`. Files that aren't kept
+in memory are also checked as they are opened, so a changed file is never
+sent with the headers of its old version.
+
+Small files are kept in memory, and when `precompress` is set the compressible
+ones without a ".gz" file get a gzip variant built in memory. Larger files are
+opened and read in chunks in the default executor, off the event loop. They
+are copied through user space: none of the HTTP protocols offers the ASGI
+"http.response.zerocopysend" extension, so `sendfile()` can't be used.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from asgiref.typing import (
+        ASGI3Application,
+        ASGIReceiveCallable,
+        ASGISendCallable,
+        HTTPScope,
+        Scope,
+    )
+
+logger = logging.getLogger("uvicorn.error")
+
+CHUNK_SIZE = 64 * 1024
+PRECOMPRESS_MINIMUM_SIZE = 500
+
+
+class StaticFile:
+    __slots__ = (
+        "path",
+        "size",
+        "mtime_ns",
+        "etag",
+        "content_type",
+        "headers",
+        "body",
+        "gzip",
+        "checked_at",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        mtime_ns: int,
+        etag: bytes,
+        content_type: str,
+        body: Optional[bytes],
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+        self.content_type = content_type
+        self.body = body
+        self.gzip: Optional[StaticFile] = None
+        self.checked_at = time.monotonic()
+        last_modified = formatdate(mtime_ns / 1_000_000_000, usegmt=True)
+        self.headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", content_type.encode("latin-1")),
+            (b"content-length", str(size).encode("latin-1")),
+            (b"etag", etag),
+            (b"last-modified", last_modified.encode("latin-1")),
+        ]
+
+
+def _content_type(path: str) -> str:
+    content_type, _ = mimetypes.guess_type(path)
+    if content_type is None:
+        return "application/octet-stream"
+    if content_type.startswith("text/") or content_type in (
+        "application/javascript",
+        "application/json",
+    ):
+        return content_type + "; charset=utf-8"
+    return content_type
+
+
+def _read_entry(
+    path: str,
+    stat: os.stat_result,
+    content_type: str,
+    max_cached_size: int,
+) -> StaticFile:
+    digest = hashlib.blake2b(digest_size=16)
+    chunks = []
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            if stat.st_size <= max_cached_size:
+                chunks.append(chunk)
+    etag = b'"' + digest.hexdigest().encode("ascii") + b'"'
+    body = b"".join(chunks) if stat.st_size <= max_cached_size else None
+    return StaticFile(path, stat.st_size, stat.st_mtime_ns, etag, content_type, body)
+
+
+def _copy_entry(entry: StaticFile) -> StaticFile:
+    return StaticFile(
+        entry.path,
+        entry.size,
+        entry.mtime_ns,
+        entry.etag,
+        entry.content_type,
+        entry.body,
+    )
+
+
+def _open_unchanged(entry: StaticFile) -> Optional[BinaryIO]:
+    """
+    Open the file of `entry`, or return None if it changed since it was indexed.
+    """
+    file = open(entry.path, "rb")
+    stat = os.fstat(file.fileno())
+    if (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime_ns):
+        file.close()
+        return None
+    return file
+
+
+def _add_variant(original: StaticFile, variant: StaticFile) -> None:
+    original.gzip = variant
+    variant.headers.append((b"content-encoding", b"gzip"))
+    original.headers.append((b"vary", b"accept-encoding"))
+    variant.headers.append((b"vary", b"accept-encoding"))
+
+
+def _gzip_variant(
+    entry: StaticFile, previous: Optional[StaticFile]
+) -> Optional[StaticFile]:
+    if (
+        previous is not None
+        and previous.etag == entry.etag
+        and previous.gzip is not None
+        and previous.gzip.path == entry.path
+    ):
+        return _copy_entry(previous.gzip)
+    from uvicorn.compression import is_compressible
+
+    if entry.body is None or not is_compressible(entry.content_type.encode()):
+        return None
+    body = gzip.compress(entry.body, mtime=0)
+    if len(body) >= entry.size:
+        return None
+    etag = entry.etag[:-1] + b'-gzip"'
+    return StaticFile(
+        entry.path, len(body), entry.mtime_ns, etag, entry.content_type, body
+    )
+
+
+def build_index(
+    directory: str,
+    max_cached_size: int,
+    previous: Optional[Dict[str, StaticFile]] = None,
+    precompress: bool = False,
+    directories: Optional[Dict[str, int]] = None,
+) -> Dict[str, StaticFile]:
+    """
+    Index the files below `directory` by their URL path relative to it.
+
+    Entries from `previous` are reused when the size and modification time of
+    the file haven't changed. The modification time of each directory walked
+    is recorded in `directories`.
+    """
+    previous = previous or {}
+    index: Dict[str, StaticFile] = {}
+    compressed: Dict[str, StaticFile] = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        if directories is not None:
+            try:
+                directories[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+        for name in files:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = os.path.relpath(path, directory).replace(os.sep, "/")
+            is_gzip = key.endswith(".gz")
+            entry = previous.get(key)
+            if is_gzip and entry is None:
+                original = previous.get(key[:-3])
+                if original is not None and original.gzip is not None:
+                    entry = original.gzip if original.gzip.path == path else None
+            if entry is not None and (entry.size, entry.mtime_ns) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+            ):
+                entry = _copy_entry(entry)
+            else:
+                content_type = _content_type(key[:-3] if is_gzip else key)
+                try:
+                    entry = _read_entry(path, stat, content_type, max_cached_size)
+                except OSError:
+                    continue
+            if is_gzip:
+                compressed[key] = entry
+            else:
+                index[key] = entry
+    for key, entry in compressed.items():
+        original = index.get(key[:-3])
+        if original is None:
+            # Served as is, without a decompressed variant to negotiate.
+            entry.headers[0] = (b"content-type", b"application/gzip")
+            index[key] = entry
+        else:
+            _add_variant(original, entry)
+    if precompress:
+        for key, entry in index.items():
+            if entry.gzip is None and entry.size >= PRECOMPRESS_MINIMUM_SIZE:
+                variant = _gzip_variant(entry, previous.get(key))
+                if variant is not None:
+                    _add_variant(entry, variant)
+    return index
+
+
+def _accepts_gzip(accept_encoding: bytes) -> bool:
+    for item in accept_encoding.split(b","):
+        coding, _, params = item.strip().partition(b";")
+        if coding.strip().lower() in (b"gzip", b"*"):
+            params = params.strip().replace(b" ", b"")
+            return params not in (b"q=0", b"q=0.0", b"q=0.00", b"q=0.000")
+    return False
+
+
+def _not_modified(entry: StaticFile, headers: Dict[bytes, bytes]) -> bool:
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(b",")]
+        return b"*" in tags or any(
+            (tag[2:] if tag.startswith(b"W/") else tag) == entry.etag for tag in tags
+        )
+    if_modified_since = headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since.decode("latin-1"))
+        except (TypeError, ValueError):
+            return False
+        return entry.mtime_ns // 1_000_000_000 <= since.timestamp()
+    return False
+
+
+class StaticMount:
+    def __init__(
+        self,
+        prefix: str,
+        directory: str,
+        max_cached_size: int = 256 * 1024,
+        precompress: bool = False,
+    ) -> None:
+        self.prefix = prefix.rstrip("/") + "/"
+        self.directory = os.path.abspath(directory)
+        self.max_cached_size = max_cached_size
+        self.precompress = precompress
+        self.directories: Dict[str, int] = {}
+        self.index = build_index(
+            self.directory, max_cached_size, None, precompress, self.directories
+        )
+        self.refreshed_at = time.monotonic()
+        self.refreshing = False
+
+    def lookup(self, path: str) -> Optional[StaticFile]:
+        relative = path[len(self.prefix) :]
+        if relative == "" or relative.endswith("/"):
+            relative += "index.html"
+        normalized = posixpath.normpath(relative)
+        if normalized.startswith(("../", "/")) or normalized == "..":
+            return None
+        return self.index.get(normalized)
+
+    def directories_changed(self) -> bool:
+        for path, mtime_ns in self.directories.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def refresh(self, entry: Optional[StaticFile] = None) -> None:
+        """
+        Rebuild the index if a directory changed, or if `entry` no longer
+        matches its file.
+        """
+        try:
+            changed = self.directories_changed()
+            if not changed and entry is not None:
+                files = [entry]
+                if entry.gzip is not None and entry.gzip.path != entry.path:
+                    files.append(entry.gzip)
+                for item in files:
+                    try:
+                        stat = os.stat(item.path)
+                    except OSError:
+                        changed = True
+                    else:
+                        changed = changed or (stat.st_size, stat.st_mtime_ns) != (
+                            item.size,
+                            item.mtime_ns,
+                        )
+                entry.checked_at = time.monotonic()
+            if changed:
+                directories: Dict[str, int] = {}
+                self.index = build_index(
+                    self.directory,
+                    self.max_cached_size,
+                    self.index,
+                    self.precompress,
+                    directories,
+                )
+                self.directories = directories
+        finally:
+            self.refreshed_at = time.monotonic()
+            self.refreshing = False
+
+
+def parse_mounts(
+    mounts: Sequence[str], precompress: bool = False
+) -> List[StaticMount]:
+    """
+    Build mounts from "PREFIX=DIRECTORY" strings, longest prefix first.
+    """
+    result = []
+    for mount in mounts:
+        prefix, sep, directory = mount.partition("=")
+        if not sep or not prefix.startswith("/"):
+            raise ValueError(
+                'Static mount "%s" must be in format "/<prefix>=<directory>".' % mount
+            )
+        if not os.path.isdir(directory):
+            raise ValueError('Static directory "%s" does not exist.' % directory)
+        result.append(StaticMount(prefix, directory, precompress=precompress))
+        logger.debug(
+            "Indexed %d static files in %s", len(result[-1].index), directory
+        )
+    result.sort(key=lambda item: len(item.prefix), reverse=True)
+    return result
+
+
+class StaticFilesMiddleware:
+    def __init__(
+        self,
+        app: "ASGI3Application",
+        mounts: Sequence[str] = (),
+        refresh_interval: float = 2.0,
+        precompress: bool = False,
+    ) -> None:
+        self.app = app
+        self.mounts = parse_mounts(mounts, precompress)
+        self.refresh_interval = refresh_interval
+
+    async def __call__(
+        self, scope: "Scope", receive: "ASGIReceiveCallable", send: "ASGISendCallable"
+    ) -> None:
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"]
+            for mount in self.mounts:
+                if path.startswith(mount.prefix):
+                    entry = self.lookup(mount, path)
+                    if entry is not None:
+                        if await self.serve(scope, send, entry):
+                            return
+                        # Gone or changed, so check it again now.
+                        entry.checked_at = 0.0
+                        self.start_refresh(mount, entry)
+                    break
+        return await self.app(scope, receive, send)
+
+    def lookup(self, mount: StaticMount, path: str) -> Optional[StaticFile]:
+        now = time.monotonic()
+        entry = mount.lookup(path)
+        if not mount.refreshing:
+            # Check the directories, and the file about to be served.
+            stale = None
+            if entry is not None and now - entry.checked_at > self.refresh_interval:
+                stale = entry
+            if stale is not None or now - mount.refreshed_at > self.refresh_interval:
+                self.start_refresh(mount, stale)
+        return entry
+
+    def start_refresh(self, mount: StaticMount, entry: Optional[StaticFile]) -> None:
+        if not mount.refreshing:
+            mount.refreshing = True
+            asyncio.get_running_loop().run_in_executor(None, mount.refresh, entry)
+
+    async def serve(
+        self, scope: "HTTPScope", send: "ASGISendCallable", entry: StaticFile
+    ) -> bool:
+        """
+        Send the response for `entry`, returning False if its file has gone
+        or changed since it was indexed.
+        """
+        headers = dict(scope["headers"])
+        if entry.gzip is not None and _accepts_gzip(
+            headers.get(b"accept-encoding", b"")
+        ):
+            entry = entry.gzip
+
+        if _not_modified(entry, headers):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [
+                        (name, value)
+                        for name, value in entry.headers
+                        if name not in (b"content-length", b"content-type")
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return True
+
+        if scope["method"] == "HEAD" or entry.size == 0 or entry.body is not None:
+            await send(
+                {"type": "http.response.start", "status": 200, "headers": entry.headers}
+            )
+            body = b"" if scope["method"] == "HEAD" else entry.body or b""
+            await send({"type": "http.response.body", "body": body})
+            return True
+
+        loop = asyncio.get_running_loop()
+        try:
+            file = await loop.run_in_executor(None, _open_unchanged, entry)
+        except OSError:
+            return False
+        if file is None:
+            return False
+        try:
+            await send(
+                {"type": "http.response.start", "status": 200, "headers": entry.headers}
+            )
+            await self.send_chunks(send, entry, file)
+        finally:
+            await loop.run_in_executor(None, file.close)
+        return True
+
+    async def send_chunks(
+        self, send: "ASGISendCallable", entry: StaticFile, file: BinaryIO
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        remaining = entry.size
+        while remaining > 0:
+            chunk = await loop.run_in_executor(
+                None, file.read, min(CHUNK_SIZE, remaining)
+            )
+            if not chunk:
+                # Truncated since it was indexed, the response can't be fixed up.
+                raise RuntimeError("Static file %s changed while sending" % entry.path)
+            remaining -= len(chunk)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                }
+            )
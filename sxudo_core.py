@@ -1,20 +1,100 @@
-import ollama
+import os
+import time
+from threading import Lock
+
 from app.memory import load_memory, save_memory
+from app.ollama_client import OLLAMA_TIMEOUT, chat_stream
 
 SESSION_ID = "default"
 
-def ask_ollama(prompt: str) -> str:
-    history = load_memory(SESSION_ID)
-    history.append({"role": "user", "content": prompt})
+# What to remember of a reply the user stopped: "partial" keeps what was
+# generated so far, "discard" forgets the exchange.
+CANCELLED_REPLY_POLICY = os.getenv("SXUDO_CANCELLED_REPLY", "partial")
+
+# Shortest reply worth generating when the deadline is close.
+MIN_REPLY_TOKENS = 32
+# Share of the time left that generation may use, leaving some for the rest.
+REPLY_TIME_SHARE = 0.8
+
+# Moving average of how long a full reply takes, to estimate the time saved
+# by stopping one early.
+_reply_seconds = None
+# Generation speed reported by Ollama, to fit replies into the time left.
+_tokens_per_second = None
+# Requests are answered by several threads at once.
+stats_lock = Lock()
+
+def ask_ollama(prompt: str, token=None, deadline=None, cache=None) -> str:
+    """
+    Answer `prompt`, remembering the exchange.
 
+    The request handler passes in what the server provides for the request:
+    its cancellation token, stopping generation once the user has gone, its
+    deadline, bounding the whole call, and the cache shared between workers.
+    """
+    global _reply_seconds, _tokens_per_second
+    if deadline is not None:
+        # Time spent waiting for a worker thread counts too.
+        deadline.check("queue")
+    memory = load_memory(SESSION_ID, cache=cache, deadline=deadline)
+    history = memory["history"]
+    user_message = {"role": "user", "content": prompt}
+    messages = history + [user_message]
+
+    options = {}
+    if deadline is not None:
+        deadline.check("prompt build")
+        if _tokens_per_second:
+            # A shorter reply rather than none, when time is running out.
+            speed = _tokens_per_second * REPLY_TIME_SHARE
+            deadline.require(MIN_REPLY_TOKENS / speed, "model call")
+            options["num_predict"] = int(deadline.remaining() * speed)
+
+    started = time.monotonic()
+    parts = []
+    stopped = False
     try:
-        response = ollama.chat(
-            model="sxudo",  # your Ollama model name
-            messages=history
+        stream = chat_stream(
+            messages, options, timeout=OLLAMA_TIMEOUT, deadline=deadline
         )
-        reply = response["message"]["content"]
-        history.append({"role": "assistant", "content": reply})
-        save_memory(SESSION_ID, history)
-        return reply
+        try:
+            for chunk in stream:
+                if token is not None and token.cancelled:
+                    stopped = True
+                    break
+                if deadline is not None and deadline.expired:
+                    break
+                parts.append(chunk["message"]["content"])
+                if chunk.get("done") and chunk.get("eval_duration"):
+                    seconds = chunk["eval_duration"] / 1e9
+                    with stats_lock:
+                        _tokens_per_second = chunk["eval_count"] / seconds
+        finally:
+            # Drops the connection, so Ollama stops generating and frees the
+            # model for other users.
+            stream.close()
     except Exception as e:
-        return f"Error: {str(e)}"
+        if deadline is None or not deadline.expired:
+            return f"Error: {str(e)}"
+
+    elapsed = time.monotonic() - started
+    reply = "".join(parts)
+    if stopped:
+        token.generation_cancelled(max(0.0, (_reply_seconds or 0.0) - elapsed))
+        if CANCELLED_REPLY_POLICY == "discard" or not reply:
+            return reply
+    elif deadline is not None and deadline.expired:
+        # Keep what was generated in time, if anything.
+        if not reply:
+            deadline.check("model call")
+    else:
+        with stats_lock:
+            if _reply_seconds is None:
+                _reply_seconds = elapsed
+            else:
+                _reply_seconds += (elapsed - _reply_seconds) * 0.2
+
+    history.append(user_message)
+    history.append({"role": "assistant", "content": reply})
+    save_memory(SESSION_ID, memory, cache=cache)
+    return reply
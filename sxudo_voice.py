@@ -17,12 +17,12 @@ def listen():
         return "API unavailable or no internet."
 
 # 🤖 Step 2: Send prompt to SXUDO via Ollama API
-def send_to_ollama(prompt, model="sxudo:latest"):
+def send_to_ollama(prompt, model="sxudo:latest", timeout=120):
     response = requests.post("http://127.0.0.1:11434/api/generate", json={
         "model": model,
         "prompt": prompt,
         "stream": False
-    })
+    }, timeout=timeout)
     data = response.json()
     print("🔍 Raw response:", data)
     return data.get("response", "No response received.")
@@ -0,0 +1,354 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+h2 = pytest.importorskip("h2")
+
+import h2.config  # noqa: E402
+import h2.connection  # noqa: E402
+import h2.events  # noqa: E402
+from h2.errors import ErrorCodes  # noqa: E402
+from h2.settings import SettingCodes  # noqa: E402
+
+from uvicorn.config import Config  # noqa: E402
+from uvicorn.h2_impl import H2Protocol  # noqa: E402
+from uvicorn.server import ServerState  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+class MockTransport:
+    def __init__(self) -> None:
+        self.closed = False
+        self.buffer = b""
+        self.read_paused = False
+        self.protocol: Optional[asyncio.BaseProtocol] = None
+
+    def get_extra_info(self, key: str) -> Any:
+        return {
+            "sockname": ("127.0.0.1", 8000),
+            "peername": ("127.0.0.1", 8001),
+        }.get(key)
+
+    def write(self, data: bytes) -> None:
+        assert not self.closed
+        self.buffer += data
+
+    def close(self) -> None:
+        self.closed = True
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def pause_reading(self) -> None:
+        self.read_paused = True
+
+    def resume_reading(self) -> None:
+        self.read_paused = False
+
+    def get_protocol(self) -> Optional[asyncio.BaseProtocol]:
+        return self.protocol
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self.protocol = protocol
+
+    def clear_buffer(self) -> None:
+        self.buffer = b""
+
+
+class Client:
+    """
+    The client side of an HTTP/2 connection to a protocol under test.
+    """
+
+    def __init__(
+        self, protocol: H2Protocol, settings: Optional[Dict[int, int]] = None
+    ) -> None:
+        self.protocol = protocol
+        self.transport: MockTransport = protocol.transport  # type: ignore
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=True, header_encoding=None)
+        )
+        self.conn.initiate_connection()
+        if settings:
+            self.conn.update_settings(settings)
+        self.flush()
+        self.events()
+
+    def flush(self) -> None:
+        data = self.conn.data_to_send()
+        if data:
+            self.protocol.data_received(data)
+
+    def events(self) -> List[h2.events.Event]:
+        data, self.transport.buffer = self.transport.buffer, b""
+        events = self.conn.receive_data(data)
+        # Acknowledge settings and the like.
+        self.flush()
+        return events
+
+    def request(
+        self, path: bytes, body: Optional[bytes] = None, end: bool = True
+    ) -> int:
+        stream_id = self.conn.get_next_available_stream_id()
+        headers = [
+            (b":method", b"GET" if body is None else b"POST"),
+            (b":path", path),
+            (b":scheme", b"http"),
+            (b":authority", b"example.org"),
+        ]
+        self.conn.send_headers(stream_id, headers, end_stream=end and body is None)
+        while body:
+            size = self.conn.max_outbound_frame_size
+            chunk, body = body[:size], body[size:]
+            self.conn.send_data(stream_id, chunk, end_stream=end and not body)
+        self.flush()
+        return stream_id
+
+
+def get_connected_protocol(app: Any, **kwargs: Any) -> H2Protocol:
+    config = Config(app=app, http="h2", lifespan="off", **kwargs)
+    protocol = H2Protocol(config=config, server_state=ServerState(), app_state={})
+    transport = MockTransport()
+    transport.set_protocol(protocol)
+    protocol.connection_made(transport)  # type: ignore[arg-type]
+    return protocol
+
+
+async def run_tasks() -> None:
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def response_data(events: List[h2.events.Event], stream_id: int) -> bytes:
+    return b"".join(
+        event.data
+        for event in events
+        if isinstance(event, h2.events.DataReceived) and event.stream_id == stream_id
+    )
+
+
+def ended_streams(events: List[h2.events.Event]) -> List[int]:
+    return [
+        event.stream_id for event in events if isinstance(event, h2.events.StreamEnded)
+    ]
+
+
+async def respond(send: Any, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+@pytest.mark.anyio
+async def test_get_request() -> None:
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        assert scope["http_version"] == "2"
+        await respond(send, b"Hello, world")
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    stream_id = client.request(b"/")
+    await run_tasks()
+
+    events = client.events()
+    responses = [e for e in events if isinstance(e, h2.events.ResponseReceived)]
+    assert responses[0].headers[0] == (b":status", b"200")
+    assert response_data(events, stream_id) == b"Hello, world"
+    assert ended_streams(events) == [stream_id]
+    assert protocol.server_state.total_requests == 1
+
+
+@pytest.mark.anyio
+async def test_streams_are_multiplexed() -> None:
+    release = asyncio.Event()
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        if scope["path"] == "/slow":
+            await release.wait()
+        await respond(send, scope["path"].encode())
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    slow = client.request(b"/slow")
+    fast = client.request(b"/fast")
+    await run_tasks()
+
+    events = client.events()
+    assert response_data(events, fast) == b"/fast"
+    assert ended_streams(events) == [fast]
+    assert protocol.cycle is protocol.streams[slow]
+
+    release.set()
+    await run_tasks()
+    events = client.events()
+    assert response_data(events, slow) == b"/slow"
+    assert ended_streams(events) == [slow]
+    assert protocol.cycle is None
+
+
+@pytest.mark.anyio
+async def test_response_waits_for_flow_control_window() -> None:
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await respond(send, b"x" * 25)
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol, settings={SettingCodes.INITIAL_WINDOW_SIZE: 10})
+    stream_id = client.request(b"/")
+    await run_tasks()
+
+    events = client.events()
+    assert response_data(events, stream_id) == b"x" * 10
+    assert ended_streams(events) == []
+
+    client.conn.increment_flow_control_window(20, stream_id=stream_id)
+    client.flush()
+    await run_tasks()
+    events = client.events()
+    assert response_data(events, stream_id) == b"x" * 15
+    assert ended_streams(events) == [stream_id]
+
+
+@pytest.mark.anyio
+async def test_request_body_acknowledged_as_read() -> None:
+    read = asyncio.Event()
+    received = []
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await read.wait()
+        message = await receive()
+        received.append(message)
+        await respond(send, b"%d" % len(message["body"]))
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    stream_id = client.request(b"/", body=b"x" * 40000, end=False)
+    await run_tasks()
+
+    events = client.events()
+    assert not [e for e in events if isinstance(e, h2.events.WindowUpdated)]
+
+    read.set()
+    await run_tasks()
+    events = client.events()
+    updated = [
+        event.stream_id
+        for event in events
+        if isinstance(event, h2.events.WindowUpdated)
+    ]
+    assert stream_id in updated
+    assert received[0]["more_body"] is True
+    assert response_data(events, stream_id) == b"40000"
+
+
+@pytest.mark.anyio
+async def test_rst_stream_disconnects_the_request() -> None:
+    messages = []
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        while True:
+            message = await receive()
+            messages.append(message["type"])
+            if message["type"] == "http.disconnect":
+                return
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    stream_id = client.request(b"/")
+    await run_tasks()
+    assert messages == ["http.request"]
+
+    client.conn.reset_stream(stream_id, ErrorCodes.CANCEL)
+    client.flush()
+    await run_tasks()
+    assert messages == ["http.request", "http.disconnect"]
+    assert stream_id not in protocol.streams
+    assert not protocol.tasks
+
+
+@pytest.mark.anyio
+async def test_new_streams_refused_while_shutting_down() -> None:
+    release = asyncio.Event()
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await release.wait()
+        await respond(send, b"done")
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    first = client.request(b"/")
+    await run_tasks()
+
+    protocol.shutdown()
+    second = client.request(b"/")
+    events = client.events()
+    resets = [e for e in events if isinstance(e, h2.events.StreamReset)]
+    assert [(e.stream_id, e.error_code) for e in resets] == [
+        (second, ErrorCodes.REFUSED_STREAM)
+    ]
+
+    release.set()
+    await run_tasks()
+    events = client.events()
+    assert response_data(events, first) == b"done"
+    assert any(isinstance(e, h2.events.ConnectionTerminated) for e in events)
+    assert protocol.transport.is_closing()
+
+
+@pytest.mark.anyio
+async def test_http11_falls_back() -> None:
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await respond(send, scope["http_version"].encode())
+
+    protocol = get_connected_protocol(app)
+    protocol.data_received(b"GET / HTTP/1.1\r\nHost: example.org\r\n\r\n")
+    await run_tasks()
+
+    transport: MockTransport = protocol.transport  # type: ignore[assignment]
+    assert transport.buffer.startswith(b"HTTP/1.1 200 OK")
+    assert b"\r\n1.1\r\n" in transport.buffer
+    protocol.connection_lost(None)
+
+
+@pytest.mark.anyio
+async def test_idle_connection_closed_after_keep_alive() -> None:
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await respond(send, b"done")
+
+    protocol = get_connected_protocol(app, timeout_keep_alive=0.1)
+    client = Client(protocol)
+    client.request(b"/")
+    await run_tasks()
+    client.events()
+
+    await asyncio.sleep(0.05)
+    client.request(b"/")
+    await asyncio.sleep(0.08)
+    assert not protocol.transport.is_closing()
+
+    await asyncio.sleep(0.1)
+    events = client.events()
+    assert any(isinstance(e, h2.events.ConnectionTerminated) for e in events)
+    assert protocol.transport.is_closing()
+
+
+@pytest.mark.anyio
+async def test_invalid_path_resets_stream() -> None:
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await respond(send, b"done")  # pragma: no cover
+
+    protocol = get_connected_protocol(app)
+    client = Client(protocol)
+    stream_id = client.request(b"/\xff")
+    await run_tasks()
+
+    events = client.events()
+    resets = [e for e in events if isinstance(e, h2.events.StreamReset)]
+    assert [(e.stream_id, e.error_code) for e in resets] == [
+        (stream_id, ErrorCodes.PROTOCOL_ERROR)
+    ]
+    assert not protocol.streams
+    assert not protocol.transport.is_closing()
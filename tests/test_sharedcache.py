@@ -0,0 +1,193 @@
+import multiprocessing
+import random
+from typing import Dict, Iterator, Optional
+
+import pytest
+
+from uvicorn import sharedcache
+from uvicorn.sharedcache import (
+    EMPTY,
+    FREE,
+    HASH,
+    INDEX_POS,
+    META_SIZE,
+    STATE,
+    SharedCache,
+)
+
+
+@pytest.fixture
+def cache() -> Iterator[SharedCache]:
+    # One stripe of 8 slabs, so evictions and probe collisions are easy to reach.
+    cache = SharedCache(8 * 64, slab_size=64, stripes=1)
+    yield cache
+    cache.unlink()
+
+
+def check_invariants(cache: SharedCache) -> None:
+    """
+    Every entry is in the index exactly once, at the position it records, and
+    is reachable from its home position without crossing an empty position.
+    """
+    words = cache.words
+    mask = cache.index_size - 1
+    for stripe in range(cache.stripes):
+        index = stripe * cache.stripe_words + 1
+        meta = index + cache.index_size
+        assert 0 <= words[index - 1] < cache.stripe_slabs
+
+        indexed = {}
+        for position in range(cache.index_size):
+            entry = words[index + position]
+            if entry != EMPTY:
+                slab = entry - 1
+                assert slab not in indexed
+                indexed[slab] = position
+
+        for slab in range(cache.stripe_slabs):
+            fields = meta + slab * META_SIZE
+            if words[fields + STATE] == FREE:
+                assert slab not in indexed
+                continue
+            position = indexed.pop(slab)
+            assert words[fields + INDEX_POS] == position
+            probe = cache._home(words[fields + HASH])
+            while probe != position:
+                assert words[index + probe] != EMPTY
+                probe = (probe + 1) & mask
+        assert not indexed
+
+
+def test_set_get_delete(cache: SharedCache) -> None:
+    assert cache.get("a") is None
+    assert cache.set("a", b"1")
+    assert cache.get("a") == b"1"
+    assert len(cache) == 1
+
+    assert cache.delete("a")
+    assert not cache.delete("a")
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    check_invariants(cache)
+
+
+def test_set_replaces_value(cache: SharedCache) -> None:
+    cache.set("a", b"first")
+    cache.set("a", b"2nd")
+    assert cache.get("a") == b"2nd"
+    assert len(cache) == 1
+    check_invariants(cache)
+
+
+def test_value_too_large(cache: SharedCache) -> None:
+    assert not cache.set("a", b"x" * 64)
+    assert cache.set("a", b"x" * 63)
+    assert cache.get("a") == b"x" * 63
+
+
+def test_expired_entry_is_removed(
+    cache: SharedCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr(sharedcache.time, "time", lambda: now)
+    cache.set("a", b"1", ttl=10)
+    cache.set("b", b"2")
+    now += 9
+    assert cache.get("a") == b"1"
+    now += 1
+    assert cache.get("a") is None
+    assert cache.get("b") == b"2"
+    assert len(cache) == 1
+    check_invariants(cache)
+
+
+def test_full_cache_evicts(cache: SharedCache) -> None:
+    for idx in range(20):
+        assert cache.set("key%d" % idx, b"%d" % idx)
+        check_invariants(cache)
+    assert len(cache) == 8
+    assert cache.get("key19") == b"19"
+    assert sum(cache.get("key%d" % idx) is not None for idx in range(20)) == 8
+
+
+def test_referenced_entry_survives_eviction(cache: SharedCache) -> None:
+    for idx in range(8):
+        cache.set("key%d" % idx, b"")
+    # Read since the hand last passed it, so it's passed over once.
+    assert cache.get("key0") == b""
+
+    cache.set("new", b"")
+    assert cache.get("key0") == b""
+    assert cache.get("key1") is None
+    assert cache.get("new") == b""
+    check_invariants(cache)
+
+
+def test_random_operations_keep_invariants(cache: SharedCache) -> None:
+    rng = random.Random(0)
+    latest: Dict[str, Optional[bytes]] = {}
+    for step in range(2000):
+        key = "key%d" % rng.randrange(24)
+        action = rng.random()
+        if action < 0.5:
+            value = b"%d" % step
+            cache.set(key, value)
+            latest[key] = value
+        elif action < 0.75:
+            cache.delete(key)
+            latest[key] = None
+        else:
+            # Either the latest value, or nothing once it has been evicted.
+            assert cache.get(key) in (None, latest.get(key))
+        check_invariants(cache)
+    assert len(cache) <= 8
+
+
+def test_striped_cache_keeps_invariants() -> None:
+    cache = SharedCache(64 * 64, slab_size=64, stripes=4)
+    try:
+        for idx in range(200):
+            cache.set("key%d" % idx, b"%d" % idx)
+        check_invariants(cache)
+        assert len(cache) == 64
+        assert cache.get("key199") == b"199"
+    finally:
+        cache.unlink()
+
+
+def set_in_child(cache: SharedCache) -> None:
+    cache.set("child", b"hello")
+    cache.close()
+
+
+def test_shared_between_processes(cache: SharedCache) -> None:
+    process = multiprocessing.get_context("spawn").Process(
+        target=set_in_child, args=(cache,)
+    )
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert cache.get("child") == b"hello"
+    check_invariants(cache)
+
+
+def test_metrics_are_counted() -> None:
+    counts: Dict[str, int] = {}
+
+    class Metrics:
+        def inc(self, name: str) -> None:
+            counts[name] = counts.get(name, 0) + 1
+
+    cache = SharedCache(64, slab_size=64, metrics=Metrics())  # type: ignore
+    try:
+        cache.set("a", b"")
+        cache.get("a")
+        cache.get("b")
+        cache.set("b", b"")
+        assert counts == {
+            "shared_cache_hits": 1,
+            "shared_cache_misses": 1,
+            "shared_cache_evictions": 1,
+        }
+    finally:
+        cache.unlink()
@@ -0,0 +1,123 @@
+"""
+A hashed timer wheel.
+
+Timers are kept in a ring of slots, one per `resolution` seconds, so
+scheduling, rescheduling and cancelling are all O(1) dictionary operations,
+with no event loop timer handle per timer. The wheel is advanced from the
+server's tick, so timers fire up to `resolution` seconds late.
+
+`WheelLoop` hands the wheel to the HTTP protocols in place of the event loop,
+so the keep-alive timers they set with `call_later()` go on the wheel too.
+"""
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import asyncio
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class Timer:
+    __slots__ = ("callback", "args", "wheel", "slot", "rounds")
+
+    def __init__(
+        self, callback: Callable[..., Any], args: Any, wheel: "TimerWheel"
+    ) -> None:
+        self.callback = callback
+        self.args = args
+        self.wheel = wheel
+        self.slot: Optional[int] = None
+        self.rounds = 0
+
+    def cancel(self) -> None:
+        """
+        Cancel the timer, like `asyncio.TimerHandle.cancel()`.
+        """
+        self.wheel.cancel(self)
+
+
+class TimerWheel:
+    def __init__(self, resolution: float = 0.1, slots: int = 512) -> None:
+        self.resolution = resolution
+        self._slots: List[Dict[Timer, None]] = [{} for _ in range(slots)]
+        self._position = 0
+        self._last_advanced = time.monotonic()
+        self.pending = 0
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        timer = Timer(callback, args, self)
+        self.reschedule(timer, delay)
+        return timer
+
+    def reschedule(self, timer: Timer, delay: float) -> None:
+        self.cancel(timer)
+        ticks = max(1, math.ceil(delay / self.resolution))
+        timer.rounds, offset = divmod(ticks - 1, len(self._slots))
+        timer.slot = (self._position + 1 + offset) % len(self._slots)
+        self._slots[timer.slot][timer] = None
+        self.pending += 1
+
+    def cancel(self, timer: Timer) -> None:
+        if timer.slot is not None:
+            del self._slots[timer.slot][timer]
+            timer.slot = None
+            self.pending -= 1
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        Move the wheel forward to `now`, running the timers that are due.
+        Returns the number of timers that fired.
+        """
+        if now is None:
+            now = time.monotonic()
+        ticks = int((now - self._last_advanced) / self.resolution)
+        if ticks <= 0:
+            return 0
+        self._last_advanced += ticks * self.resolution
+
+        fired = 0
+        for _ in range(ticks):
+            self._position = (self._position + 1) % len(self._slots)
+            slot = self._slots[self._position]
+            if not slot:
+                continue
+            expired = []
+            for timer in slot:
+                if timer.rounds == 0:
+                    expired.append(timer)
+                else:
+                    timer.rounds -= 1
+            for timer in expired:
+                del slot[timer]
+                timer.slot = None
+                self.pending -= 1
+            for timer in expired:
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    logger.exception("Exception in timer callback %r", timer.callback)
+                fired += 1
+        return fired
+
+
+class WheelLoop:
+    """
+    An event loop whose `call_later()` schedules on a timer wheel instead,
+    returning a `Timer` that can be cancelled like a `TimerHandle`. Everything
+    else is passed through to the loop.
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop", wheel: TimerWheel) -> None:
+        self.loop = loop
+        self.wheel = wheel
+
+    def call_later(
+        self, delay: float, callback: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Timer:
+        return self.wheel.schedule(delay, callback, *args)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loop, name)
@@ -0,0 +1,59 @@
+"""
+TLS handshake statistics.
+
+Counts full and resumed handshakes, and times them from the ClientHello until
+the connection is handed to the protocol.
+"""
+import ssl
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from uvicorn.metrics import SharedMetrics
+
+
+class HandshakeStats:
+    """
+    Counts full and resumed handshakes, and times them from the ClientHello
+    (seen by the SNI callback) until the connection is handed to the protocol.
+    """
+
+    def __init__(
+        self,
+        metrics: Optional["SharedMetrics"] = None,
+        sni_callback: Optional[Callable[..., Optional[int]]] = None,
+    ) -> None:
+        self.metrics = metrics
+        # A callback already installed on the context, called in turn.
+        self.sni_callback = sni_callback
+        self.full = 0
+        self.resumed = 0
+        self._started: "weakref.WeakKeyDictionary[Any, float]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def client_hello(
+        self, ssl_object: Any, server_name: Optional[str], ctx: ssl.SSLContext
+    ) -> Optional[int]:
+        self._started[ssl_object] = time.perf_counter()
+        if self.sni_callback is not None:
+            return self.sni_callback(ssl_object, server_name, ctx)
+        return None
+
+    def connection_made(self, transport: Any) -> None:
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object is None:
+            return
+        started = self._started.pop(ssl_object, None)
+        if ssl_object.session_reused:
+            self.resumed += 1
+            name = "tls_handshakes_resumed"
+        else:
+            self.full += 1
+            name = "tls_handshakes_full"
+        if self.metrics is not None:
+            self.metrics.inc(name)
+            if started is not None:
+                duration = time.perf_counter() - started
+                self.metrics.observe("tls_handshake_seconds", duration)